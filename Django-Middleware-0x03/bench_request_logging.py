@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+"""
+Throughput of RequestLoggingMiddleware: requests per second and p99 latency
+with logging off, with the old synchronous file logging, with the queued
+writer, and with the queued writer on a slow disk (drops instead of stalls).
+
+    python3 bench_request_logging.py --requests 50000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class SyncLoggingMiddleware:
+    """Previous implementation: one formatted line written per request."""
+
+    def __init__(self, get_response, filename):
+        self.get_response = get_response
+        self.logger = logging.getLogger("bench.sync")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(logging.FileHandler(filename))
+
+    def __call__(self, request):
+        from datetime import datetime
+        user = request.user if request.user.is_authenticated else "Anonymous"
+        self.logger.info(f"{datetime.now()} - User: {user} - Path: {request.path}")
+        return self.get_response(request)
+
+
+def run(middleware, requests, factory):
+    from django.contrib.auth.models import AnonymousUser
+
+    latencies = []
+    for i in range(requests):
+        request = factory.get(f"/api/conversations/{i % 100}/")
+        request.user = AnonymousUser()
+        started = time.perf_counter()
+        middleware(request)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return requests / sum(latencies), latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--slow-disk-ms", type=float, default=50.0,
+                        help="Delay per batch written in the slow disk mode.")
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.auth", "django.contrib.contenttypes"],
+        REQUEST_LOG_FILE=os.path.join(directory, "requests.log"),
+        REQUEST_LOG_QUEUE_SIZE=10000,
+    )
+    django.setup()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from chats import middleware as request_logging
+
+    factory = RequestFactory()
+
+    def view(request):
+        return HttpResponse(b"{}", content_type="application/json")
+
+    class SlowDiskWriter(request_logging.BatchingFileWriter):
+        def write(self, data):
+            time.sleep(options.slow_disk_ms / 1000)
+            super().write(data)
+
+    results = []
+    with settings_override(REQUEST_LOGGING=False):
+        results.append(("off", run(request_logging.RequestLoggingMiddleware(view), options.requests, factory), None))
+
+    results.append((
+        "sync file",
+        run(SyncLoggingMiddleware(view, os.path.join(directory, "sync.log")), options.requests, factory),
+        None,
+    ))
+
+    writer = request_logging.request_log_writer()
+    results.append(("queued", run(request_logging.RequestLoggingMiddleware(view), options.requests, factory), writer))
+    writer.stop()
+
+    # Same middleware, writer replaced by one on a slow disk
+    handler = request_logging.DroppingQueueHandler(10000, 500)
+    slow = SlowDiskWriter(
+        handler, os.path.join(directory, "slow.log"), batch_size=500, flush_interval=1.0,
+        max_bytes=10 * 1024 * 1024, rotate_seconds=0, backup_count=1,
+    )
+    slow.start()
+    request_logging.logger.handlers = [handler]
+    results.append(("queued, slow disk", run(request_logging.RequestLoggingMiddleware(view), options.requests, factory), slow))
+    slow.stop()
+
+    baseline = results[0][1][0]
+    print(f"{'mode':<20}{'req/s':>10}{'cost (us/req)':>15}{'p99 (us)':>10}{'dropped':>9}")
+    for name, (rate, p99), used in results:
+        dropped = used.handler.dropped if used else 0
+        cost = (1 / rate - 1 / baseline) * 1e6
+        print(f"{name:<20}{rate:>10.0f}{cost:>15.1f}{p99:>10.1f}{dropped:>9}")
+
+    for file in os.listdir(directory):
+        os.remove(os.path.join(directory, file))
+    os.rmdir(directory)
+
+
+class settings_override:
+    def __init__(self, **values):
+        self.values = values
+
+    def __enter__(self):
+        from django.test.utils import override_settings
+        self.override = override_settings(**self.values)
+        self.override.enable()
+
+    def __exit__(self, *exc):
+        self.override.disable()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,291 @@
+import atexit
+import fcntl
 import logging
+import logging.handlers
+import os
+import queue
+import threading
 from datetime import datetime, time
+from time import perf_counter, time as wall_clock
+
+from django.conf import settings
 from django.http import HttpResponse
 
 logger = logging.getLogger(__name__)
 
 
+# Defaults, overridable in settings.py (REQUEST_LOG_*)
+REQUEST_LOG_DEFAULTS = {
+    "FILE": "requests.log",
+    "QUEUE_SIZE": 10000,         # records waiting for the writer; beyond that they are dropped
+    "BATCH_SIZE": 500,           # records per write()
+    "FLUSH_INTERVAL": 1.0,       # seconds a partial batch may wait
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "ROTATE_SECONDS": 24 * 3600,
+    "BACKUP_COUNT": 5,
+}
+
+REQUEST_LOG_FORMAT = (
+    "%(timestamp)s - User: %(user)s - Path: %(path)s - Method: %(method)s - "
+    "Status: %(status)s - Latency: %(latency_ms).1f ms - Bytes: %(bytes)s"
+)
+
+
+def request_log_setting(name):
+    return getattr(settings, f"REQUEST_LOG_{name}", REQUEST_LOG_DEFAULTS[name])
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler on a bounded queue that never blocks the caller: when the
+    queue is full the record is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, maxsize, batch_size=None):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        # Set once a batch is waiting: wakes the writer without a wake-up per record
+        self.batch_size = batch_size or maxsize // 2 or 1
+        self.batch_ready = threading.Event()
+
+    def prepare(self, record):
+        # Record attributes are plain values set by the middleware: formatting
+        # is left to the writer thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+        if self.queue.qsize() >= self.batch_size and not self.batch_ready.is_set():
+            self.batch_ready.set()
+
+
+class BatchingFileWriter:
+    """
+    Background thread draining a DroppingQueueHandler into a file: one write
+    and flush per batch (up to `batch_size` records or `flush_interval`
+    seconds), rotation by size or age (file.1 ... file.N), and a line
+    reporting how many records were dropped or could not be formatted since
+    the last batch.
+
+    Several workers may share the file: each batch is one append, rotation
+    happens under an exclusive lock on `file.lock`, whose mtime is the time
+    of the last rotation (the age survives restarts and is the same for all
+    workers), and a writer whose file was rotated by another one reopens it.
+    """
+
+    def __init__(self, handler, filename, batch_size, flush_interval, max_bytes,
+                 rotate_seconds, backup_count, formatter=None):
+        self.handler = handler
+        self.filename = os.path.abspath(filename)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.formatter = formatter or logging.Formatter(REQUEST_LOG_FORMAT)
+        self.lock_filename = f"{self.filename}.lock"
+        self.reported_drops = 0
+        self.format_errors = 0
+        self.stream = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name="request-log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Writes what is still queued, then ends the thread."""
+        if self._thread.is_alive():
+            self._stopping = True
+            self.handler.batch_ready.set()
+            self._thread.join()
+
+    def run(self):
+        ready = self.handler.batch_ready
+        while not self._stopping:
+            ready.wait(self.flush_interval)
+            ready.clear()
+            self.drain()
+        self.drain()
+        self.close()
+
+    def drain(self):
+        records = self.handler.queue
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(records.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.write_batch(batch)
+            except Exception:
+                # Disk full, permissions...: lose this batch, keep the thread alive
+                logging.getLogger("django").exception("Request log write failed")
+            if len(batch) < self.batch_size:
+                return
+
+    def write_batch(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record) + "\n")
+            except Exception:
+                # One bad record (missing field, wrong type) must not cost the batch
+                self.format_errors += 1
+        if self.format_errors:
+            lines.append(f"{datetime.now()} - {self.format_errors} request log records skipped (format error)\n")
+            self.format_errors = 0
+        dropped = self.handler.dropped
+        if dropped > self.reported_drops:
+            lines.append(f"{datetime.now()} - {dropped - self.reported_drops} request log records dropped (queue full)\n")
+            self.reported_drops = dropped
+        data = "".join(lines).encode("utf-8")
+        if not data:
+            return
+        if self.stream is None or self.rotated_elsewhere():
+            self.reopen()
+        if self.should_rotate(len(data)):
+            with self.rotation_lock():
+                # Another worker may have rotated while we waited for the lock
+                if self.rotated_elsewhere():
+                    self.reopen()
+                if self.should_rotate(len(data)):
+                    self.rotate()
+        self.write(data)
+
+    def write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def open(self):
+        self.stream = open(self.filename, "ab")
+        if not os.path.exists(self.lock_filename):
+            # First file: its age counts from now
+            open(self.lock_filename, "ab").close()
+
+    def reopen(self):
+        self.close()
+        self.open()
+
+    def rotated_elsewhere(self):
+        """True when `filename` is no longer the file this writer appends to."""
+        try:
+            return os.stat(self.filename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def rotation_lock(self):
+        lock = open(self.lock_filename, "ab")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        return lock
+
+    def last_rotation(self):
+        try:
+            return os.stat(self.lock_filename).st_mtime
+        except FileNotFoundError:
+            return wall_clock()
+
+    def should_rotate(self, size):
+        # Size of the file on disk, other workers' lines included
+        current = os.fstat(self.stream.fileno()).st_size
+        too_big = self.max_bytes and current + size > self.max_bytes
+        too_old = self.rotate_seconds and wall_clock() - self.last_rotation() >= self.rotate_seconds
+        return bool(too_big or too_old) and current > 0
+
+    def rotate(self):
+        """Called with rotation_lock() held."""
+        self.stream.close()
+        if self.backup_count:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.filename}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.filename}.{i + 1}")
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        os.utime(self.lock_filename)
+        self.open()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def request_log_writer():
+    """Process-wide writer, started on first use and flushed at exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            handler = DroppingQueueHandler(request_log_setting("QUEUE_SIZE"), request_log_setting("BATCH_SIZE"))
+            _writer = BatchingFileWriter(
+                handler,
+                request_log_setting("FILE"),
+                batch_size=request_log_setting("BATCH_SIZE"),
+                flush_interval=request_log_setting("FLUSH_INTERVAL"),
+                max_bytes=request_log_setting("MAX_BYTES"),
+                rotate_seconds=request_log_setting("ROTATE_SECONDS"),
+                backup_count=request_log_setting("BACKUP_COUNT"),
+            )
+            _writer.start()
+            atexit.register(_writer.stop)
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            # The queue handler is the only one: no synchronous root handler
+            logger.propagate = False
+    return _writer
+
+
 class RequestLoggingMiddleware:
+    """
+    Logs one record per request (timestamp, user, path, method, status,
+    latency, bytes) through a bounded queue to a background writer: the
+    request thread never touches the disk and never waits (see
+    BatchingFileWriter). Fields are record attributes, usable by any
+    formatter. Disabled with REQUEST_LOGGING = False.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
-
-        logging.basicConfig(
-            filename='requests.log',
-            level=logging.INFO,
-            format='%(message)s'
-        )
+        self.enabled = getattr(settings, "REQUEST_LOGGING", True)
+        if self.enabled:
+            request_log_writer()
 
     def __call__(self, request):
-        user = request.user if request.user.is_authenticated else "Anonymous"
-        log_message = f"{datetime.now()} - User: {user} - Path: {request.path}"
-        logger.info(log_message)
-
-        return self.get_response(request)
+        if not self.enabled or not logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+        timestamp = datetime.now()
+        started = perf_counter()
+        response = self.get_response(request)
+        latency_ms = (perf_counter() - started) * 1000
+
+        user = getattr(request, "user", None)
+        user = str(user) if user is not None and user.is_authenticated else "Anonymous"
+        size = None if getattr(response, "streaming", False) else len(response.content)
+        # makeRecord() + handle() rather than logger.info(): no caller lookup
+        # (stack walk) on every request
+        logger.handle(logger.makeRecord(logger.name, logging.INFO, __file__, 0, "request", None, None, extra={
+            "timestamp": timestamp,
+            "user": user,
+            "path": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "latency_ms": latency_ms,
+            "bytes": size,
+        }))
+        return response
 
 
 
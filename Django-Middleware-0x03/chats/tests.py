@@ -0,0 +1,113 @@
+"""
+Tests of the request log writer (chats.middleware): no Django settings
+needed.
+
+    cd Django-Middleware-0x03 && python3 -m unittest chats.tests
+"""
+import logging
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from chats.middleware import BatchingFileWriter, DroppingQueueHandler
+
+
+def make_record(path="/api/", **fields):
+    values = {
+        "timestamp": datetime(2024, 1, 1, 12, 0), "user": "Anonymous", "path": path,
+        "method": "GET", "status": 200, "latency_ms": 1.5, "bytes": 2,
+    }
+    values.update(fields)
+    return logging.makeLogRecord({"name": "chats.middleware", "levelno": logging.INFO, "msg": "request", **values})
+
+
+class BatchingFileWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, "requests.log")
+
+    def make_writer(self, handler=None, **options):
+        options = {"batch_size": 100, "flush_interval": 60, "max_bytes": 0,
+                   "rotate_seconds": 0, "backup_count": 2, **options}
+        writer = BatchingFileWriter(handler or DroppingQueueHandler(100), self.filename, **options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def read(self, filename=None):
+        with open(filename or self.filename, encoding="utf-8") as file:
+            return file.read().splitlines()
+
+    def test_full_queue_drops_and_reports(self):
+        handler = DroppingQueueHandler(2)
+        for i in range(5):
+            handler.enqueue(make_record(f"/{i}/"))
+        self.assertEqual(handler.dropped, 3)
+
+        writer = self.make_writer(handler)
+        writer.drain()
+        lines = self.read()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Path: /0/", lines[0])
+        self.assertIn("Path: /1/", lines[1])
+        self.assertTrue(lines[2].endswith("3 request log records dropped (queue full)"))
+
+        # Reported once
+        handler.enqueue(make_record())
+        writer.drain()
+        self.assertNotIn("dropped", self.read()[-1])
+
+    def test_bad_record_does_not_lose_the_batch(self):
+        writer = self.make_writer()
+        writer.write_batch([make_record("/a/"), make_record("/b/", latency_ms="slow"), make_record("/c/")])
+        lines = self.read()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Path: /a/", lines[0])
+        self.assertIn("Path: /c/", lines[1])
+        self.assertTrue(lines[2].endswith("1 request log records skipped (format error)"))
+
+    def test_rotation_by_size(self):
+        writer = self.make_writer(max_bytes=200)
+        writer.write_batch([make_record("/first/")])
+        writer.write_batch([make_record("/second/")])
+        writer.write_batch([make_record("/third/")])
+        self.assertIn("Path: /third/", self.read()[0])
+        self.assertIn("Path: /second/", self.read(self.filename + ".1")[0])
+        self.assertIn("Path: /first/", self.read(self.filename + ".2")[0])
+
+    def test_rotation_by_age_survives_restart(self):
+        self.make_writer(rotate_seconds=3600).write_batch([make_record("/old/")])
+        # Last rotation two hours ago; a new process (new writer) must rotate
+        past = os.stat(self.filename + ".lock").st_mtime - 7200
+        os.utime(self.filename + ".lock", (past, past))
+        self.make_writer(rotate_seconds=3600).write_batch([make_record("/new/")])
+        self.assertEqual(len(self.read()), 1)
+        self.assertIn("Path: /new/", self.read()[0])
+        self.assertIn("Path: /old/", self.read(self.filename + ".1")[0])
+
+    def test_file_rotated_by_another_worker_is_reopened(self):
+        first, second = self.make_writer(), self.make_writer()
+        first.write_batch([make_record("/first/")])
+        second.open()
+        with second.rotation_lock():
+            second.rotate()
+        # `first` must not keep appending to what is now requests.log.1
+        first.write_batch([make_record("/second/")])
+        self.assertEqual(len(self.read()), 1)
+        self.assertIn("Path: /second/", self.read()[0])
+        self.assertEqual(len(self.read(self.filename + ".1")), 1)
+
+    def test_stop_writes_what_is_queued(self):
+        handler = DroppingQueueHandler(100)
+        writer = self.make_writer(handler)
+        writer.start()
+        for i in range(10):
+            handler.enqueue(make_record(f"/{i}/"))
+        writer.stop()
+        self.assertEqual(len(self.read()), 10)
+        self.assertIsNone(writer.stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,3 +13,14 @@ MIDDLEWARE = [
     'chats.middleware.OffensiveLanguageMiddleware',
     'chats.middleware.RolepermissionMiddleware',
 ]
+
+# Request logging (chats.middleware.RequestLoggingMiddleware): records are
+# queued and written in batches by a background thread
+REQUEST_LOGGING = True
+REQUEST_LOG_FILE = 'requests.log'
+REQUEST_LOG_QUEUE_SIZE = 10000
+REQUEST_LOG_BATCH_SIZE = 500
+REQUEST_LOG_FLUSH_INTERVAL = 1.0
+REQUEST_LOG_MAX_BYTES = 10 * 1024 * 1024
+REQUEST_LOG_ROTATE_SECONDS = 24 * 3600
+REQUEST_LOG_BACKUP_COUNT = 5
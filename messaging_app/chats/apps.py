@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+class ChatsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'chats'
+
+    def ready(self):
+        from . import signals  # noqa
+        from .database import configure_sqlite
+        from .search import ensure_search_index
+
+        # WAL, busy_timeout... sur chaque connexion SQLite (chats.database)
+        connection_created.connect(configure_sqlite)
+
+        # Index FTS5 des messages (SQLite uniquement)
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,151 @@
+# messaging_app/chats/authentication.py
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User, ClaimsUser
+
+
+# -------------------------
+# Claims ajoutés aux tokens
+# -------------------------
+class ChatsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Ajoute email et role aux tokens pour pouvoir éviter la lecture de l'utilisateur."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        token["role"] = user.role
+        return token
+
+
+# -------------------------
+# Cache en mémoire (par processus) des utilisateurs complets
+# -------------------------
+_USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
+
+def user_cache_timeout():
+    return getattr(settings, "CHATS_USER_CACHE_TIMEOUT", 300)
+
+
+def changed_marker_key(user_id):
+    return f"chats:user-changed:{user_id}"
+
+
+def shared_auth_cache():
+    """
+    Cache CHATS_AUTH_CACHE des marqueurs de modification, s'il est partagé
+    entre processus ; None pour un cache par processus (LocMemCache) ou
+    factice : un marqueur posé par un worker n'y serait pas vu par les autres.
+    """
+    backend = caches[getattr(settings, "CHATS_AUTH_CACHE", "default")]
+    if isinstance(backend, (LocMemCache, DummyCache)):
+        return None
+    return backend
+
+
+def load_user_fields(user_id, not_before=0):
+    """
+    Retourne les valeurs de tous les champs de l'utilisateur, depuis le cache
+    du processus si l'entrée est encore valide et postérieure à `not_before`.
+    """
+    key = str(user_id)
+    now = time.time()
+    with _user_cache_lock:
+        entry = _user_cache.get(key)
+    if entry and entry[0] > now and entry[1] >= not_before:
+        return entry[2]
+
+    values = User.objects.filter(pk=user_id).values(*_USER_FIELDS).first()
+    if values is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    with _user_cache_lock:
+        _user_cache[key] = (now + user_cache_timeout(), now, values)
+    return values
+
+
+def invalidate_user(user_id):
+    """
+    À appeler quand le rôle ou le statut actif d'un utilisateur change (branché sur
+    post_save/post_delete de User dans chats.signals). Vide l'entrée locale et pose
+    un marqueur dans le cache partagé : les tokens émis avant ce moment repassent
+    par la base. Un access token tiré d'un refresh token garde l'`iat` et le
+    `role` de ce dernier : le marqueur vit donc aussi longtemps qu'un refresh token.
+    """
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+    cache = shared_auth_cache()
+    if cache is None:
+        return
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds()
+    cache.set(changed_marker_key(user_id), time.time(), int(lifetime) + 1)
+
+
+def build_claims_user(values):
+    """ClaimsUser avec les champs de `values` chargés, les autres différés."""
+    names = [name for name in _USER_FIELDS if name in values]
+    return ClaimsUser.from_db(None, names, [values[name] for name in names])
+
+
+def clear_user_cache():
+    with _user_cache_lock:
+        _user_cache.clear()
+
+
+# -------------------------
+# Authentification sans lecture de l'utilisateur
+# -------------------------
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Construit request.user à partir des claims (user_id, email, role) sans requête.
+    Les autres champs sont chargés à la demande, une seule fois, via le cache
+    de load_user_fields(). Si l'utilisateur a changé après l'émission du token,
+    il est relu et son statut actif vérifié. Sans cache partagé entre
+    processus (CHATS_AUTH_CACHE), un changement ne serait pas vu des autres
+    workers : l'utilisateur est alors lu en base à chaque requête.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cache = shared_auth_cache()
+        if cache is None:
+            return super().get_user(validated_token)
+
+        changed_at = cache.get(changed_marker_key(user_id))
+        if changed_at is not None and validated_token.get("iat", 0) < changed_at:
+            values = load_user_fields(user_id, not_before=changed_at)
+            if not values["is_active"]:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return build_claims_user(values)
+
+        if "email" not in validated_token or "role" not in validated_token:
+            # Ancien token sans claims : chemin classique, via le cache
+            values = load_user_fields(user_id)
+            if not values["is_active"]:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return build_claims_user(values)
+
+        return build_claims_user({
+            "user_id": User._meta.pk.to_python(user_id),
+            "email": validated_token["email"],
+            "role": validated_token["role"],
+            "is_active": True,
+        })
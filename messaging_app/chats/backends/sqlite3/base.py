@@ -0,0 +1,39 @@
+# messaging_app/chats/backends/sqlite3/base.py
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Backend SQLite de Django avec OPTIONS["transaction_mode"] (repris de
+    Django 5.1). Avec "IMMEDIATE", transaction.atomic() ouvre un BEGIN
+    IMMEDIATE : le verrou d'écriture est pris dès le début, en respectant
+    busy_timeout. En BEGIN (DEFERRED), une transaction qui a déjà lu avant
+    d'écrire (c'est le cas de l'INSERT de chats_message, dont le trigger FTS5
+    lit l'index) échoue aussitôt en « database is locked » si une autre
+    connexion écrit : SQLite ne peut pas attendre sans casser l'isolation.
+    """
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        mode = settings_dict["OPTIONS"].get("transaction_mode")
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode doit valoir l'un de {', '.join(TRANSACTION_MODES)} (reçu : {mode!r})."
+            )
+        self.transaction_mode = mode and mode.upper()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("transaction_mode", None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute("BEGIN")
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
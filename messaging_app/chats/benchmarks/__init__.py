@@ -0,0 +1,11 @@
+# messaging_app/chats/benchmarks/__init__.py
+"""
+Banc d'essai reproductible de l'API chats : jeu de données déterministe
+(data.py), scénarios joués via le client de test Django (scenarios.py).
+Lancement : manage.py run_benchmarks (voir --help).
+"""
+
+from .data import BenchmarkData, generate
+from .scenarios import SCENARIOS, compare_results, run_scenarios
+
+__all__ = ["BenchmarkData", "generate", "SCENARIOS", "compare_results", "run_scenarios"]
@@ -0,0 +1,74 @@
+# messaging_app/chats/benchmarks/concurrency.py
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def file_test_database():
+    """
+    Base de test neuve sur fichier, détruite à la sortie. Contrairement à la
+    base de test en mémoire, elle se partage entre threads comme en production.
+    """
+    test_settings = connection.settings_dict["TEST"]
+    old_name, old_test_name = connection.settings_dict["NAME"], test_settings.get("NAME")
+    test_settings["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+        teardown_test_environment()
+
+
+def run_threads(worker, count, seconds):
+    """
+    Lance `count` threads worker(index, deadline) jusqu'à l'échéance ; chacun
+    ferme ses connexions en sortant.
+    """
+    deadline = time.perf_counter() + seconds
+
+    def run(index):
+        try:
+            worker(index, deadline)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@contextmanager
+def count_request_exceptions():
+    """
+    Compte les exceptions des vues : {"locked": ..., "errors": ...}. Le client
+    de test les relaie par un signal global, donc dans n'importe quel thread ;
+    les clients doivent avoir raise_request_exception à False.
+    """
+    counts = {"locked": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def receiver(sender, request, **kwargs):
+        error = sys.exc_info()[1]
+        locked = isinstance(error, OperationalError) and "locked" in str(error)
+        with lock:
+            counts["locked" if locked else "errors"] += 1
+
+    got_request_exception.connect(receiver)
+    try:
+        yield counts
+    finally:
+        got_request_exception.disconnect(receiver)
@@ -0,0 +1,172 @@
+# messaging_app/chats/benchmarks/data.py
+
+import itertools
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from chats.models import User, Conversation, ConversationParticipant, Message
+
+
+# Vocabulaire des messages générés (pour que la recherche plein texte ait du sens)
+WORDS = (
+    "bonjour merci demain réunion projet facture livraison client rendez-vous "
+    "photo document appel urgent semaine weekend voyage hôtel train avion "
+    "paiement contrat signature adresse téléphone message retour question "
+    "réponse problème solution test serveur déploiement version correctif"
+).split()
+# Vocabulaire complet : WORDS puis des mots synthétiques, tirés selon une loi de Zipf
+_SYLLABLES = ["ba", "co", "di", "fu", "ga", "li", "mo", "ne", "pa", "ri", "so", "tu", "vi", "za"]
+VOCABULARY = WORDS + [
+    a + b + c for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES
+]
+_ZIPF_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def random_body(rng):
+    return " ".join(rng.choices(VOCABULARY, cum_weights=_ZIPF_WEIGHTS, k=rng.randint(3, 15)))
+
+
+# Date de départ fixe : deux générations avec la même graine sont identiques
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@dataclass
+class BenchmarkData:
+    """Ce que les scénarios doivent connaître du jeu généré."""
+    users: list
+    conversations: list
+    # Conversations de la plus chargée à la moins chargée
+    conversations_by_size: list
+    message_counts: dict = field(default_factory=dict)
+    members: dict = field(default_factory=dict)
+
+    @property
+    def busiest_user(self):
+        """Participant de la conversation la plus chargée."""
+        return self.members[self.conversations_by_size[0]][0]
+
+
+def conversation_weights(n_conversations, skew):
+    """
+    Poids cumulés de Zipf : la conversation de rang r reçoit une part des
+    messages proportionnelle à 1 / r**skew (skew=0 : répartition uniforme).
+    """
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, n_conversations + 1)))
+
+
+@transaction.atomic
+def generate(seed=42, users=200, conversations=500, messages=50_000, skew=1.0, batch_size=5000):
+    """
+    Insère un jeu de données déterministe : mêmes identifiants, textes et dates
+    pour une même graine, quelle que soit la base ou le commit.
+    """
+    rng = random.Random(seed)
+    user_objs = User.objects.bulk_create([
+        User(
+            user_id=uuid.UUID(int=rng.getrandbits(128)),
+            email=f"bench-{i}@example.com",
+            first_name="Bench",
+            last_name=str(i),
+            password="!",
+        )
+        for i in range(users)
+    ], batch_size=batch_size)
+    conversation_objs = Conversation.objects.bulk_create([
+        Conversation(conversation_id=uuid.UUID(int=rng.getrandbits(128)))
+        for _ in range(conversations)
+    ], batch_size=batch_size)
+
+    members = {}
+    links = []
+    for conversation in conversation_objs:
+        chosen = rng.sample(user_objs, min(len(user_objs), rng.randint(2, 5)))
+        members[conversation.pk] = chosen
+        links.extend(ConversationParticipant(conversation=conversation, user=u) for u in chosen)
+    ConversationParticipant.objects.bulk_create(links, batch_size=batch_size)
+
+    weights = conversation_weights(len(conversation_objs), skew)
+    counts = dict.fromkeys((c.pk for c in conversation_objs), 0)
+    batch = []
+    for i in range(messages):
+        conversation = rng.choices(conversation_objs, cum_weights=weights)[0]
+        counts[conversation.pk] += 1
+        batch.append(Message(
+            message_id=uuid.UUID(int=rng.getrandbits(128)),
+            conversation=conversation,
+            sender=rng.choice(members[conversation.pk]),
+            message_body=random_body(rng),
+            sent_at=EPOCH + timedelta(seconds=i),
+        ))
+        if len(batch) >= batch_size:
+            Message.objects.bulk_create(batch)
+            batch = []
+    Message.objects.bulk_create(batch)
+    # Compteurs dénormalisés en une passe plutôt qu'à chaque paquet
+    pks = list(counts)
+    for i in range(0, len(pks), 500):
+        Conversation.objects.filter(pk__in=pks[i:i + 500]).rebuild_activity()
+
+    return BenchmarkData(
+        users=user_objs,
+        conversations=conversation_objs,
+        conversations_by_size=sorted(counts, key=lambda pk: (-counts[pk], str(pk))),
+        message_counts=counts,
+        members=members,
+    )
+
+
+@transaction.atomic
+def seed_data(rng, n_users, n_conversations, n_messages, batch_size=5000):
+    """Insère des données aléatoires (mais reproductibles pour une même graine)."""
+    prefix = uuid.UUID(int=rng.getrandbits(128)).hex[:8]
+    users = User.objects.bulk_create([
+        User(
+            user_id=uuid.UUID(int=rng.getrandbits(128)),
+            email=f"seed-{prefix}-{i}@example.com",
+            first_name="Seed",
+            last_name=str(i),
+            password="!",
+        )
+        for i in range(n_users)
+    ], batch_size=batch_size)
+
+    conversations = Conversation.objects.bulk_create([
+        Conversation(conversation_id=uuid.UUID(int=rng.getrandbits(128)))
+        for _ in range(n_conversations)
+    ], batch_size=batch_size)
+
+    members = {}
+    links = []
+    for conversation in conversations:
+        chosen = rng.sample(users, min(len(users), rng.randint(2, 5)))
+        members[conversation.pk] = chosen
+        links.extend(ConversationParticipant(conversation=conversation, user=u) for u in chosen)
+    ConversationParticipant.objects.bulk_create(links, batch_size=batch_size)
+
+    start = timezone.now() - timedelta(seconds=n_messages)
+    batch = []
+    for i in range(n_messages):
+        conversation = rng.choice(conversations)
+        batch.append(Message(
+            message_id=uuid.UUID(int=rng.getrandbits(128)),
+            conversation=conversation,
+            sender=rng.choice(members[conversation.pk]),
+            message_body=random_body(rng),
+            sent_at=start + timedelta(seconds=i),
+        ))
+        if len(batch) >= batch_size:
+            _insert_messages(batch)
+            batch = []
+    if batch:
+        _insert_messages(batch)
+    return users, conversations
+
+
+def _insert_messages(batch):
+    Message.objects.bulk_create(batch)
+    Conversation.objects.record_messages(batch)
@@ -0,0 +1,141 @@
+# messaging_app/chats/benchmarks/scenarios.py
+
+import itertools
+import random
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chats.authentication import ChatsTokenObtainPairSerializer
+from .data import VOCABULARY
+
+
+# -------------------------
+# Scénarios : chacun prépare et renvoie une fonction qui joue une requête
+# -------------------------
+def list_conversations(client, data, rng):
+    url = reverse("conversation-list")
+    return lambda: client.get(url)
+
+
+def page_messages(client, data, rng, page_size=50):
+    """Défile la conversation la plus chargée page par page, puis recommence."""
+    first = reverse("conversation-messages-list", kwargs={"conversation_pk": data.conversations_by_size[0]})
+    state = {"url": f"{first}?page_size={page_size}"}
+
+    def request():
+        response = client.get(state["url"])
+        state["url"] = response.data.get("next") or f"{first}?page_size={page_size}"
+        return response
+    return request
+
+
+def search(client, data, rng):
+    # Mots fréquents, moyens et rares (rang dans la loi de Zipf) et un préfixe
+    terms = itertools.cycle([
+        VOCABULARY[2], VOCABULARY[50], VOCABULARY[400], VOCABULARY[2000], VOCABULARY[40][:3],
+    ])
+    url = reverse("message-list")
+    return lambda: client.get(url, {"search": next(terms)})
+
+
+def create(client, data, rng):
+    url = reverse("message-list")
+    user = data.busiest_user
+    conversations = [pk for pk, members in data.members.items() if user in members]
+    return lambda: client.post(url, {
+        "conversation_id": str(rng.choice(conversations)),
+        "sender_id": str(user.pk),
+        "message_body": "message de benchmark",
+    }, format="json")
+
+
+def bulk_create(client, data, rng, size=100):
+    url = reverse("message-bulk")
+    user = data.busiest_user
+    conversations = [str(pk) for pk, members in data.members.items() if user in members]
+    return lambda: client.post(url, {"messages": [
+        {"conversation_id": rng.choice(conversations), "message_body": f"lot {i}"}
+        for i in range(size)
+    ]}, format="json")
+
+
+# Les lectures d'abord : les écritures modifient le jeu de données
+SCENARIOS = {
+    "list_conversations": list_conversations,
+    "page_messages": page_messages,
+    "search": search,
+    "create": create,
+    "bulk_create": bulk_create,
+}
+
+
+# -------------------------
+# Exécution et résultats
+# -------------------------
+def summarize(latencies, queries):
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "iterations": len(latencies),
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries": statistics.median_low(queries),
+        "queries_max": max(queries),
+    }
+
+
+# On mesure l'application, pas les seaux à jetons (chats.throttling)
+@override_settings(CHATS_THROTTLING=False)
+def run_scenarios(data, iterations=200, warmup=10, names=None, seed=42, log=None):
+    """
+    Joue chaque scénario `iterations` fois (après `warmup` requêtes non mesurées)
+    avec le client de test et un vrai jeton JWT ; renvoie {scénario: statistiques}.
+    """
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        client = APIClient()
+        token = ChatsTokenObtainPairSerializer.get_token(data.busiest_user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        request = scenario(client, data, random.Random(seed))
+
+        for _ in range(warmup):
+            request()
+        latencies, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} : HTTP {response.status_code}")
+            queries.append(len(captured))
+        results[name] = summarize(latencies, queries)
+        if log:
+            log(name, results[name])
+    return results
+
+
+def compare_results(previous, current):
+    """Lignes de comparaison entre deux fichiers de résultats (variation en %)."""
+    lines = []
+    for name, now in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if before is None:
+            lines.append(f"{name:<20} (nouveau)")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f"{key[:-3]} {before[key]:.2f} -> {now[key]:.2f} ms ({change:+.0f}%)")
+        deltas.append(f"requêtes {before['queries']} -> {now['queries']}")
+        lines.append(f"{name:<20} " + ", ".join(deltas))
+    return lines
@@ -0,0 +1,192 @@
+# messaging_app/chats/conditional.py
+
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Sum
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ConversationParticipant, Message
+
+logger = logging.getLogger("chats.cache")
+
+
+# -------------------------
+# Validateurs (ETag) calculés sans sérialiser
+# -------------------------
+def conversation_signature(user, conversation_id):
+    """
+    État d'une conversation vu par `user` (une requête sur l'index d'appartenance),
+    ou None si l'utilisateur n'y participe pas.
+    """
+    return (
+        ConversationParticipant.objects.filter(user=user, conversation_id=conversation_id)
+        .values_list(
+            "conversation__version",
+            "conversation__message_count",
+            "conversation__last_message_id",
+            "conversation__last_message_at",
+        )
+        .first()
+    )
+
+
+def message_signature(user, message_id):
+    """État de la conversation d'un message, si `user` y participe."""
+    return (
+        Message.objects.filter(pk=message_id, conversation__memberships__user=user)
+        .values_list(
+            "conversation_id",
+            "conversation__version",
+            "conversation__message_count",
+            "conversation__last_message_id",
+        )
+        .first()
+    )
+
+
+def inbox_signature(user):
+    """
+    État de toutes les conversations de `user` en une requête agrégée :
+    ensemble des appartenances (nombre, plus grand id) et somme des versions,
+    qui ne font qu'augmenter.
+    """
+    return tuple(
+        ConversationParticipant.objects.filter(user=user).aggregate(
+            memberships=Count("id"),
+            last_membership=Max("id"),
+            versions=Sum("conversation__version"),
+            last_message_at=Max("conversation__last_message_at"),
+        ).values()
+    )
+
+
+def make_etag(request, signature):
+    # La même ressource varie selon l'utilisateur, les paramètres et le format demandé
+    raw = repr((
+        request.user.pk,
+        request.get_full_path(),
+        request.META.get("HTTP_ACCEPT", ""),
+        signature,
+    ))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+# -------------------------
+# Cache des réponses indexé par la signature
+# -------------------------
+# Une écriture change la signature (version de la conversation), donc la clé :
+# les anciennes entrées ne sont plus jamais lues et expirent d'elles-mêmes.
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record_cache_event(name, event):
+    with _stats_lock:
+        _stats[(name, event)] += 1
+
+
+def response_cache_stats(reset=False):
+    """
+    Compteurs du processus par vue : {"conversation.retrieve": {"hit": ..., "miss": ...,
+    "hit_ratio": ...}, ...}. reset=True les remet à zéro.
+    """
+    with _stats_lock:
+        stats = {}
+        for (name, event), count in _stats.items():
+            stats.setdefault(name, {"hit": 0, "miss": 0})[event] = count
+        if reset:
+            _stats.clear()
+    for counts in stats.values():
+        total = counts["hit"] + counts["miss"]
+        counts["hit_ratio"] = counts["hit"] / total if total else 0.0
+    return stats
+
+
+def response_cache_key(request, etag):
+    # L'hôte en plus de l'ETag : les liens de pagination sont des URL absolues
+    raw = f"{request.get_host()}|{etag}"
+    return "chats:response:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    GET conditionnel pour list/retrieve : calcule un ETag faible à partir de
+    get_list_signature()/get_object_signature() et répond 304 à If-None-Match
+    avant toute lecture des objets ou sérialisation. Une signature None
+    (ressource inconnue ou interdite) laisse passer la requête normalement.
+
+    Pour les actions de `cached_actions`, les données de la réponse 200 sont
+    aussi gardées dans le cache CHATS_RESPONSE_CACHE pendant
+    CHATS_RESPONSE_CACHE_TIMEOUT secondes (0 = désactivé), sous la clé de
+    l'ETag. En-tête X-Cache : HIT ou MISS.
+    """
+    cached_actions = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, self.get_list_signature, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, self.get_object_signature, super().retrieve, *args, **kwargs)
+
+    def get_list_signature(self):
+        return None
+
+    def get_object_signature(self):
+        return None
+
+    def _conditional(self, request, get_signature, handler, *args, **kwargs):
+        try:
+            signature = get_signature()
+        except (TypeError, ValueError, ValidationError):
+            signature = None  # identifiant invalide : le 404 habituel suivra
+        if signature is None:
+            return handler(request, *args, **kwargs)
+        etag = "W/" + make_etag(request, signature)
+
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            # Comparaison faible : on ignore le préfixe W/
+            candidates = {tag.removeprefix("W/") for tag in parse_etags(if_none_match)}
+            if "*" in candidates or etag.removeprefix("W/") in candidates:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response["ETag"] = etag
+                return response
+
+        timeout = getattr(settings, "CHATS_RESPONSE_CACHE_TIMEOUT", 0)
+        if self.action in self.cached_actions and timeout:
+            response = self._cached(request, etag, timeout, handler, *args, **kwargs)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
+
+    def _cached(self, request, etag, timeout, handler, *args, **kwargs):
+        # Une signature non nulle prouve déjà l'appartenance : rien d'autre à vérifier
+        store = caches[getattr(settings, "CHATS_RESPONSE_CACHE", "default")]
+        key = response_cache_key(request, etag)
+        name = f"{self.basename}.{self.action}"
+        data = store.get(key)
+        if data is not None:
+            record_cache_event(name, "hit")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        record_cache_event(name, "miss")
+        # Les données sont lues après la signature : jamais plus anciennes que
+        # la version de la clé
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            store.set(key, response.data, timeout)
+            logger.debug("Réponse mise en cache : %s %s", name, request.get_full_path())
+        response["X-Cache"] = "MISS"
+        return response
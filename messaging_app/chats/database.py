@@ -0,0 +1,32 @@
+# messaging_app/chats/database.py
+
+from django.conf import settings
+
+
+# -------------------------
+# Réglages SQLite appliqués à chaque nouvelle connexion
+# -------------------------
+# WAL : les lectures ne bloquent plus les écritures (et inversement) ;
+# synchronous=NORMAL est sûr en WAL (seul le dernier commit peut être perdu
+# en cas de coupure de courant, jamais la cohérence de la base).
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,        # ms d'attente d'un verrou avant « database is locked »
+    "mmap_size": 268435456,      # 256 Mio lus par mmap
+    "cache_size": -65536,        # 64 Mio de cache de pages par connexion
+    "temp_store": "MEMORY",
+}
+
+
+def sqlite_pragmas():
+    return getattr(settings, "CHATS_SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Receveur de connection_created : applique CHATS_SQLITE_PRAGMAS."""
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,209 @@
+# messaging_app/chats/events.py
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+from .export import format_datetime
+from .models import Message
+from .permissions import is_participant
+
+
+# -------------------------
+# Hub pub/sub en mémoire (par processus)
+# -------------------------
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+REPLAY_PAGE_SIZE = 500
+RETRY_MILLISECONDS = 3000
+
+
+def message_event(message):
+    """Événement SSE d'un message, encodé une seule fois pour tous les abonnés."""
+    data = json.dumps({
+        "message_id": str(message.message_id),
+        "conversation_id": str(message.conversation_id),
+        "sender_id": str(message.sender_id),
+        "message_body": message.message_body,
+        "sent_at": format_datetime(message.sent_at),
+    }, ensure_ascii=False)
+    key = (message.sent_at, str(message.message_id))
+    return key, f"id: {message.message_id}\nevent: message\ndata: {data}\n\n"
+
+
+class Subscription:
+    """
+    File bornée d'une connexion. Si le client ne suit pas (file pleine),
+    l'abonnement est marqué `overflowed` et la connexion est fermée : le client
+    se reconnecte avec Last-Event-ID et rattrape depuis la base.
+    """
+
+    def __init__(self, hub, conversation_id, loop, maxsize=QUEUE_SIZE):
+        self.hub = hub
+        self.conversation_id = conversation_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Toujours exécuté dans la boucle de l'abonné
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)  # réveille le lecteur pour qu'il ferme
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """Diffuse les nouveaux messages aux connexions SSE de la conversation."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, conversation_id, maxsize=QUEUE_SIZE):
+        subscription = Subscription(self, conversation_id, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscriptions[conversation_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.conversation_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.conversation_id]
+
+    def subscriber_count(self, conversation_id=None):
+        with self._lock:
+            if conversation_id is not None:
+                return len(self._subscriptions.get(conversation_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, conversation_id, event):
+        """Appelable depuis n'importe quel thread (vues synchrones, signaux)."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(conversation_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:  # boucle fermée
+                self.unsubscribe(subscription)
+
+    def publish_messages(self, messages):
+        for message in messages:
+            self.publish(message.conversation_id, message_event(message))
+
+
+hub = EventHub()
+
+
+# -------------------------
+# Flux SSE d'une connexion
+# -------------------------
+def _replay_anchor(conversation_id, last_event_id):
+    """(sent_at, message_id) du message Last-Event-ID, None s'il est inconnu."""
+    try:
+        return (
+            Message.objects.filter(conversation_id=conversation_id, pk=last_event_id)
+            .values_list("sent_at", "message_id").first()
+        )
+    except ValidationError:
+        return None
+
+
+def _messages_after(conversation_id, anchor, limit=REPLAY_PAGE_SIZE):
+    """Page de messages manqués après `anchor` (rattrapage à la reconnexion)."""
+    sent_at, message_id = anchor
+    return list(
+        Message.objects.filter(conversation_id=conversation_id)
+        .filter(Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, message_id__gt=message_id))
+        .order_by("sent_at", "message_id")[:limit]
+    )
+
+
+async def event_stream(conversation_id, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Générateur asynchrone d'une connexion : abonnement d'abord, puis rattrapage
+    depuis la base page par page jusqu'au dernier message, puis événements en
+    direct (dédoublonnés avec le rattrapage) et commentaires de maintien de
+    connexion.
+    """
+    subscription = hub.subscribe(conversation_id)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        last_key = None
+        anchor = await sync_to_async(_replay_anchor)(conversation_id, last_event_id) if last_event_id else None
+        while anchor is not None:
+            page = await sync_to_async(_messages_after)(conversation_id, anchor, REPLAY_PAGE_SIZE)
+            for message in page:
+                last_key, event = message_event(message)
+                yield event
+            # Page incomplète : rattrapé ; les suivants arrivent par l'abonnement
+            anchor = (page[-1].sent_at, page[-1].message_id) if len(page) == REPLAY_PAGE_SIZE else None
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is None:  # file saturée : on ferme, le client se reconnecte
+                return
+            key, event = item
+            if last_key is not None and key <= last_key:
+                continue
+            yield event
+    finally:
+        subscription.close()
+
+
+def _authenticate(request):
+    """Applique les authentifications DRF configurées (JWT sans requête, session...)."""
+    from rest_framework.request import Request
+
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    return drf_request.user
+
+
+async def conversation_events(request, conversation_pk):
+    """
+    GET /conversations/{id}/events/ : nouveaux messages en Server-Sent Events.
+    Vue asynchrone à servir en ASGI (messaging_app/asgi.py, uvicorn). Sous
+    WSGI, le flux asynchrone occuperait un worker sans jamais rien envoyer :
+    501 tout de suite.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Flux SSE disponible seulement en ASGI.", status=501)
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except AuthenticationFailed:
+        return HttpResponse(status=401)
+    if not user or not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not await sync_to_async(is_participant)(user, conversation_pk):
+        raise Http404()
+
+    response = StreamingHttpResponse(
+        event_stream(conversation_pk, request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # pas de mise en tampon par nginx
+    return response
@@ -0,0 +1,103 @@
+# messaging_app/chats/export.py
+
+import csv
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .models import Message
+
+
+# -------------------------
+# Export en flux d'une conversation (NDJSON / CSV)
+# -------------------------
+EXPORT_FIELDS = ["message_id", "sender_id", "sender_email", "message_body", "sent_at"]
+EXPORT_CHUNK_SIZE = 2000
+
+
+def format_datetime(value):
+    """Même rendu que DateTimeField de DRF (UTC suffixé par Z) ; aussi pour les flux SSE."""
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def export_rows(conversation_id, after=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Lignes (tuples) de la conversation dans l'ordre (sent_at, message_id),
+    lues par iterator() : la mémoire reste constante quelle que soit la taille.
+    `after` (message_id) reprend l'export juste après ce message.
+    """
+    queryset = Message.objects.filter(conversation_id=conversation_id)
+    if after:
+        try:
+            anchor = queryset.filter(pk=after).values_list("sent_at", "message_id").first()
+        except DjangoValidationError:
+            anchor = None
+        if anchor is None:
+            raise NotFound("Message de reprise introuvable.")
+        sent_at, message_id = anchor
+        queryset = queryset.filter(Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, message_id__gt=message_id))
+    return (
+        queryset.order_by("sent_at", "message_id")
+        .values_list("message_id", "sender_id", "sender__email", "message_body", "sent_at")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _batched(lines, size=500):
+    # Regroupe les lignes pour limiter le nombre d'écritures sur la socket
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def ndjson_lines(rows):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for message_id, sender_id, sender_email, body, sent_at in rows:
+        yield dumps({
+            "message_id": str(message_id),
+            "sender_id": str(sender_id),
+            "sender_email": sender_email,
+            "message_body": body,
+            "sent_at": format_datetime(sent_at),
+        }) + "\n"
+
+
+class _Echo:
+    """Pseudo-fichier : csv.writer renvoie directement la ligne écrite."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for message_id, sender_id, sender_email, body, sent_at in rows:
+        yield writer.writerow([message_id, sender_id, sender_email, body, format_datetime(sent_at)])
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", ndjson_lines, "ndjson"),
+    "csv": ("text/csv", csv_lines, "csv"),
+}
+
+
+def export_response(conversation_id, output="ndjson", after=None):
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({"output": f"Formats possibles : {', '.join(EXPORT_FORMATS)}."})
+    content_type, to_lines, extension = EXPORT_FORMATS[output]
+    rows = export_rows(conversation_id, after=after)
+    response = StreamingHttpResponse(_batched(to_lines(rows)), content_type=f"{content_type}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="conversation-{conversation_id}.{extension}"'
+    return response
@@ -0,0 +1,203 @@
+# messaging_app/chats/fieldsets.py
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+# -------------------------
+# ?fields= / ?exclude= : champs demandés par le client
+# -------------------------
+def parse_fields(value):
+    """
+    "message_id,sender.email,sender.role" -> {"message_id": {}, "sender": {"email": {}, "role": {}}}.
+    Un arbre vide désigne le champ entier.
+    """
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class Fieldset:
+    """
+    Champs à garder (`include`, None = tous) et à retirer (`exclude`) d'une
+    représentation, chaque niveau d'imbrication ayant le sien (nested()).
+    ?fields=sender.email garde `sender` réduit à `email` ; ?exclude=sender.email
+    garde `sender` sans `email`.
+    """
+
+    def __init__(self, include=None, exclude=None, path=""):
+        self.include = include
+        self.exclude = exclude or {}
+        self.path = path
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        """Fieldset de ?fields= / ?exclude=, ou None si ni l'un ni l'autre n'est donné."""
+        fields, exclude = query_params.get("fields"), query_params.get("exclude")
+        if not fields and not exclude:
+            return None
+        return cls(parse_fields(fields) if fields else None, parse_fields(exclude) if exclude else None)
+
+    def apply(self, names, nested=()):
+        """
+        Noms de `names` à garder, dans leur ordre. Un nom inconnu, ou des
+        sous-champs pour un champ hors de `nested`, sont une erreur du client
+        (400), pas un filtre silencieux.
+        """
+        unknown = (set(self.include or ()) | set(self.exclude)) - set(names)
+        if unknown:
+            raise ValidationError({"fields": [
+                f"Champ inconnu : {self.path}{name}" for name in sorted(unknown)
+            ]})
+        flat = [name for name in names if name not in nested and self.nested(name) is not None]
+        if flat:
+            raise ValidationError({"fields": [
+                f"{self.path}{name} n'a pas de sous-champs." for name in flat
+            ]})
+        return [
+            name for name in names
+            if (self.include is None or name in self.include) and self.exclude.get(name) != {}
+        ]
+
+    def nested(self, name):
+        """Fieldset du champ imbriqué `name`, ou None s'il est demandé en entier."""
+        include = self.include.get(name) if self.include else None
+        exclude = self.exclude.get(name)
+        if not include and not exclude:
+            return None
+        return Fieldset(include or None, exclude, f"{self.path}{name}.")
+
+
+class SparseFieldsMixin:
+    """
+    Sérialiseur DRF réduit par un Fieldset (argument `fieldset`), transmis à
+    ses sérialiseurs imbriqués. `field_dependencies` : colonnes lues par les
+    champs calculés, pour trim_queryset().
+    """
+    field_dependencies = {}
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        self.fieldset = fieldset
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.fieldset is None:
+            return fields
+        # Sérialiseurs imbriqués (ou enfant d'un many=True) qui acceptent un Fieldset
+        children = {
+            name: getattr(field, "child", field) for name, field in fields.items()
+            if isinstance(getattr(field, "child", field), SparseFieldsMixin)
+        }
+        kept = {name: fields[name] for name in self.fieldset.apply(list(fields), nested=children)}
+        for name in kept.keys() & children.keys():
+            children[name].fieldset = self.fieldset.nested(name)
+        return kept
+
+
+class SparseFieldsViewMixin:
+    """
+    Passe le Fieldset de la requête aux sérialiseurs de la vue (get_serializer).
+    Lectures seulement : en écriture, retirer des champs changerait la validation.
+    """
+
+    def get_fieldset(self):
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = Fieldset.from_query_params(self.request.query_params)
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault("fieldset", fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+
+class LimitedListSerializer(serializers.ListSerializer):
+    """
+    many=True borné aux `limit` premiers objets dans l'ordre `ordering` :
+    préchargement tronqué par trim_queryset() (dans l'attribut `to_attr`),
+    sinon lecture avec LIMIT.
+    """
+
+    def __init__(self, *args, ordering, limit, **kwargs):
+        self.ordering = ordering
+        self.limit = limit
+        super().__init__(*args, **kwargs)
+
+    @property
+    def to_attr(self):
+        return f"_limited_{self.source}"
+
+    def get_attribute(self, instance):
+        prefetched = getattr(instance, self.to_attr, None)
+        if prefetched is not None:
+            return prefetched
+        return super().get_attribute(instance).order_by(*self.ordering)[:self.limit]
+
+
+# -------------------------
+# Colonnes lues : only() / select_related() / Prefetch réduits
+# -------------------------
+def trim_queryset(queryset, serializer, extra=()):
+    """
+    Ne lit que les colonnes des champs de `serializer` (après réduction) :
+    only() sur le modèle, select_related() pour les sérialiseurs imbriqués
+    simples, Prefetch réduit pour les multiples. `extra` : colonnes en plus.
+    Inchangé si un champ ne se ramène pas à des colonnes connues.
+    """
+    plan = _read_plan(queryset.model, serializer)
+    if plan is None:
+        return queryset
+    columns, related, prefetches = plan
+    queryset = queryset.select_related(None).only(*columns, *extra)
+    if related:
+        queryset = queryset.select_related(*related)
+    for lookup, prefetch_queryset, to_attr in prefetches:
+        queryset = queryset.prefetch_related(Prefetch(lookup, queryset=prefetch_queryset, to_attr=to_attr))
+    return queryset
+
+
+def _read_plan(model, serializer, prefix=""):
+    opts = model._meta
+    columns, related, prefetches = [prefix + opts.pk.name], [], []
+    dependencies = getattr(serializer, "field_dependencies", {})
+    for name, field in serializer.fields.items():
+        if name in dependencies:
+            columns += [prefix + column for column in dependencies[name]]
+            continue
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return None  # propriété, méthode, annotation : colonnes inconnues
+        if isinstance(field, serializers.ListSerializer):
+            if prefix or not (model_field.one_to_many or model_field.many_to_many):
+                return None
+            # Clé étrangère inverse : la colonne qui rattache chaque objet préchargé
+            extra = (model_field.field.name,) if model_field.one_to_many else ()
+            prefetch_queryset = trim_queryset(model_field.related_model._default_manager.all(), field.child, extra)
+            to_attr = None
+            if isinstance(field, LimitedListSerializer):
+                # Préchargement tronqué : seulement dans un attribut à part (to_attr)
+                prefetch_queryset = prefetch_queryset.order_by(*field.ordering)[:field.limit]
+                to_attr = field.to_attr
+            prefetches.append((field.source, prefetch_queryset, to_attr))
+        elif isinstance(field, serializers.BaseSerializer):
+            if not (model_field.many_to_one or model_field.one_to_one):
+                return None
+            nested = _read_plan(model_field.related_model, field, f"{prefix}{field.source}__")
+            if nested is None or nested[2]:
+                return None
+            columns += nested[0]
+            related += [prefix + field.source, *nested[1]]
+        else:
+            columns.append(prefix + field.source)
+    return columns, related, prefetches
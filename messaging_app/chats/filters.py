@@ -1,5 +1,7 @@
 # chats/filters.py
 import django_filters
+from rest_framework import filters
+
 from .models import Message
 
 class MessageFilter(django_filters.FilterSet):
@@ -10,3 +12,21 @@ class MessageFilter(django_filters.FilterSet):
     class Meta:
         model = Message
         fields = ["sender", "sent_after", "sent_before"]
+
+
+class PrimaryKeyOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter dont le tri se termine toujours par la clé primaire, dans le
+    sens du dernier critère : ordre total, donc pages stables quand plusieurs
+    lignes ont la même valeur (sent_at, last_message_at). Avec des clés UUIDv7
+    (chats.uuids), les ex aequo sont rangés par ordre de création.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or not all(isinstance(term, str) for term in ordering):
+            return ordering
+        pk = queryset.model._meta.pk.name
+        if any(term.lstrip("-") in (pk, "pk") for term in ordering):
+            return ordering
+        return [*ordering, f"-{pk}" if ordering[-1].startswith("-") else pk]
@@ -0,0 +1,101 @@
+# messaging_app/chats/instrumentation.py
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+# -------------------------
+# Enregistrement des requêtes SQL (connection.execute_wrapper)
+# -------------------------
+# Listes de paramètres de longueur variable : IN (%s, %s, ...) -> IN (%s...)
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def query_shape(sql):
+    """Forme d'une requête : paramètres, listes et nombres littéraux neutralisés."""
+    sql = _PLACEHOLDER_LIST_RE.sub("(%s...)", sql)
+    sql = _NUMBER_RE.sub("N", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """
+    Wrapper d'exécution (voir connection.execute_wrapper) qui note chaque
+    requête et sa durée. Ne garde que le texte SQL, jamais les paramètres.
+    """
+
+    def __init__(self):
+        self.queries = []  # (alias, sql, durée en secondes)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context["connection"].alias, sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def slowest(self, limit=3):
+        return sorted(self.queries, key=lambda query: query[2], reverse=True)[:limit]
+
+    def repeated_shapes(self, threshold=5):
+        """
+        Formes exécutées au moins `threshold` fois : le signe habituel d'un
+        N+1 (une requête par objet d'une liste). Du plus au moins répété.
+        """
+        shapes = Counter(query_shape(sql) for _, sql, _ in self.queries)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+@contextmanager
+def record_queries(using=None):
+    """Enregistre les requêtes de toutes les connexions (ou des alias `using`)."""
+    recorder = QueryRecorder()
+    aliases = [using] if isinstance(using, str) else using or list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+# -------------------------
+# Budget de requêtes pour les tests
+# -------------------------
+def describe_queries(recorder, n_plus_one_threshold=5):
+    lines = [f"{i}. {sql}" for i, (_, sql, _) in enumerate(recorder.queries, start=1)]
+    for shape, count in recorder.repeated_shapes(n_plus_one_threshold):
+        lines.append(f"N+1 probable ({count}x) : {shape}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, using=None, n_plus_one_threshold=5):
+    """
+    Échoue (AssertionError) si le bloc exécute plus de `max_queries` requêtes.
+    Contrairement à assertNumQueries, un nombre inférieur est accepté : le
+    budget est un plafond déclaré par vue. Le message liste les requêtes et
+    signale les formes répétées.
+
+        with query_budget(4):
+            self.client.get(reverse("conversation-list"))
+    """
+    with record_queries(using) as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise AssertionError(
+            f"{recorder.count} requêtes pour un budget de {max_queries} :\n"
+            + describe_queries(recorder, n_plus_one_threshold)
+        )
@@ -0,0 +1,57 @@
+# messaging_app/chats/management/commands/bench_bulk_send.py
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chats.models import User, Conversation
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit (messages/s) de POST /messages/ (un message par requête) "
+        "et de POST /messages/bulk/. Les données créées sont supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        n, batch_size = options["messages"], options["batch_size"]
+        tag = uuid.uuid4().hex[:8]
+        sender = User.objects.create(email=f"bench-{tag}-a@example.com", first_name="A", last_name="Bench")
+        other = User.objects.create(email=f"bench-{tag}-b@example.com", first_name="B", last_name="Bench")
+        conversation = Conversation.objects.create()
+        conversation.participants.set([sender, other])
+
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(sender)
+        try:
+            started = time.perf_counter()
+            for i in range(n):
+                client.post(reverse("message-list"), {
+                    "conversation_id": str(conversation.pk),
+                    "sender_id": str(sender.pk),
+                    "message_body": f"single {i}",
+                }, format="json")
+            single = n / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for offset in range(0, n, batch_size):
+                items = [
+                    {"conversation_id": str(conversation.pk), "message_body": f"bulk {i}"}
+                    for i in range(offset, min(n, offset + batch_size))
+                ]
+                client.post(reverse("message-bulk"), {"messages": items}, format="json")
+            bulk = n / (time.perf_counter() - started)
+        finally:
+            conversation.delete()
+            User.objects.filter(pk__in=[sender.pk, other.pk]).delete()
+
+        self.stdout.write(f"POST /messages/       : {single:10.0f} messages/s")
+        self.stdout.write(f"POST /messages/bulk/  : {bulk:10.0f} messages/s (lots de {batch_size})")
+        self.stdout.write(f"Gain                  : {bulk / single:10.1f}x")
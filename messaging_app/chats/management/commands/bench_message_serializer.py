@@ -0,0 +1,87 @@
+# messaging_app/chats/management/commands/bench_message_serializer.py
+
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from chats.models import User, Conversation, Message
+from chats.serializers import FastMessageSerializer, MessageSerializer, SideloadedMessageSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit (lignes/s) de MessageSerializer, de FastMessageSerializer et "
+        "de ?include=users (SideloadedMessageSerializer) pour une page de messages "
+        "(lecture + sérialisation), à plusieurs tailles de page, et la taille du JSON. "
+        "Les données créées sont supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_sizes = options["page_sizes"]
+        tag = uuid.uuid4().hex[:8]
+        senders = [
+            User.objects.create(email=f"bench-{tag}-{i}@example.com", first_name="Bench", last_name=str(i))
+            for i in range(10)
+        ]
+        conversation = Conversation.objects.create()
+        conversation.participants.set(senders)
+        start = timezone.now() - timedelta(days=1)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=senders[i % len(senders)],
+                    message_body=f"message de test numéro {i} " * 3,
+                    sent_at=start + timedelta(seconds=i))
+            for i in range(max(page_sizes))
+        ])
+
+        base = Message.objects.filter(conversation=conversation).order_by("-sent_at", "-message_id")
+
+        def sideloaded(size):
+            serializer = SideloadedMessageSerializer(
+                list(SideloadedMessageSerializer.prepare_queryset(base)[:size]), many=True
+            )
+            return {"results": serializer.data, "users": serializer.users}
+
+        variants = {
+            "MessageSerializer": lambda size: {
+                "results": MessageSerializer(list(base.select_related("sender")[:size]), many=True).data
+            },
+            "FastMessageSerializer": lambda size: {
+                "results": FastMessageSerializer(
+                    list(FastMessageSerializer.prepare_queryset(base)[:size]), many=True
+                ).data
+            },
+            "include=users": sideloaded,
+        }
+        try:
+            self.stdout.write(f"{'page':>6}" + "".join(f"{name:>24}" for name in variants) + f"{'gain':>8}")
+            for size in page_sizes:
+                rates, sizes = {}, {}
+                for name, build in variants.items():
+                    rates[name] = self.measure(lambda: build(size), size, options["repeat"])
+                    sizes[name] = len(JSONRenderer().render(build(size)))
+                self.stdout.write(
+                    f"{size:>6}"
+                    + "".join(f"{rates[name]:>10.0f} l/s {sizes[name]:>8} o" for name in variants)
+                    + f"{rates['FastMessageSerializer'] / rates['MessageSerializer']:>7.1f}x"
+                )
+        finally:
+            conversation.delete()
+            User.objects.filter(pk__in=[sender.pk for sender in senders]).delete()
+
+    @staticmethod
+    def measure(serialize, size, repeat):
+        # Meilleur temps sur `repeat` essais (le moins bruité)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            serialize()
+            best = min(best, time.perf_counter() - started)
+        return size / best
@@ -0,0 +1,79 @@
+# messaging_app/chats/management/commands/bench_payloads.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from chats.benchmarks import generate
+from chats.benchmarks.concurrency import file_test_database
+from chats.renderers import FastJSONRenderer, MessagePackRenderer
+
+
+RENDERERS = {
+    "json": (JSONRenderer, "application/json"),
+    "orjson": (FastJSONRenderer, "application/json"),
+    "msgpack": (MessagePackRenderer, "application/msgpack"),
+}
+
+# Réponses complètes et réduites (?fields=) d'un client mobile
+VARIANTS = {
+    "page": {},
+    "page ?fields": {"fields": "message_id,message_body,sent_at,sender.full_name"},
+    "détail": {},
+    "détail ?fields": {"fields": "conversation_id,messages.message_id,messages.preview"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Taille des réponses et temps d'encodage (json de DRF, orjson, MessagePack), "
+        "complètes ou réduites par ?fields=, pour une page de messages et le détail "
+        "de la conversation la plus chargée ; plus la durée totale de la requête."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--messages", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with file_test_database(), override_settings(CHATS_THROTTLING=False, CHATS_RESPONSE_CACHE_TIMEOUT=0):
+            data = generate(users=50, conversations=100, messages=options["messages"])
+            conversation = data.conversations_by_size[0]
+            client = APIClient()
+            client.force_authenticate(data.members[conversation][0])
+            urls = {
+                "page": reverse("conversation-messages-list", kwargs={"conversation_pk": conversation}),
+                "détail": reverse("conversation-detail", kwargs={"pk": conversation}),
+            }
+            self.stdout.write(
+                f"conversation la plus chargée : {data.message_counts[conversation]} messages, "
+                f"pages de {options['page_size']}"
+            )
+            self.stdout.write(f"{'réponse':<16}{'rendu':<9}{'octets':>10}{'encodage (ms)':>15}{'requête (ms)':>14}")
+            for variant, params in VARIANTS.items():
+                url = urls[variant.split()[0]]
+                params = {"page_size": options["page_size"], **params}
+                payload = client.get(url, params).data
+                for name, (renderer_class, accept) in RENDERERS.items():
+                    renderer = renderer_class()
+                    content = renderer.render(payload, accept)
+                    encode = self.best(lambda: renderer.render(payload, accept), options["repeat"])
+                    request = self.best(lambda: client.get(url, params, HTTP_ACCEPT=accept), options["repeat"] // 4 or 1)
+                    self.stdout.write(
+                        f"{variant:<16}{name:<9}{len(content):>10}{encode * 1000:>15.2f}{request * 1000:>14.1f}"
+                    )
+
+    @staticmethod
+    def best(run, repeat):
+        # Meilleur temps sur `repeat` essais (le moins bruité)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        return best
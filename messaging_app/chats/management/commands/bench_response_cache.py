@@ -0,0 +1,84 @@
+# messaging_app/chats/management/commands/bench_response_cache.py
+
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chats.benchmarks import generate
+from chats.benchmarks.concurrency import file_test_database
+from chats.conditional import response_cache_stats
+from chats.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Lectures répétées de la conversation la plus chargée (détail et page de "
+        "messages) sans cache, avec cache, puis avec une écriture toutes les N "
+        "lectures : débit, latences et taux de succès du cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Lectures par phase.")
+        parser.add_argument("--write-every", type=int, default=20,
+                            help="Un nouveau message toutes les N lectures (dernière phase).")
+        parser.add_argument("--messages", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with file_test_database(), override_settings(CHATS_THROTTLING=False, CHATS_MAX_INFLIGHT_WRITES=0):
+            data = generate(users=50, conversations=100, messages=options["messages"])
+            conversation = data.conversations_by_size[0]
+            self.stdout.write(
+                f"conversation la plus chargée : {data.message_counts[conversation]} messages"
+            )
+            phases = (
+                ("sans cache", 0, 0),
+                ("avec cache", settings.CHATS_RESPONSE_CACHE_TIMEOUT or 300, 0),
+                (f"écriture / {options['write_every']}", settings.CHATS_RESPONSE_CACHE_TIMEOUT or 300,
+                 options["write_every"]),
+            )
+            for name, timeout, write_every in phases:
+                caches[settings.CHATS_RESPONSE_CACHE].clear()
+                response_cache_stats(reset=True)
+                with override_settings(CHATS_RESPONSE_CACHE_TIMEOUT=timeout):
+                    latencies = self.run_phase(data, conversation, options["requests"], write_every)
+                self.report(name, latencies, response_cache_stats())
+
+    def run_phase(self, data, conversation, requests, write_every):
+        user = data.members[conversation][0]
+        client = APIClient()
+        client.force_authenticate(user)
+        urls = [
+            reverse("conversation-detail", kwargs={"pk": conversation}),
+            reverse("conversation-messages-list", kwargs={"conversation_pk": conversation}),
+        ]
+        latencies = {url: [] for url in urls}
+        for i in range(requests):
+            if write_every and i and i % write_every == 0:
+                Message.objects.create(conversation_id=conversation, sender=user, message_body="nouveau")
+            url = urls[i % len(urls)]
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies[url].append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+        return dict(zip(("détail", "messages"), latencies.values()))
+
+    def report(self, name, latencies, stats):
+        total = sum(sum(values) for values in latencies.values())
+        count = sum(len(values) for values in latencies.values())
+        parts = []
+        for endpoint, values in latencies.items():
+            cuts = statistics.quantiles(values, n=100, method="inclusive")
+            parts.append(f"{endpoint} p50 {cuts[49] * 1000:6.2f} ms p99 {cuts[98] * 1000:6.2f} ms")
+        hits = sum(counts["hit"] for counts in stats.values())
+        misses = sum(counts["miss"] for counts in stats.values())
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        self.stdout.write(
+            f"{name:<14} {count / total:7.0f} lectures/s  " + "  ".join(parts)
+            + f"  succès cache {ratio:5.1%} ({hits}/{hits + misses})"
+        )
@@ -0,0 +1,78 @@
+# messaging_app/chats/management/commands/bench_search.py
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from chats.benchmarks.concurrency import file_test_database
+from chats.models import User, Message
+from chats.search import search_messages
+from chats.benchmarks.data import VOCABULARY, seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la latence de ?search= : SearchFilter (icontains) contre l'index FTS5 "
+        "(première page + COUNT, sur les conversations de l'utilisateur le plus actif). "
+        "Données générées dans une base jetable, sauf --skip-seed (données de la base "
+        "existante) ou --seed-into-default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--conversations", type=int, default=5000)
+        parser.add_argument("--messages", type=int, default=1_000_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--skip-seed", action="store_true", help="utiliser les données existantes")
+        parser.add_argument("--seed-into-default", action="store_true",
+                            help="générer les données dans la base `default` (elles y restent)")
+
+    def handle(self, *args, **options):
+        if options["skip_seed"] or options["seed_into_default"]:
+            return self.run(options)
+        with file_test_database():
+            self.run(options)
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        if not options["skip_seed"]:
+            started = time.perf_counter()
+            seed_data(rng, options["users"], options["conversations"], options["messages"])
+            self.stdout.write(f"Données générées en {time.perf_counter() - started:.1f}s")
+
+        user = User.objects.annotate(n=Count("memberships")).order_by("-n").first()
+        base = Message.objects.filter(conversation__participants=user)
+        # Mots fréquents, moyens et rares (rang dans la loi de Zipf), un préfixe, deux mots
+        terms = [
+            VOCABULARY[2], VOCABULARY[200], VOCABULARY[2000],
+            VOCABULARY[40][:3], f"{VOCABULARY[5]} {VOCABULARY[30]}",
+            # Adresse d'un expéditeur (correspondance hors du texte)
+            user.email.split("@")[0],
+        ]
+
+        self.stdout.write(f"{Message.objects.count()} messages, utilisateur {user.email}")
+        self.stdout.write(f"{'terme':<28}{'icontains (ms)':>16}{'fts5 (ms)':>12}{'gain':>8}")
+        for term in terms:
+            like = base.filter(
+                Q(message_body__icontains=term) | Q(sender__email__icontains=term)
+            ).order_by("-sent_at")
+            fts = search_messages(base, term)
+            like_ms = self.measure(like, options["repeat"])
+            fts_ms = self.measure(fts, options["repeat"])
+            self.stdout.write(
+                f"{term:<28}{like_ms:>16.2f}{fts_ms:>12.2f}{like_ms / max(fts_ms, 1e-6):>7.1f}x"
+            )
+
+    @staticmethod
+    def measure(queryset, repeat, page_size=20):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,87 @@
+# messaging_app/chats/management/commands/bench_sse.py
+
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chats.events import event_stream, hub
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge local du flux SSE : N abonnés inactifs sur quelques "
+        "conversations, mémoire par connexion et latence de diffusion "
+        "(publication depuis un autre thread, comme une vue synchrone)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=5000)
+        parser.add_argument("--conversations", type=int, default=10)
+        parser.add_argument("--messages", type=int, default=20)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options["subscribers"], options["conversations"], options["messages"]))
+
+    async def run(self, n_subscribers, n_conversations, n_messages):
+        conversations = [uuid.uuid4() for _ in range(n_conversations)]
+        received = {}  # message_id -> heures de réception
+
+        async def consume(stream):
+            async for event in stream:
+                if event.startswith("id: "):
+                    received.setdefault(event[4:40], []).append(time.perf_counter())
+
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        streams, tasks = [], []
+        for i in range(n_subscribers):
+            stream = event_stream(conversations[i % n_conversations], heartbeat=3600)
+            await anext(stream)  # « retry: » : l'abonnement est enregistré
+            streams.append(stream)
+            tasks.append(asyncio.create_task(consume(stream)))
+        await asyncio.sleep(0)
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{hub.subscriber_count()} abonnés : {(after - before) / n_subscribers / 1024:.1f} Kio par connexion"
+        )
+
+        latencies = []
+        for i in range(n_messages):
+            message = SimpleNamespace(
+                message_id=uuid.uuid4(),
+                conversation_id=conversations[i % n_conversations],
+                sender_id=uuid.uuid4(),
+                message_body=f"bench {i}",
+                sent_at=timezone.now(),
+            )
+            expected = n_subscribers // n_conversations + (i % n_conversations < n_subscribers % n_conversations)
+            published = time.perf_counter()
+            thread = threading.Thread(target=hub.publish_messages, args=([message],))
+            thread.start()
+            key = str(message.message_id)
+            while len(received.get(key, ())) < expected:
+                await asyncio.sleep(0.0005)
+            thread.join()
+            deliveries = received[key]
+            latencies.append((max(deliveries) - published) * 1000)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for stream in streams:
+            await stream.aclose()
+
+        latencies.sort()
+        self.stdout.write(
+            f"Diffusion à {n_subscribers // n_conversations} abonnés par conversation : "
+            f"p50 {statistics.median(latencies):.1f} ms, max {latencies[-1]:.1f} ms "
+            f"({n_messages} messages, jusqu'au dernier abonné servi)"
+        )
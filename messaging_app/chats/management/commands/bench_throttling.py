@@ -0,0 +1,117 @@
+# messaging_app/chats/management/commands/bench_throttling.py
+
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chats.benchmarks import generate
+from chats.benchmarks.concurrency import count_request_exceptions, file_test_database, run_threads
+
+
+class Command(BaseCommand):
+    help = (
+        "Clients réguliers et un client abusif en parallèle, sans puis avec limitation "
+        "de débit et délestage : latences des clients réguliers (p50/p99) et réponses "
+        "reçues par le client abusif (2xx, 429, 503)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8, help="Clients réguliers (un utilisateur chacun).")
+        parser.add_argument("--interval", type=float, default=0.25,
+                            help="Pause (s) entre deux requêtes d'un client régulier.")
+        parser.add_argument("--abusive-threads", type=int, default=2,
+                            help="Threads du client abusif (un seul utilisateur, sans pause).")
+        parser.add_argument("--seconds", type=float, default=10)
+
+    def handle(self, *args, **options):
+        with file_test_database():
+            data = generate(users=50, conversations=100, messages=5000)
+            unlimited = {"CHATS_THROTTLING": False, "CHATS_MAX_INFLIGHT_WRITES": 0}
+            phases = (
+                # Référence : les clients réguliers seuls
+                ("sans abus", unlimited, 0),
+                ("sans limitation", unlimited, options["abusive_threads"]),
+                ("avec limitation", {}, options["abusive_threads"]),
+            )
+            for name, overrides, abusive_threads in phases:
+                store = os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3")
+                with override_settings(CHATS_RATE_STORE=store, **overrides):
+                    self.report(name, self.run_phase(data, options, abusive_threads), options["seconds"])
+
+    def run_phase(self, data, options, abusive_threads):
+        abuser = data.busiest_user
+        target = str(data.conversations_by_size[0])
+        regulars = [user for user in data.users if user != abuser][:options["clients"]]
+        stats = {"latencies": [], "regular_errors": 0, "abusive": {}}
+        lock = threading.Lock()
+
+        def regular(index, deadline):
+            rng = random.Random(index)
+            user = regulars[index]
+            conversations = [str(pk) for pk, members in data.members.items() if user in members]
+            client = self.client(user)
+            latencies, errors = [], 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                if conversations and rng.random() < 0.3:
+                    response = client.post(reverse("message-list"), {
+                        "conversation_id": rng.choice(conversations),
+                        "sender_id": str(user.pk),
+                        "message_body": "message régulier",
+                    }, format="json")
+                else:
+                    response = client.get(reverse("conversation-list"))
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= 400
+                time.sleep(options["interval"])
+            with lock:
+                stats["latencies"].extend(latencies)
+                stats["regular_errors"] += errors
+
+        def abusive(index, deadline):
+            client = self.client(abuser)
+            statuses = {}
+            while time.perf_counter() < deadline:
+                response = client.post(reverse("message-list"), {
+                    "conversation_id": target, "sender_id": str(abuser.pk), "message_body": "spam",
+                }, format="json")
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            with lock:
+                for code, count in statuses.items():
+                    stats["abusive"][code] = stats["abusive"].get(code, 0) + count
+
+        def worker(index, deadline):
+            if index < len(regulars):
+                regular(index, deadline)
+            else:
+                abusive(index, deadline)
+
+        with count_request_exceptions() as errors:
+            run_threads(worker, len(regulars) + abusive_threads, options["seconds"])
+        stats["exceptions"] = errors
+        return stats
+
+    def client(self, user):
+        client = APIClient()
+        client.raise_request_exception = False
+        client.force_authenticate(user)
+        return client
+
+    def report(self, name, stats, seconds):
+        cuts = statistics.quantiles(stats["latencies"], n=100, method="inclusive")
+        abusive = stats["abusive"]
+        accepted = sum(count for code, count in abusive.items() if code < 300)
+        self.stdout.write(
+            f"{name:<16} réguliers : {len(stats['latencies'])} requêtes, p50 {cuts[49] * 1000:6.1f} ms, "
+            f"p99 {cuts[98] * 1000:6.1f} ms, erreurs {stats['regular_errors']}  |  "
+            f"abusif : {accepted / seconds:5.1f} acceptées/s, 429 {abusive.get(429, 0)}, "
+            f"503 {abusive.get(503, 0)}, exceptions {sum(stats['exceptions'].values())}"
+        )
@@ -0,0 +1,106 @@
+# messaging_app/chats/management/commands/bench_uuid_inserts.py
+
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chats.database import DEFAULT_SQLITE_PRAGMAS
+from chats.models import Message
+from chats.uuids import uuid7
+
+
+class Command(BaseCommand):
+    help = (
+        "Insertions dans une table chats_message neuve (même schéma et mêmes index "
+        "que l'application, sans l'index de recherche) avec des clés uuid4 puis "
+        "UUIDv7 : débit par tranche à mesure que la table grossit, taille finale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--chunk", type=int, default=100_000, help="Lignes par mesure.")
+        parser.add_argument("--batch", type=int, default=10_000, help="Lignes par transaction.")
+        parser.add_argument("--cache-mb", type=int, default=None,
+                            help="Cache de pages SQLite (Mo) ; par défaut celui de CHATS_SQLITE_PRAGMAS.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stderr.write("Ce test ne concerne que SQLite.")
+            return
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(Message)
+        schema = editor.collected_sql
+        pragmas = dict(getattr(settings, "CHATS_SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS))
+        if options["cache_mb"] is not None:
+            pragmas["cache_size"] = -1024 * options["cache_mb"]
+
+        results = {}
+        for name, make_id in (("uuid4", uuid.uuid4), ("uuid7", uuid7)):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, f"{name}.sqlite3")
+            conn = sqlite3.connect(path, isolation_level=None)
+            try:
+                for pragma, value in pragmas.items():
+                    conn.execute(f"PRAGMA {pragma} = {value}")
+                for statement in schema:
+                    conn.execute(statement)
+                timings = self.run(conn, make_id, options)
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+            results[name] = {"timings": timings, "bytes": os.path.getsize(path)}
+            for file in os.listdir(directory):
+                os.remove(os.path.join(directory, file))
+            os.rmdir(directory)
+
+        self.report(results, options)
+
+    def run(self, conn, make_id, options):
+        # Quelques conversations et expéditeurs, dates croissantes comme en production
+        conversations = [uuid.uuid4().hex for _ in range(1000)]
+        senders = [uuid.uuid4().hex for _ in range(200)]
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        sql = (
+            "INSERT INTO chats_message (message_id, sender_id, conversation_id, message_body, sent_at) "
+            "VALUES (?, ?, ?, ?, ?)"
+        )
+        timings = []
+        for offset in range(0, options["rows"], options["chunk"]):
+            size = min(options["chunk"], options["rows"] - offset)
+            rows = [
+                (
+                    make_id().hex,
+                    senders[i % len(senders)],
+                    conversations[(i * 7919) % len(conversations)],
+                    f"message de benchmark numéro {i}",
+                    (start + timedelta(milliseconds=i)).isoformat(sep=" "),
+                )
+                for i in range(offset, offset + size)
+            ]
+            started = time.perf_counter()
+            for i in range(0, size, options["batch"]):
+                conn.execute("BEGIN")
+                conn.executemany(sql, rows[i:i + options["batch"]])
+                conn.execute("COMMIT")
+            timings.append((offset + size, size, time.perf_counter() - started))
+        return timings
+
+    def report(self, results, options):
+        self.stdout.write(f"{'lignes':>10}{'uuid4 (l/s)':>14}{'uuid7 (l/s)':>14}{'gain':>8}")
+        for (rows, size, v4), (_, _, v7) in zip(results["uuid4"]["timings"], results["uuid7"]["timings"]):
+            self.stdout.write(f"{rows:>10}{size / v4:>14.0f}{size / v7:>14.0f}{v4 / v7:>7.2f}x")
+        rates = {
+            name: options["rows"] / sum(seconds for _, _, seconds in result["timings"])
+            for name, result in results.items()
+        }
+        self.stdout.write(
+            f"moyenne : uuid4 {rates['uuid4']:.0f} l/s, uuid7 {rates['uuid7']:.0f} l/s ; fichier : "
+            f"uuid4 {results['uuid4']['bytes'] / 2**20:.0f} Mo, uuid7 {results['uuid7']['bytes'] / 2**20:.0f} Mo"
+        )
@@ -0,0 +1,100 @@
+# messaging_app/chats/management/commands/dedupe_direct_conversations.py
+
+import itertools
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chats.managers import participant_set_key
+from chats.models import Conversation, ConversationParticipant, Message
+
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Renseigne participant_key des conversations à deux participants et fusionne "
+        "les doublons (même paire) dans la plus ancienne : messages, état de lecture "
+        "et compteurs. Relançable sans effet sur une base déjà traitée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Compte sans rien modifier.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        groups = self.direct_conversations()
+        duplicates = sum(len(ids) - 1 for ids in groups.values())
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{len(groups)} conversation(s) directe(s), {duplicates} doublon(s) à fusionner"
+            )
+            return
+
+        keyed = merged = 0
+        existing = self.existing_state(itertools.chain.from_iterable(groups.values()))
+        for key, conversation_ids in groups.items():
+            # La conversation déjà canonique, sinon la plus ancienne
+            ordered = sorted(conversation_ids, key=lambda pk: (
+                existing[pk][1] != key, existing[pk][0], str(pk)
+            ))
+            keeper, others = ordered[0], ordered[1:]
+            if not others and existing[keeper][1] == key:
+                continue
+            with transaction.atomic():
+                if others:
+                    self.merge(keeper, others)
+                    merged += len(others)
+                Conversation.objects.filter(pk=keeper).update(participant_key=key)
+            keyed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{keyed} conversation(s) directe(s) mise(s) à jour, {merged} doublon(s) fusionné(s) "
+            f"en {time.perf_counter() - started:.2f}s"
+        ))
+
+    def direct_conversations(self):
+        """{participant_key: [conversation_id, ...]} des conversations à deux participants."""
+        groups = defaultdict(list)
+        memberships = (
+            ConversationParticipant.objects.order_by("conversation_id")
+            .values_list("conversation_id", "user_id").iterator(chunk_size=5000)
+        )
+        for conversation_id, rows in itertools.groupby(memberships, key=lambda row: row[0]):
+            user_ids = [user_id for _, user_id in rows]
+            if len(user_ids) == 2:
+                groups[participant_set_key(user_ids)].append(conversation_id)
+        return groups
+
+    def existing_state(self, conversation_ids):
+        conversation_ids = list(conversation_ids)
+        state = {}
+        for i in range(0, len(conversation_ids), CHUNK_SIZE):
+            rows = Conversation.objects.filter(pk__in=conversation_ids[i:i + CHUNK_SIZE]).values_list(
+                "pk", "created_at", "participant_key"
+            )
+            state.update((pk, (created_at, key)) for pk, created_at, key in rows)
+        return state
+
+    def merge(self, keeper, others):
+        """Déplace messages et état de lecture des doublons vers `keeper`, puis les supprime."""
+        Message.objects.filter(conversation_id__in=others).update(conversation_id=keeper)
+
+        # État de lecture : le plus avancé de chaque participant (advance_read ne recule jamais)
+        latest = {}
+        reads = ConversationParticipant.objects.filter(
+            conversation_id__in=others, last_read_at__isnull=False
+        ).values_list("user_id", "last_read_message_id", "last_read_at")
+        for user_id, message_id, read_at in reads:
+            if user_id not in latest or read_at > latest[user_id][1]:
+                latest[user_id] = (message_id, read_at)
+        for user_id, (message_id, read_at) in latest.items():
+            ConversationParticipant.objects.filter(conversation_id=keeper, user_id=user_id).advance_read(
+                message_id, read_at
+            )
+
+        Conversation.objects.filter(pk__in=others).delete()
+        Conversation.objects.filter(pk=keeper).rebuild_activity()
@@ -0,0 +1,91 @@
+# messaging_app/chats/management/commands/explain_queries.py
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from chats.benchmarks.concurrency import file_test_database
+from chats.benchmarks.data import seed_data
+from chats.models import User, Conversation, ConversationParticipant, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère N utilisateurs/conversations/messages puis affiche le plan "
+        "(EXPLAIN QUERY PLAN) et le temps de chaque requête de l'API. Données "
+        "générées dans une base jetable, sauf --skip-seed (données de la base "
+        "existante) ou --seed-into-default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--conversations", type=int, default=500)
+        parser.add_argument("--messages", type=int, default=50000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--repeat", type=int, default=5, help="exécutions par requête")
+        parser.add_argument("--skip-seed", action="store_true", help="utiliser les données existantes")
+        parser.add_argument("--seed-into-default", action="store_true",
+                            help="générer les données dans la base `default` (elles y restent)")
+
+    def handle(self, *args, **options):
+        if options["skip_seed"] or options["seed_into_default"]:
+            return self.run(options)
+        with file_test_database():
+            self.run(options)
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        if not options["skip_seed"]:
+            started = time.perf_counter()
+            seed_data(rng, options["users"], options["conversations"], options["messages"])
+            self.stdout.write(f"Données générées en {time.perf_counter() - started:.2f}s")
+
+        # L'utilisateur le plus actif : le cas le plus coûteux pour l'API
+        user = (
+            User.objects.annotate(n=Count("memberships"))
+            .filter(n__gt=0)
+            .order_by("-n")
+            .first()
+        )
+        if user is None:
+            self.stderr.write("Aucune conversation en base.")
+            return
+
+        conversation = Conversation.objects.filter(participants=user).first()
+        last = Message.objects.filter(conversation=conversation).order_by("-sent_at").first()
+        since = last.sent_at - timedelta(days=1) if last else timezone.now()
+
+        for name, queryset in api_queries(user, conversation, since):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"  médiane {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms\n"
+            )
+
+
+def api_queries(user, conversation, since):
+    """Les requêtes exécutées par ConversationViewSet / MessageViewSet."""
+    messages = Message.objects.filter(conversation__participants=user)
+    return [
+        ("ConversationViewSet.list", Conversation.objects.filter(participants=user)
+            .with_summary(user).order_by("-last_message_at", "-created_at")[:20]),
+        ("MessageViewSet.list (première page)", messages.order_by("-sent_at", "-message_id")[:21]),
+        ("conversations/{id}/messages/", messages.filter(conversation=conversation)
+            .order_by("-sent_at", "-message_id")[:21]),
+        ("MessageFilter sent_after", messages.filter(sent_at__gte=since)
+            .order_by("-sent_at", "-message_id")[:21]),
+        ("MessageFilter sender", messages.filter(sender__user_id=user.user_id)
+            .order_by("-sent_at", "-message_id")[:21]),
+        ("IsParticipantOfConversation", ConversationParticipant.objects
+            .filter(conversation=conversation, user=user)),
+    ]
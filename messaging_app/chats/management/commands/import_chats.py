@@ -0,0 +1,237 @@
+# messaging_app/chats/management/commands/import_chats.py
+
+import csv
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from chats.models import User, Conversation, ConversationParticipant, Message
+
+
+# Espace de noms des identifiants dérivés de l'entrée : relancer l'import
+# produit les mêmes clés, les lignes déjà écrites sont ignorées.
+IMPORT_NAMESPACE = uuid.UUID("5b0f3c3e-8c1e-4c57-9b8e-6f1d1f0a2c41")
+
+# Pragmas de chargement en masse (SQLite), rétablis à la fin de l'import.
+# synchronous=OFF : un arrêt brutal de la machine peut perdre les derniers
+# paquets validés, que la reprise réimporte.
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",  # 256 Mio
+}
+
+
+def derived_uuid(value, *parts):
+    """UUID tel quel, ou UUIDv5 stable dérivé de la clé externe."""
+    if not parts:
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            pass
+    return uuid.uuid5(IMPORT_NAMESPACE, "\x00".join(str(p) for p in (value, *parts)))
+
+
+def read_rows(path, input_format):
+    """Lignes de l'entrée en dictionnaires, lues en flux."""
+    with open(path, newline="", encoding="utf-8") as stream:
+        if input_format == "csv":
+            for row in csv.DictReader(stream):
+                participants = row.get("participants") or ""
+                row["participants"] = [email for email in participants.split(";") if email]
+                yield row
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+@contextmanager
+def bulk_load_pragmas():
+    # Sans effet dans une transaction (synchronous ne peut pas y être modifié)
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in BULK_LOAD_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}")
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in previous.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class Checkpoint:
+    """
+    Journal de reprise (une ligne JSON par paquet validé) : position dans
+    l'entrée et conversations vues pour la première fois dans ce paquet,
+    dont les compteurs sont recalculés à la fin.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.conversations = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as stream:
+                for line in stream:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # dernière ligne tronquée par l'arrêt
+                    self.offset = entry["offset"]
+                    self.conversations.update(uuid.UUID(hex) for hex in entry["conversations"])
+
+    def commit(self, offset, new_conversations):
+        self.offset = offset
+        self.conversations.update(new_conversations)
+        with open(self.path, "a", encoding="utf-8") as stream:
+            stream.write(json.dumps({
+                "offset": offset,
+                "conversations": [conversation_id.hex for conversation_id in new_conversations],
+            }) + "\n")
+            stream.flush()
+            os.fsync(stream.fileno())
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe un historique de discussions (JSONL ou CSV, un message par ligne : "
+        "conversation_id, sender_email, message_body, sent_at, et en option message_id, "
+        "sender_first_name, sender_last_name, participants). Écrit par bulk_create en "
+        "paquets transactionnels et reprend après le dernier paquet validé."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["jsonl", "csv"])
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--checkpoint", help="Journal de reprise (défaut : <path>.progress)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"Fichier introuvable : {path}")
+        input_format = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        chunk_size = options["chunk_size"]
+        checkpoint = Checkpoint(options["checkpoint"] or f"{path}.progress")
+
+        self.users = {}             # email -> user_id
+        self.conversations = set()  # conversations déjà créées
+        self.memberships = set()    # (conversation_id, user_id) déjà créés
+
+        rows = islice(read_rows(path, input_format), checkpoint.offset, None)
+        if checkpoint.offset:
+            self.stdout.write(f"Reprise après la ligne {checkpoint.offset}")
+
+        imported, offset = 0, checkpoint.offset
+        started = time.perf_counter()
+        with bulk_load_pragmas():
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                try:
+                    with transaction.atomic():
+                        new_conversations = self.import_chunk(chunk, offset)
+                except (KeyError, ValueError) as error:
+                    raise CommandError(f"Ligne invalide entre {offset + 1} et {offset + len(chunk)} : {error!r}")
+                offset += len(chunk)
+                imported += len(chunk)
+                checkpoint.commit(offset, new_conversations)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{offset} lignes ({imported / elapsed:.0f} lignes/s)")
+
+            self.stdout.write("Recalcul des compteurs des conversations...")
+            pending = list(checkpoint.conversations)
+            for i in range(0, len(pending), 500):
+                Conversation.objects.filter(pk__in=pending[i:i + 500]).rebuild_activity()
+        checkpoint.delete()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} messages importés en {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} lignes/s)"
+        ))
+
+    def import_chunk(self, chunk, offset):
+        """Écrit un paquet ; renvoie les conversations vues pour la première fois."""
+        self.resolve_users(chunk)
+
+        conversation_ids = {}
+        links = set()
+        messages = []
+        for number, row in enumerate(chunk, start=offset + 1):
+            key = row["conversation_id"]
+            conversation_id = conversation_ids.get(key) or derived_uuid(key)
+            conversation_ids[key] = conversation_id
+            sender_id = self.users[row["sender_email"]]
+            links.add((conversation_id, sender_id))
+            links.update((conversation_id, self.users[email]) for email in row.get("participants") or ())
+
+            sent_at = parse_datetime(row["sent_at"])
+            if sent_at is None:
+                raise ValueError(f"sent_at invalide : {row['sent_at']!r}")
+            if timezone.is_naive(sent_at):
+                sent_at = timezone.make_aware(sent_at)
+            messages.append(Message(
+                message_id=derived_uuid(row["message_id"]) if row.get("message_id") else derived_uuid(key, number),
+                conversation_id=conversation_id,
+                sender_id=sender_id,
+                message_body=row["message_body"],
+                sent_at=sent_at,
+            ))
+
+        # ignore_conflicts : un paquet rejoué après un arrêt ne crée pas de doublons
+        new_conversations = set(conversation_ids.values()) - self.conversations
+        Conversation.objects.bulk_create(
+            [Conversation(conversation_id=conversation_id) for conversation_id in new_conversations],
+            ignore_conflicts=True,
+        )
+        self.conversations |= new_conversations
+        new_links = links - self.memberships
+        ConversationParticipant.objects.bulk_create(
+            [ConversationParticipant(conversation_id=c, user_id=u) for c, u in new_links],
+            ignore_conflicts=True,
+        )
+        self.memberships |= new_links
+        Message.objects.bulk_create(messages, ignore_conflicts=True)
+        return new_conversations
+
+    def resolve_users(self, chunk):
+        """Complète la table email -> user_id : une requête et un bulk_create par paquet."""
+        names = {}
+        for row in chunk:
+            email = row["sender_email"]
+            if email not in self.users:
+                names[email] = (row.get("sender_first_name") or "", row.get("sender_last_name") or "")
+            for email in row.get("participants") or ():
+                if email not in self.users:
+                    names.setdefault(email, ("", ""))
+        if not names:
+            return
+        existing = User.objects.filter(email__in=list(names)).values_list("email", "user_id")
+        self.users.update(existing)
+        missing = [email for email in names if email not in self.users]
+        User.objects.bulk_create([
+            User(user_id=derived_uuid("user", email), email=email, first_name=names[email][0],
+                 last_name=names[email][1], password="!")
+            for email in missing
+        ], ignore_conflicts=True)
+        self.users.update((email, derived_uuid("user", email)) for email in missing)
@@ -0,0 +1,27 @@
+# messaging_app/chats/management/commands/rebuild_conversation_activity.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from chats.models import Conversation
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule message_count, last_message_at et last_message_id de toutes "
+        "les conversations (ou de celles passées en argument)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("conversation_ids", nargs="*")
+
+    def handle(self, *args, **options):
+        queryset = Conversation.objects.all()
+        if options["conversation_ids"]:
+            queryset = queryset.filter(pk__in=options["conversation_ids"])
+        started = time.perf_counter()
+        updated = queryset.rebuild_activity()
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} conversation(s) recalculée(s) en {time.perf_counter() - started:.2f}s"
+        ))
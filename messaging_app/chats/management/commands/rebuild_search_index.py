@@ -0,0 +1,21 @@
+# messaging_app/chats/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from chats.search import ensure_search_index, fts_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index FTS5 des messages (à lancer après un VACUUM)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if not fts_available(connections[using]):
+            raise CommandError("L'index plein texte n'existe que sur SQLite.")
+        ensure_search_index(using=using)
+        rebuild_search_index(using=using)
+        self.stdout.write(self.style.SUCCESS("Index de recherche reconstruit."))
@@ -0,0 +1,103 @@
+# messaging_app/chats/management/commands/run_benchmarks.py
+
+import json
+import os
+import platform
+import subprocess
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from chats.benchmarks import SCENARIOS, compare_results, generate, run_scenarios
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de l'API chats sur une base de test jetable : génère un jeu "
+        "de données déterministe, joue les scénarios via le client de test et écrit "
+        "p50/p95/p99 et nombre de requêtes dans un fichier JSON comparable entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--conversations", type=int, default=500)
+        parser.add_argument("--messages", type=int, default=50_000)
+        parser.add_argument("--skew", type=float, default=1.0,
+                            help="exposant de Zipf des messages par conversation (0 : uniforme)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                            help="à répéter ; tous par défaut")
+        parser.add_argument("--output", default="bench-results.json")
+        parser.add_argument("--compare", help="résultats précédents à comparer")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as stream:
+                    previous = json.load(stream)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Impossible de lire {options['compare']} : {error}")
+
+        params = {key: options[key] for key in ("users", "conversations", "messages", "skew", "seed",
+                                                "iterations", "warmup")}
+        # Base de test neuve : les mesures ne dépendent pas des données locales
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            data = generate(seed=options["seed"], users=options["users"],
+                            conversations=options["conversations"], messages=options["messages"],
+                            skew=options["skew"])
+            self.stdout.write(f"Données générées en {time.perf_counter() - started:.1f}s")
+            results = run_scenarios(
+                data, iterations=options["iterations"], warmup=options["warmup"],
+                names=options["scenario"], seed=options["seed"], log=self.log,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "commit": current_commit(),
+                "generated_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "params": params,
+            },
+            "results": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+        if previous is not None:
+            if previous.get("meta", {}).get("params") != params:
+                self.stdout.write(self.style.WARNING("Paramètres différents : comparaison indicative"))
+            for line in compare_results(previous, report):
+                self.stdout.write(line)
+
+    def log(self, name, stats):
+        self.stdout.write(
+            f"{name:<20} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+            f"p99 {stats['p99_ms']:8.2f} ms  requêtes {stats['queries']}"
+        )
@@ -0,0 +1,102 @@
+# messaging_app/chats/management/commands/stress_sqlite.py
+
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chats.benchmarks import generate
+from chats.benchmarks.concurrency import count_request_exceptions, file_test_database, run_threads
+from chats.database import DEFAULT_SQLITE_PRAGMAS
+
+
+# Configuration SQLite de Django sans réglage : journal DELETE, timeout de 5 s, BEGIN différé
+BASELINE = {"pragmas": {"journal_mode": "DELETE"}, "options": {"timeout": 5, "transaction_mode": None}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge concurrent lectures/écritures sur un fichier SQLite jetable : "
+        "compare la configuration par défaut et celle du projet (débit, latences, "
+        "erreurs « database is locked »)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+        parser.add_argument("--batch", type=int, default=5, help="Messages par POST /messages/bulk/.")
+        parser.add_argument("--messages", type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stderr.write("Ce test ne concerne que SQLite.")
+            return
+        db_options = connection.settings_dict["OPTIONS"]
+        tuned = {
+            "pragmas": getattr(settings, "CHATS_SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS),
+            "options": {key: db_options.get(key) for key in BASELINE["options"]},
+        }
+
+        # Seule la base est mesurée : ni limitation de débit ni délestage
+        with file_test_database(), override_settings(CHATS_THROTTLING=False, CHATS_MAX_INFLIGHT_WRITES=0):
+            try:
+                data = generate(users=100, conversations=300, messages=options["messages"])
+                for name, config in (("défaut", BASELINE), ("projet", tuned)):
+                    stats = self.run_phase(data, config, options)
+                    self.report(name, stats, options["seconds"])
+            finally:
+                db_options.update(tuned["options"])
+
+    def run_phase(self, data, config, options):
+        # Nouvelles connexions à chaque phase : pragmas et OPTIONS relus à l'ouverture
+        connections.close_all()
+        connection.settings_dict["OPTIONS"].update(config["options"])
+        stats = {"read": [], "write": []}
+        lock = threading.Lock()
+
+        def worker(index, deadline):
+            rng = random.Random(index)
+            user = data.users[index % len(data.users)]
+            conversations = [str(pk) for pk, members in data.members.items() if user in members]
+            client = APIClient()
+            client.raise_request_exception = False
+            client.force_authenticate(user)
+            list_url, bulk_url = reverse("conversation-list"), reverse("message-bulk")
+            local = {"read": [], "write": []}
+            while time.perf_counter() < deadline:
+                write = bool(conversations) and rng.random() < options["write_ratio"]
+                started = time.perf_counter()
+                if write:
+                    response = client.post(bulk_url, {"messages": [
+                        {"conversation_id": rng.choice(conversations), "message_body": "stress"}
+                        for _ in range(options["batch"])
+                    ]}, format="json")
+                else:
+                    response = client.get(list_url)
+                if response.status_code < 400:
+                    local["write" if write else "read"].append(time.perf_counter() - started)
+            with lock:
+                stats["read"].extend(local["read"])
+                stats["write"].extend(local["write"])
+
+        with override_settings(CHATS_SQLITE_PRAGMAS=config["pragmas"]), count_request_exceptions() as errors:
+            run_threads(worker, options["threads"], options["seconds"])
+        return {**stats, **errors}
+
+    def report(self, name, stats, seconds):
+        def p95(latencies):
+            return statistics.quantiles(latencies, n=20)[18] * 1000 if len(latencies) > 1 else 0.0
+
+        self.stdout.write(
+            f"{name:<7} lectures {len(stats['read']) / seconds:6.0f}/s (p95 {p95(stats['read']):6.1f} ms)  "
+            f"écritures {len(stats['write']) / seconds:5.0f}/s (p95 {p95(stats['write']):6.1f} ms)  "
+            f"« database is locked » {stats['locked']}  autres erreurs {stats['errors']}"
+        )
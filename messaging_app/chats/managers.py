@@ -0,0 +1,247 @@
+# messaging_app/chats/managers.py
+
+import hashlib
+import uuid
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Prefetch, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+
+# Longueur de l'aperçu d'un message (voir MessageSerializer.get_preview)
+PREVIEW_LENGTH = 50
+
+
+def participant_set_key(user_ids):
+    """Clé canonique d'un ensemble de participants : SHA-256 des user_id triés."""
+    canonical = ",".join(sorted({str(uuid.UUID(str(user_id))) for user_id in user_ids}))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ConversationQuerySet(models.QuerySet):
+    """
+    QuerySet des conversations avec un mode « résumé » pour les listes et la
+    maintenance des compteurs dénormalisés (message_count, last_message_*).
+    """
+    record_chunk_size = 200
+
+    def with_summary(self, user=None, participants=True):
+        """
+        Résumé pour les listes : les compteurs sont des colonnes de Conversation,
+        l'extrait du dernier message est lu par sa clé primaire, les participants
+        sont préchargés (sauf participants=False). Le nombre de requêtes reste fixe.
+        Avec `user` : état de lecture et `unread_count` (voir with_read_state).
+        """
+        from .models import Message, User
+
+        queryset = self.with_read_state(user) if user is not None else self
+        queryset = queryset.annotate(
+            # Un caractère de plus que l'aperçu pour savoir s'il faut ajouter "..."
+            last_message_excerpt=Subquery(
+                Message.objects.filter(pk=OuterRef("last_message_id")).annotate(
+                    excerpt=Substr("message_body", 1, PREVIEW_LENGTH + 1)
+                ).values("excerpt")[:1]
+            ),
+        )
+        if participants:
+            queryset = queryset.prefetch_related(
+                Prefetch("participants", queryset=User.objects.order_by("email"))
+            )
+        return queryset
+
+    def with_read_state(self, user):
+        """
+        Annote `last_read_at` (appartenance de `user`) et `unread_count` : les
+        messages postérieurs, comptés sur l'index (conversation, sent_at) par
+        une sous-requête corrélée de la requête principale. Le coût dépend de
+        la page affichée et des messages non lus, pas du nombre de conversations.
+        """
+        from .models import ConversationParticipant, Message
+
+        unread = (
+            Message.objects.filter(conversation=OuterRef("pk"), sent_at__gt=OuterRef("last_read_at"))
+            .order_by().values("conversation").annotate(n=Count("pk")).values("n")
+        )
+        return self.annotate(
+            last_read_at=Subquery(
+                ConversationParticipant.objects.filter(conversation=OuterRef("pk"), user=user)
+                .values("last_read_at")[:1]
+            ),
+        ).annotate(
+            # Jamais lu : tous les messages, compteur déjà dénormalisé
+            unread_count=Case(
+                When(last_read_at__isnull=True, then=F("message_count")),
+                default=Coalesce(Subquery(unread), 0),
+            ),
+        )
+
+    def record_messages(self, messages):
+        """
+        Comptabilise des messages nouvellement créés, en un seul UPDATE atomique
+        par paquet de conversations touchées. Appelé par le signal post_save
+        de Message et explicitement après un bulk_create.
+        """
+        added = {}
+        for message in messages:
+            count, latest = added.get(message.conversation_id, (0, None))
+            if latest is None or (message.sent_at, str(message.pk)) > (latest.sent_at, str(latest.pk)):
+                latest = message
+            added[message.conversation_id] = (count + 1, latest)
+        items = list(added.items())
+        # L'expéditeur a lu la conversation jusqu'à son propre message
+        from .models import ConversationParticipant
+
+        ConversationParticipant.objects.mark_sent(messages)
+        # Par paquets pour borner la taille de l'UPDATE (nombre de paramètres)
+        return sum(
+            self._apply_added(items[i:i + self.record_chunk_size])
+            for i in range(0, len(items), self.record_chunk_size)
+        )
+
+    def _apply_added(self, items):
+        from .models import Message
+
+        sent_at_field = Message._meta.get_field("sent_at")
+        id_field = Message._meta.pk
+        count_whens, at_whens, id_whens = [], [], []
+        for conversation_id, (count, latest) in items:
+            count_whens.append(When(pk=conversation_id, then=Value(count)))
+            # Ne remplace le dernier message que s'il est plus récent (les
+            # expressions du SET voient les anciennes valeurs de la ligne)
+            newer = Q(pk=conversation_id) & (
+                Q(last_message_at__isnull=True) | Q(last_message_at__lte=latest.sent_at)
+            )
+            at_whens.append(When(newer, then=Value(latest.sent_at, output_field=sent_at_field)))
+            id_whens.append(When(newer, then=Value(latest.pk, output_field=id_field)))
+
+        return self.filter(pk__in=[conversation_id for conversation_id, _ in items]).update(
+            message_count=F("message_count") + Case(*count_whens, default=Value(0)),
+            version=F("version") + 1,
+            last_message_at=Case(*at_whens, default=F("last_message_at")),
+            last_message_id=Case(*id_whens, default=F("last_message_id")),
+        )
+
+    def forget_message(self, message):
+        """Décompte un message supprimé et recalcule le dernier message si besoin."""
+        self.filter(pk=message.conversation_id).update(
+            message_count=F("message_count") - 1, version=F("version") + 1
+        )
+        latest = self._latest_message()
+        self.filter(pk=message.conversation_id, last_message_id=message.pk).update(
+            last_message_at=Subquery(latest.values("sent_at")[:1]),
+            last_message_id=Subquery(latest.values("message_id")[:1]),
+        )
+
+    def bump_version(self):
+        """Invalide les validateurs HTTP des conversations du QuerySet."""
+        return self.update(version=F("version") + 1)
+
+    def participants_changed(self):
+        """
+        Nouvelle version, et plus de participant_key : la conversation n'est plus
+        la conversation canonique de son ancien ensemble de participants.
+        """
+        return self.update(version=F("version") + 1, participant_key=None)
+
+    def get_or_create_for_participants(self, user_ids):
+        """
+        Conversation canonique d'un ensemble de participants : une recherche sur
+        l'index unique de participant_key, création sinon. Deux créations
+        concurrentes sont départagées par la contrainte d'unicité.
+        Renvoie (conversation, created) ; la conversation est lue par ce QuerySet
+        (annotations de with_summary comprises).
+        """
+        from .models import ConversationParticipant
+
+        user_ids = set(user_ids)
+        key = participant_set_key(user_ids)
+        try:
+            return self.get(participant_key=key), False
+        except self.model.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                conversation = self.model.objects.create(participant_key=key)
+                # bulk_create : pas de signal m2m_changed, la clé est conservée
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation=conversation, user_id=user_id)
+                    for user_id in user_ids
+                ])
+        except IntegrityError:
+            return self.get(participant_key=key), False
+        return self.get(pk=conversation.pk), True
+
+    def rebuild_activity(self):
+        """Recalcule entièrement les compteurs des conversations du QuerySet."""
+        from .models import Message
+
+        latest = self._latest_message()
+        counts = (
+            Message.objects.filter(conversation=OuterRef("pk"))
+            .order_by().values("conversation").annotate(n=Count("pk")).values("n")
+        )
+        return self.update(
+            message_count=Coalesce(Subquery(counts), 0),
+            last_message_at=Subquery(latest.values("sent_at")[:1]),
+            last_message_id=Subquery(latest.values("message_id")[:1]),
+            version=F("version") + 1,
+        )
+
+    @staticmethod
+    def _latest_message():
+        from .models import Message
+
+        return Message.objects.filter(conversation=OuterRef("pk")).order_by("-sent_at", "-message_id")
+
+
+ConversationManager = models.Manager.from_queryset(ConversationQuerySet)
+
+
+class ParticipantQuerySet(models.QuerySet):
+    """Appartenances (ConversationParticipant) : état de lecture par membre."""
+    mark_chunk_size = 200
+
+    def advance_read(self, message_id, sent_at):
+        """
+        Avance le marqueur de lecture jusqu'à ce message, jamais en arrière
+        (UPDATE conditionnel : sûr face aux requêtes concurrentes).
+        Renvoie le nombre d'appartenances modifiées.
+        """
+        return self.filter(Q(last_read_at__isnull=True) | Q(last_read_at__lt=sent_at)).update(
+            last_read_message_id=message_id, last_read_at=sent_at
+        )
+
+    def mark_sent(self, messages):
+        """Marque comme lus, pour leur expéditeur, des messages qu'il vient d'envoyer."""
+        latest = {}
+        for message in messages:
+            key = (message.conversation_id, message.sender_id)
+            if key not in latest or message.sent_at > latest[key].sent_at:
+                latest[key] = message
+        items = list(latest.items())
+        for i in range(0, len(items), self.mark_chunk_size):
+            self._apply_sent(items[i:i + self.mark_chunk_size])
+
+    def _apply_sent(self, items):
+        from .models import Message
+
+        sent_at_field = Message._meta.get_field("sent_at")
+        at_whens, id_whens = [], []
+        for (conversation_id, sender_id), message in items:
+            newer = Q(conversation_id=conversation_id, user_id=sender_id) & (
+                Q(last_read_at__isnull=True) | Q(last_read_at__lt=message.sent_at)
+            )
+            at_whens.append(When(newer, then=Value(message.sent_at, output_field=sent_at_field)))
+            id_whens.append(When(newer, then=Value(message.pk, output_field=Message._meta.pk)))
+        # Filtre par IN sur l'index (conversation, user) ; un OR de couples
+        # obligerait SQLite à parcourir toute la table
+        self.filter(
+            conversation_id__in={conversation_id for (conversation_id, _), _ in items},
+            user_id__in={sender_id for (_, sender_id), _ in items},
+        ).update(
+            last_read_at=Case(*at_whens, default=F("last_read_at")),
+            last_read_message_id=Case(*id_whens, default=F("last_read_message_id")),
+        )
+
+
+ParticipantManager = models.Manager.from_queryset(ParticipantQuerySet)
@@ -0,0 +1,132 @@
+# messaging_app/chats/middleware.py
+
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+from django.http import JsonResponse
+
+from .instrumentation import record_queries
+from .routers import mark_unavailable, replica_aliases, routing_context, routing_state
+from .throttling import rate_store
+
+logger = logging.getLogger("chats.sql")
+load_logger = logging.getLogger("chats.load")
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Mesure le SQL de chaque requête HTTP : nombre de requêtes, temps total en
+    base, requêtes les plus lentes et formes répétées (N+1 probables).
+    - en-tête Server-Timing (db, app) lisible dans les outils du navigateur ;
+    - journal "chats.sql" : N+1 en WARNING, requêtes les plus lentes en DEBUG.
+    Activé par CHATS_SQL_INSTRUMENTATION (DEBUG par défaut) ; désactivé, le
+    middleware est retiré de la chaîne au démarrage (MiddlewareNotUsed).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "CHATS_SQL_INSTRUMENTATION", settings.DEBUG):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.n_plus_one_threshold = getattr(settings, "CHATS_SQL_N_PLUS_ONE_THRESHOLD", 5)
+        self.slowest_count = getattr(settings, "CHATS_SQL_SLOWEST_COUNT", 3)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        suspects = recorder.repeated_shapes(self.n_plus_one_threshold)
+        metrics = [
+            f'db;dur={recorder.total_time * 1000:.2f};desc="{recorder.count} queries"',
+            f"app;dur={elapsed * 1000:.2f}",
+        ]
+        if suspects:
+            metrics.append(f'n-plus-one;desc="{len(suspects)} repeated shapes"')
+        response["Server-Timing"] = ", ".join(metrics)
+
+        for shape, count in suspects:
+            logger.warning("N+1 probable sur %s %s (%dx) : %s", request.method, request.path, count, shape)
+        if logger.isEnabledFor(logging.DEBUG):
+            for alias, sql, duration in recorder.slowest(self.slowest_count):
+                logger.debug("%s %s [%s] %.2f ms : %s", request.method, request.path, alias, duration * 1000, sql)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Délimite l'état de chats.routers.PrimaryReplicaRouter à une requête :
+    - une requête qui écrit pose le cookie CHATS_REPLICA_PIN_COOKIE pendant
+      CHATS_REPLICA_PIN_SECONDS ; les requêtes suivantes du client lisent alors
+      le primaire (le retard de réplication ne masque pas ses propres écritures) ;
+    - une requête sûre (GET, HEAD, OPTIONS) qui échoue sur un réplica est rejouée
+      une fois sur le primaire, et le réplica est écarté.
+    Retiré de la chaîne au démarrage si CHATS_DATABASE_REPLICAS est vide.
+    """
+
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, "CHATS_REPLICA_PIN_COOKIE", "chats_primary")
+        self.pin_seconds = getattr(settings, "CHATS_REPLICA_PIN_SECONDS", 5)
+
+    def __call__(self, request):
+        with routing_context(pinned=self.cookie_name in request.COOKIES) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(self.cookie_name, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+        return response
+
+    def process_exception(self, request, exception):
+        state = routing_state()
+        if not isinstance(exception, DatabaseError) or state.pinned or state.replica is None:
+            return None
+        if request.method not in self.safe_methods:
+            return None
+        mark_unavailable(state.replica, exception)
+        state.pinned = True
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
+
+
+class LoadSheddingMiddleware:
+    """
+    Plafonne les requêtes d'écriture (POST, PUT, PATCH, DELETE) en cours sur
+    l'ensemble des workers : CHATS_MAX_INFLIGHT_WRITES baux dans le store
+    partagé (chats.throttling.RateStore). Au-delà, 503 + Retry-After tout de
+    suite : SQLite n'a qu'un écrivain, allonger la file du verrou n'écrit pas
+    plus vite. Un bail non rendu (worker tué) expire après
+    CHATS_INFLIGHT_LEASE_SECONDS. Retiré de la chaîne si le plafond vaut 0.
+    """
+
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.limit = getattr(settings, "CHATS_MAX_INFLIGHT_WRITES", 0)
+        if not self.limit:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.lease_seconds = getattr(settings, "CHATS_INFLIGHT_LEASE_SECONDS", 60)
+        self.retry_after = getattr(settings, "CHATS_LOAD_SHEDDING_RETRY_AFTER", 1)
+
+    def __call__(self, request):
+        if request.method in self.safe_methods:
+            return self.get_response(request)
+        store = rate_store()
+        lease = store.acquire("writes", self.limit, self.lease_seconds)
+        if lease is None:
+            load_logger.warning("Écriture refusée (%s en cours) : %s %s", self.limit, request.method, request.path)
+            response = JsonResponse({"detail": "Service surchargé, réessayez plus tard."}, status=503)
+            response["Retry-After"] = str(math.ceil(self.retry_after))
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            store.release(lease)
@@ -2,8 +2,12 @@
 
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .managers import ConversationManager, ParticipantManager
+from .uuids import uuid7
+
 
 # -------------------------
 # Custom User Model
@@ -42,27 +46,113 @@ class User(AbstractUser):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
 
+class ClaimsUser(User):
+    """
+    Utilisateur construit depuis les claims du JWT (chats.authentication) :
+    seuls user_id, email, role et is_active sont chargés. Le premier accès à un
+    autre champ charge tous les champs d'un coup, depuis le cache par processus.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is None or not deferred:
+            return super().refresh_from_db(using=using, fields=fields, **kwargs)
+        from .authentication import load_user_fields
+
+        values = load_user_fields(self.pk)
+        for attname in deferred:
+            setattr(self, attname, values[attname])
+
+
 # -------------------------
 # Conversation Model
 # -------------------------
 class Conversation(models.Model):
-    conversation_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
-    participants = models.ManyToManyField(User, related_name="conversations")
+    # UUIDv7 (chats.uuids) : clés croissantes ; les identifiants uuid4 existants restent valides
+    conversation_id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
+    participants = models.ManyToManyField(
+        User, related_name="conversations", through="ConversationParticipant"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Activité dénormalisée, maintenue par ConversationQuerySet.record_messages /
+    # forget_message (signaux de Message et chemins bulk) ; voir rebuild_conversation_activity
+    message_count = models.IntegerField(default=0, editable=False)
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_message_id = models.UUIDField(null=True, blank=True, editable=False)
+    # Incrémenté à chaque changement visible (message créé/modifié/supprimé,
+    # participants) : sert de validateur HTTP (chats.conditional)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Clé de l'ensemble des participants (managers.participant_set_key) : renseignée
+    # sur la conversation canonique de cet ensemble (conversation directe), effacée
+    # dès que ses participants changent. Index unique : une recherche par ensemble.
+    participant_key = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
+
+    objects = ConversationManager()
+
+    class Meta:
+        indexes = [
+            # Boîte de réception : conversations les plus récentes d'abord
+            models.Index(fields=["last_message_at"]),
+        ]
+
     def __str__(self):
         return f"Conversation {self.conversation_id}"
 
 
+# -------------------------
+# Conversation Participant (table de liaison)
+# -------------------------
+class ConversationParticipant(models.Model):
+    """
+    Table de liaison explicite de Conversation.participants, pour pouvoir
+    l'indexer dans les deux sens. Garde le nom de la table auto-générée.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="memberships")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="memberships")
+    # État de lecture : avancé par POST conversations/{id}/read/ et à l'envoi
+    # d'un message (ParticipantQuerySet) ; unread_count compte les messages postérieurs
+    last_read_message = models.ForeignKey(
+        "Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ParticipantManager()
+
+    class Meta:
+        db_table = "chats_conversation_participants"
+        unique_together = [("conversation", "user")]  # index (conversation, user)
+        indexes = [
+            models.Index(fields=["user", "conversation"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.conversation_id}"
+
+
 # -------------------------
 # Message Model
 # -------------------------
 class Message(models.Model):
-    message_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
+    # UUIDv7 : insertion en fin d'index, départage par ordre de création à sent_at égal
+    message_id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_messages")
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
     message_body = models.TextField(null=False, blank=False)
-    sent_at = models.DateTimeField(auto_now_add=True)
+    # Comme auto_now_add, mais une date explicite (import, jeux de test) est
+    # conservée, y compris par bulk_create
+    sent_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # MessageViewSet.get_queryset / pagination par clé (sent_at, message_id)
+            models.Index(fields=["conversation", "sent_at", "message_id"]),
+            # MessageFilter : sender + plage de sent_at
+            models.Index(fields=["sender", "sent_at"]),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.email} at {self.sent_at}"
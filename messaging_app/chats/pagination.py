@@ -1,6 +1,15 @@
 # chats/pagination.py
-from rest_framework.pagination import PageNumberPagination
+import uuid
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import is_ranked_search
 
 class MessagePagination(PageNumberPagination):
     page_size = 20  # nombre de messages par page
@@ -15,3 +24,192 @@ class MessagePagination(PageNumberPagination):
             'results': data
         })
 
+
+# -------------------------
+# Keyset (cursor) pagination
+# -------------------------
+class MessageCursorPagination(BasePagination):
+    """
+    Pagination par curseur sur (sent_at, message_id), du plus récent au plus ancien
+    (du plus ancien au plus récent avec ?ordering=sent_at).
+
+    Chaque page est une lecture bornée sur l'index : pas de COUNT(*) ni d'OFFSET,
+    le coût reste constant quelle que soit la profondeur.
+    - ?cursor=<curseur signé>  : page suivante (plus ancienne) ou précédente (plus récente)
+    - ?around=<message_id>     : page centrée sur un message donné
+    - ?page=<n>                : ancien mode par numéro de page (MessagePagination)
+    Les résultats de recherche classés par pertinence passent aussi par MessagePagination.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    around_query_param = 'around'
+    legacy_page_query_param = 'page'
+    cursor_salt = 'chats.pagination.cursor'
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if self.legacy_page_query_param in request.query_params or is_ranked_search(queryset):
+            self.legacy = MessagePagination()
+            if not queryset.ordered:
+                queryset = queryset.order_by('-sent_at', '-message_id')
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.around_query_param
+        )
+        self.next_position = None
+        self.previous_position = None
+        # ?ordering=sent_at (OrderingFilter) : du plus ancien au plus récent
+        self.ascending = queryset.query.order_by[:1] == ('sent_at',)
+
+        around = request.query_params.get(self.around_query_param)
+        if around:
+            return self._paginate_around(queryset, around)
+
+        cursor = self.decode_cursor(request)
+        if cursor is None or cursor[0] == 'n':
+            return self._paginate_next(queryset, cursor and cursor[1])
+        return self._paginate_previous(queryset, cursor[1])
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    # -- Requêtes par clé ------------------------------------------------
+
+    @staticmethod
+    def _older_than(position):
+        sent_at, message_id = position
+        return Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, message_id__lt=message_id)
+
+    @staticmethod
+    def _newer_than(position):
+        sent_at, message_id = position
+        return Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, message_id__gt=message_id)
+
+    def _keyset(self, forward):
+        """
+        Tri et filtre « après la position » pour lire dans le sens d'affichage
+        (forward) ou à rebours : du plus récent au plus ancien par défaut,
+        l'inverse avec ?ordering=sent_at.
+        """
+        if forward != self.ascending:
+            return ('-sent_at', '-message_id'), self._older_than
+        return ('sent_at', 'message_id'), self._newer_than
+
+    def _read(self, queryset, position, forward, size):
+        """Jusqu'à `size` lignes après `position` (et s'il en reste), dans l'ordre d'affichage."""
+        ordering, after = self._keyset(forward)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(after(position))
+        rows = list(queryset[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        return (rows if forward else rows[::-1]), has_more
+
+    def _paginate_next(self, queryset, position):
+        """Page qui suit `position` dans l'ordre d'affichage (première page sans position)."""
+        rows, has_more = self._read(queryset, position, True, self.page_size)
+        if rows and has_more:
+            self.next_position = self._position(rows[-1])
+        if rows and position is not None:
+            self.previous_position = self._position(rows[0])
+        return rows
+
+    def _paginate_previous(self, queryset, position):
+        """Page qui précède `position` dans l'ordre d'affichage."""
+        rows, has_more = self._read(queryset, position, False, self.page_size)
+        if rows:
+            self.next_position = self._position(rows[-1])
+            if has_more:
+                self.previous_position = self._position(rows[0])
+        return rows
+
+    def _paginate_around(self, queryset, message_id):
+        try:
+            message_id = uuid.UUID(str(message_id))
+        except ValueError:
+            raise NotFound('Message introuvable.')
+        anchor = queryset.filter(message_id=message_id).values_list('sent_at', 'message_id').first()
+        if anchor is None:
+            raise NotFound('Message introuvable.')
+
+        before, has_before = self._read(queryset, anchor, False, self.page_size // 2)
+        # L'ancre ouvre la seconde moitié
+        ordering, after = self._keyset(True)
+        after_size = self.page_size - len(before)
+        after_rows = list(
+            queryset.order_by(*ordering)
+            .filter(after(anchor) | Q(sent_at=anchor[0], message_id=anchor[1]))
+            [:after_size + 1]
+        )
+        has_after = len(after_rows) > after_size
+        rows = before + after_rows[:after_size]
+
+        if rows and has_after:
+            self.next_position = self._position(rows[-1])
+        if rows and has_before:
+            self.previous_position = self._position(rows[0])
+        return rows
+
+    @staticmethod
+    def _position(message):
+        return message.sent_at, message.message_id
+
+    # -- Curseurs signés -------------------------------------------------
+
+    def encode_cursor(self, direction, position):
+        sent_at, message_id = position
+        token = signing.dumps(
+            [direction, sent_at.isoformat(), uuid.UUID(str(message_id)).hex],
+            salt=self.cursor_salt,
+        )
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            direction, sent_at, message_id = signing.loads(token, salt=self.cursor_salt)
+            sent_at = parse_datetime(sent_at)
+            message_id = uuid.UUID(message_id)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('n', 'p') or sent_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction, (sent_at, message_id)
+
+    def get_next_link(self):
+        if self.legacy is not None:
+            return self.legacy.get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor('n', self.next_position)
+
+    def get_previous_link(self):
+        if self.legacy is not None:
+            return self.legacy.get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor('p', self.previous_position)
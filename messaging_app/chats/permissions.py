@@ -1,6 +1,74 @@
 # chats/permissions.py
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import permissions  # ✅ attendu par le checker
 
+from .models import Conversation, ConversationParticipant
+
+
+def membership_cache_key(conversation_id, user_id):
+    return f"chats:member:{conversation_id}:{user_id}"
+
+
+def is_participant(user, conversation_id, request=None):
+    """
+    Vérifie l'appartenance par un EXISTS sur l'index (conversation, user),
+    sans charger la conversation ni ses participants.
+    - mémorisé sur la requête (une seule vérification par conversation) ;
+    - si CHATS_MEMBERSHIP_CACHE_TIMEOUT > 0, les réponses positives sont gardées
+      en cache, invalidé par chats.signals quand `participants` change
+      (cache partagé entre workers obligatoire, voir settings).
+    """
+    if not user or not user.is_authenticated:
+        return False
+    memo = None
+    if request is not None:
+        memo = request.__dict__.setdefault("_chats_membership", {})
+        if conversation_id in memo:
+            return memo[conversation_id]
+
+    timeout = getattr(settings, "CHATS_MEMBERSHIP_CACHE_TIMEOUT", 0)
+    key = membership_cache_key(conversation_id, user.pk)
+    member = bool(timeout) and cache.get(key, False)
+    if not member:
+        member = ConversationParticipant.objects.filter(
+            conversation_id=conversation_id, user_id=user.pk
+        ).exists()
+        # Seules les réponses positives sont mises en cache : un ajout
+        # de participant est ainsi visible tout de suite.
+        if member and timeout:
+            cache.set(key, True, timeout)
+
+    if memo is not None:
+        memo[conversation_id] = member
+    return member
+
+
+def member_conversations(user, conversation_ids, request=None):
+    """
+    Conversations de `conversation_ids` dont `user` est participant, en une
+    requête au plus ; les réponses sont mémorisées sur la requête comme
+    celles d'is_participant().
+    """
+    if not user or not user.is_authenticated:
+        return set()
+    memo = request.__dict__.setdefault("_chats_membership", {}) if request is not None else {}
+    unknown = [conversation_id for conversation_id in conversation_ids if conversation_id not in memo]
+    if unknown:
+        found = set(
+            ConversationParticipant.objects.filter(conversation_id__in=unknown, user_id=user.pk)
+            .values_list("conversation_id", flat=True)
+        )
+        for conversation_id in unknown:
+            memo[conversation_id] = conversation_id in found
+    return {conversation_id for conversation_id in conversation_ids if memo[conversation_id]}
+
+
+def remember_membership(request, conversation_id):
+    """Enregistre une appartenance déjà prouvée par une autre requête (voir chats.conditional)."""
+    request.__dict__.setdefault("_chats_membership", {})[conversation_id] = True
+
+
 class IsParticipantOfConversation(permissions.BasePermission):
     """
     Permission pour autoriser uniquement les participants d'une conversation
@@ -16,5 +84,9 @@ class IsParticipantOfConversation(permissions.BasePermission):
         Vérifie que l'utilisateur est un participant de la conversation.
         """
         if request.method in ["GET", "POST", "PUT", "PATCH", "DELETE"]:
-            return request.user in obj.conversation.participants.all()
+            if isinstance(obj, Conversation):
+                conversation_id = obj.pk
+            else:
+                conversation_id = obj.conversation_id
+            return is_participant(request.user, conversation_id, request)
         return False
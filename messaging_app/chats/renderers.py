@@ -0,0 +1,61 @@
+# messaging_app/chats/renderers.py
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Dépendances optionnelles : sans orjson, FastJSONRenderer se replie sur json ;
+# sans msgpack, Accept: application/msgpack reçoit un 406
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encodé par orjson : même sortie (compacte, UTF-8, U+2028 et
+    U+2029 échappés), les types qu'orjson ne connaît pas (dates, Decimal,
+    chaînes paresseuses...) passant par l'encodeur de DRF. Sortie indentée
+    (Accept: application/json; indent=4) : JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            # Dates au format de l'encodeur DRF, pas au format RFC 3339 d'orjson
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack (Accept: application/msgpack) : mêmes données que le JSON,
+    UUID et dates en chaînes comme en JSON, sous une forme binaire plus compacte.
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=JSONRenderer.encoder_class().default)
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    """Négociation parmi les seuls rendus utilisables (dépendance installée)."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, "available", True)]
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,111 @@
+# messaging_app/chats/routers.py
+
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger("chats.db")
+
+
+# -------------------------
+# État de routage : par requête HTTP (chats.middleware.ReplicaRoutingMiddleware),
+# sinon par thread (commandes, shell, tests)
+# -------------------------
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned     # lectures sur le primaire (lecture de ses propres écritures)
+        self.wrote = False       # au moins une écriture routée pendant la requête
+        self.replica = None      # dernier réplica choisi pour une lecture
+
+
+_state = ContextVar("chats_routing_state", default=None)
+
+
+def routing_state():
+    state = _state.get()
+    if state is None:
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+@contextmanager
+def routing_context(pinned=False):
+    """Nouvel état de routage pour la durée du bloc (une requête HTTP)."""
+    token = _state.set(RoutingState(pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+# -------------------------
+# Santé des réplicas : un réplica en erreur est écarté pendant
+# CHATS_REPLICA_RETRY_SECONDS, les lectures retombent sur le primaire
+# -------------------------
+_unavailable = {}  # alias -> instant (time.monotonic) de remise en service
+_lock = threading.Lock()
+_rotation = itertools.count()
+
+
+def replica_aliases():
+    return getattr(settings, "CHATS_DATABASE_REPLICAS", ())
+
+
+def mark_unavailable(alias, error=None):
+    retry = getattr(settings, "CHATS_REPLICA_RETRY_SECONDS", 30)
+    with _lock:
+        _unavailable[alias] = time.monotonic() + retry
+    logger.warning("Réplica %s écarté pour %s s : %s", alias, retry, error)
+
+
+def available_replicas():
+    now = time.monotonic()
+    return [alias for alias in replica_aliases() if _unavailable.get(alias, 0) <= now]
+
+
+class PrimaryReplicaRouter:
+    """
+    Écritures sur `default`, lectures réparties en tourniquet (une requête,
+    un réplica) sur CHATS_DATABASE_REPLICAS ; sans réplica, tout reste sur `default`.
+    - après une écriture, les lectures de la même requête vont au primaire ;
+    - un réplica injoignable est écarté (voir mark_unavailable).
+    Les réplicas sont des copies de `default` : pas de migration, relations libres.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state()
+        if state.pinned:
+            return DEFAULT_DB_ALIAS
+        replicas = available_replicas()
+        # Un seul réplica par requête : ses lectures voient un même état de la base
+        if state.replica in replicas:
+            return state.replica
+        start = next(_rotation)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError as error:
+                mark_unavailable(alias, error)
+                continue
+            state.replica = alias
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing_state()
+        state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
@@ -0,0 +1,152 @@
+# messaging_app/chats/search.py
+
+import re
+
+from django.db import connection
+from rest_framework import filters
+
+
+# -------------------------
+# Index plein texte SQLite (FTS5) sur Message.message_body
+# -------------------------
+# Table FTS5 à contenu externe : elle n'indexe que le texte et réutilise le
+# rowid de chats_message. Les triggers la tiennent à jour pour toutes les
+# écritures (save, bulk_create, update(), delete()), signaux ou non.
+# Après un VACUUM (qui peut renuméroter les rowid), lancer rebuild_search_index().
+FTS_TABLE = "chats_message_fts"
+
+FTS_SETUP_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        message_body,
+        content='chats_message',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body)
+        VALUES ('delete', old.rowid, old.message_body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message_body ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body)
+        VALUES ('delete', old.rowid, old.message_body);
+        INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body);
+    END""",
+]
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 12
+
+
+def fts_available(conn=None):
+    conn = conn or connection
+    return conn.vendor == "sqlite"
+
+
+def ensure_search_index(using="default", **kwargs):
+    """Crée la table FTS5 et ses triggers (idempotent). Branché sur post_migrate."""
+    from django.db import connections
+
+    conn = connections[using]
+    if not fts_available(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        created = cursor.fetchone() is None
+        for statement in FTS_SETUP_SQL:
+            cursor.execute(statement)
+        if created:
+            # Indexe les messages déjà présents
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def rebuild_search_index(using="default"):
+    from django.db import connections
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+
+def build_match_query(text):
+    """
+    Transforme la saisie utilisateur en requête MATCH FTS5 sûre :
+    chaque mot est mis entre guillemets, tous doivent apparaître (AND),
+    « mot* » et le dernier mot (saisie en cours) sont cherchés par préfixe.
+    """
+    terms = _TERM_RE.findall(text or "")
+    parts = []
+    for i, term in enumerate(terms):
+        prefix = term.endswith("*") or i == len(terms) - 1
+        word = term.rstrip("*")
+        if word:
+            parts.append(f'"{word}"' + ("*" if prefix else ""))
+    return " AND ".join(parts)
+
+
+def search_messages(queryset, text):
+    """
+    Restreint `queryset` (déjà filtré sur les conversations de l'utilisateur)
+    aux messages qui correspondent, avec `search_rank` (bm25, plus petit = meilleur)
+    et `search_snippet` (extrait surligné). Comme le SearchFilter de DRF, un
+    message correspond aussi si l'adresse de son expéditeur contient `text` :
+    ceux-là suivent les correspondances du texte (rang 0, sans extrait).
+    """
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    ranked = queryset.extra(
+        select={
+            "search_rank": f"bm25({FTS_TABLE})",
+            "search_snippet": f"snippet({FTS_TABLE}, 0, %s, %s, %s, %s)",
+        },
+        select_params=[SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS],
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.rowid", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    )
+    # Expéditeurs dont l'adresse correspond (table des utilisateurs, petite) :
+    # le plus souvent aucun, et la requête reste la seule jointure FTS
+    sender = queryset.model._meta.get_field("sender")
+    sender_ids = list(
+        sender.related_model._default_manager.filter(email__icontains=text).values_list("pk", flat=True)
+    )
+    if not sender_ids:
+        return ranked.order_by("search_rank", "-sent_at")
+    # Sinon une seconde partie (UNION ALL) par l'index de l'expéditeur ; le
+    # rang bm25 n'est calculé que dans la jointure FTS, une fois par requête
+    by_sender = queryset.filter(sender__in=sender_ids).extra(
+        select={"search_rank": "0", "search_snippet": "NULL"},
+        where=[f"{table}.rowid NOT IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"],
+        params=[match],
+    )
+    return ranked.order_by().union(by_sender.order_by(), all=True).order_by("search_rank", "-sent_at")
+
+
+def is_ranked_search(queryset):
+    return "search_rank" in getattr(queryset.query, "extra_select", {})
+
+
+class MessageSearchFilter(filters.SearchFilter):
+    """
+    Recherche `?search=` via l'index FTS5 : résultats classés par pertinence,
+    recherche par préfixe et extrait surligné. Hors SQLite, retombe sur le
+    SearchFilter de DRF (icontains sur `search_fields`).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "").strip()
+        if not text:
+            return queryset
+        if not fts_available(connection):
+            return super().filter_queryset(request, queryset, view)
+        return search_messages(queryset, text)
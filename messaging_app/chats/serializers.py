@@ -1,15 +1,26 @@
 # messaging_app/chats/serializers.py
 
 from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 from .models import User, Conversation, Message
+from .managers import PREVIEW_LENGTH
+from .fieldsets import LimitedListSerializer, SparseFieldsMixin
+
+
+def make_preview(body):
+    """Retourne un extrait du message (PREVIEW_LENGTH caractères max)."""
+    if body is None:
+        return None
+    return body[:PREVIEW_LENGTH] + ("..." if len(body) > PREVIEW_LENGTH else "")
 
 
 # -------------------------
 # User Serializer
 # -------------------------
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Exemple d'utilisation de serializers.CharField explicitement
     full_name = serializers.CharField(source="get_full_name", read_only=True)
+    field_dependencies = {"full_name": ("first_name", "last_name")}
 
     class Meta:
         model = User
@@ -28,10 +39,11 @@ class UserSerializer(serializers.ModelSerializer):
 # -------------------------
 # Message Serializer
 # -------------------------
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     # Exemple d'utilisation de SerializerMethodField
     preview = serializers.SerializerMethodField()
+    field_dependencies = {"preview": ("message_body",)}
 
     class Meta:
         model = Message
@@ -45,15 +57,225 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def get_preview(self, obj):
         """Retourne un extrait du message (50 caractères max)."""
-        return obj.message_body[:50] + ("..." if len(obj.message_body) > 50 else "")
+        return make_preview(obj.message_body)
+
+
+# -------------------------
+# Fast Message Serializer (listes, lecture seule)
+# -------------------------
+class FastMessageSerializer:
+    """
+    Même sortie que MessageSerializer (mêmes clés, même ordre, mêmes valeurs),
+    construite à partir de lignes values_list() : ni instance de modèle ni
+    champ DRF par message. Lecture seule, utilisé par MessageViewSet.list.
+    Avec un `fieldset` (?fields= / ?exclude=), seules les colonnes des champs
+    demandés sont lues (prepare_queryset) et sérialisées.
+    """
+    field_names = ("message_id", "sender", "message_body", "preview", "sent_at")
+    sender_field_names = tuple(UserSerializer.Meta.fields)
+    row_fields = (
+        "message_id",
+        "message_body",
+        "sent_at",
+        "sender__user_id",
+        "sender__first_name",
+        "sender__last_name",
+        "sender__email",
+        "sender__phone_number",
+        "sender__role",
+        "sender__created_at",
+    )
+    sender_columns = row_fields[3:]
+
+    def __init__(self, instance=None, many=False, fieldset=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        # Rendu des dates de serializers.DateTimeField (fuseau, suffixe Z), avec
+        # le fuseau courant résolu une seule fois au lieu d'une fois par valeur
+        field = serializers.DateTimeField(read_only=True)
+        field.timezone = field.default_timezone()
+        self._datetime = field.to_representation
+        self._senders = {}
+        self._getters = None
+        if fieldset is not None:
+            self._sparse_senders = {}
+            sender_fieldset = fieldset.nested("sender")
+            self._sender_fields = (
+                sender_fieldset.apply(self.sender_field_names) if sender_fieldset else None
+            )
+            getters = self.sparse_getters()
+            kept = fieldset.apply(self.field_names, nested=("sender",))
+            self._getters = [(name, getters[name]) for name in kept]
+
+    @classmethod
+    def prepare_queryset(cls, queryset, fieldset=None):
+        # Lignes nommées : la pagination lit row.sent_at / row.message_id
+        return queryset.values_list(*cls.columns(fieldset), named=True)
+
+    @classmethod
+    def columns(cls, fieldset):
+        if fieldset is None:
+            return cls.row_fields
+        kept = fieldset.apply(cls.field_names, nested=("sender",))
+        # message_id et sent_at : toujours lus, clé de la pagination par curseur
+        columns = ["message_id", "sent_at"]
+        if "message_body" in kept or "preview" in kept:
+            columns.append("message_body")
+        if "sender" in kept:
+            columns += cls.sender_columns
+        return columns
+
+    def sender_representation(self, user_id, first_name, last_name, email, phone_number, role, created_at):
+        # Un même expéditeur revient souvent dans une page : calculé une fois
+        # (dictionnaire partagé entre ses messages, la sortie est en lecture seule)
+        sender = self._senders.get(user_id)
+        if sender is None:
+            sender = self._senders[user_id] = {
+                "user_id": str(user_id),
+                "first_name": first_name,
+                "last_name": last_name,
+                "email": email,
+                "phone_number": phone_number,
+                "role": role,
+                "created_at": self._datetime(created_at),
+                # User.get_full_name()
+                "full_name": f"{first_name} {last_name}".strip(),
+            }
+        return sender
+
+    def to_representation(self, row):
+        if self._getters is not None:
+            return {name: getter(row) for name, getter in self._getters}
+        message_id, body, sent_at, *sender = row
+        return {
+            "message_id": str(message_id),
+            "sender": self.sender_representation(*sender),
+            "message_body": body,
+            "preview": make_preview(body),
+            "sent_at": self._datetime(sent_at),
+        }
+
+    def sparse_getters(self):
+        """Valeur de chaque champ à partir d'une ligne nommée réduite (voir columns())."""
+        return {
+            "message_id": lambda row: str(row.message_id),
+            "sender": self.sparse_sender,
+            "message_body": lambda row: row.message_body,
+            "preview": lambda row: make_preview(row.message_body),
+            "sent_at": lambda row: self._datetime(row.sent_at),
+        }
+
+    def sparse_sender(self, row):
+        # Colonnes de l'expéditeur en fin de ligne (voir columns())
+        sender = self.sender_representation(*row[-len(self.sender_columns):])
+        if self._sender_fields is None:
+            return sender
+        sparse = self._sparse_senders.get(row.sender__user_id)
+        if sparse is None:
+            sparse = self._sparse_senders[row.sender__user_id] = {
+                name: sender[name] for name in self._sender_fields
+            }
+        return sparse
+
+    @property
+    def data(self):
+        if self.many:
+            to_representation = self.to_representation
+            return ReturnList([to_representation(row) for row in self.instance], serializer=self)
+        return ReturnDict(self.to_representation(self.instance), serializer=self)
+
+
+# -------------------------
+# Side-loaded Message Serializer (?include=users)
+# -------------------------
+class SideloadedMessageSerializer(FastMessageSerializer):
+    """
+    Variante de FastMessageSerializer pour ?include=users : chaque message ne
+    porte que `sender_id`, et `users` (clé de premier niveau de la réponse)
+    contient une fois chaque expéditeur de la page, lus en une seule requête.
+    """
+    field_names = ("message_id", "sender_id", "message_body", "preview", "sent_at")
+    row_fields = ("message_id", "message_body", "sent_at", "sender_id")
+    user_fields = (
+        "user_id", "first_name", "last_name", "email", "phone_number", "role", "created_at",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sender_ids = {}  # ensemble ordonné des expéditeurs rencontrés
+
+    @classmethod
+    def columns(cls, fieldset):
+        # Quatre colonnes, toutes utiles aux expéditeurs chargés à part
+        if fieldset is not None:
+            fieldset.apply(cls.field_names)
+        return cls.row_fields
+
+    def sparse_getters(self):
+        return {
+            **super().sparse_getters(),
+            "sender_id": lambda row: str(row.sender_id),
+        }
+
+    def to_representation(self, row):
+        message_id, body, sent_at, sender_id = row
+        self._sender_ids[sender_id] = None
+        if self._getters is not None:
+            return {name: getter(row) for name, getter in self._getters}
+        return {
+            "message_id": str(message_id),
+            "sender_id": str(sender_id),
+            "message_body": body,
+            "preview": make_preview(body),
+            "sent_at": self._datetime(sent_at),
+        }
+
+    @property
+    def users(self):
+        """{user_id: représentation de UserSerializer} des expéditeurs sérialisés."""
+        missing = [user_id for user_id in self._sender_ids if user_id not in self._senders]
+        if missing:
+            for row in User.objects.filter(pk__in=missing).values_list(*self.user_fields):
+                self.sender_representation(*row)
+        return {
+            str(user_id): self._senders[user_id]
+            for user_id in self._sender_ids if user_id in self._senders
+        }
+
+
+# -------------------------
+# Message Search Result Serializer
+# -------------------------
+class MessageSearchResultSerializer(MessageSerializer):
+    """Message + score bm25 et extrait surligné (voir chats/search.py)."""
+    rank = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ["rank", "snippet"]
+
+    def get_rank(self, obj):
+        return getattr(obj, "search_rank", None)
+
+    def get_snippet(self, obj):
+        return getattr(obj, "search_snippet", None)
 
 
 # -------------------------
 # Conversation Serializer
 # -------------------------
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Détail d'une conversation avec ses `recent_messages` derniers messages,
+    du plus récent au plus ancien. L'historique complet passe par
+    conversations/{id}/messages/ (pagination par curseur).
+    """
+    recent_messages = 50
     participants = UserSerializer(many=True, read_only=True)
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = LimitedListSerializer(
+        child=MessageSerializer(), read_only=True,
+        ordering=("-sent_at", "-message_id"), limit=recent_messages,
+    )
 
     class Meta:
         model = Conversation
@@ -72,3 +294,56 @@ class ConversationSerializer(serializers.ModelSerializer):
         if not self.instance and not data.get("participants"):
             raise serializers.ValidationError("Une conversation doit avoir au moins un participant.")
         return data
+
+
+# -------------------------
+# Conversation Summary Serializer (listes)
+# -------------------------
+class ConversationSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Représentation légère pour GET /conversations/ : pas d'historique des messages,
+    seulement des compteurs calculés par ConversationQuerySet.with_summary().
+    L'historique complet passe par conversations/{id}/messages/.
+    """
+    participants = UserSerializer(many=True, read_only=True)
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_at = serializers.DateTimeField(read_only=True)
+    last_message_preview = serializers.SerializerMethodField()
+    # État de lecture de l'utilisateur connecté (ConversationQuerySet.with_read_state)
+    last_read_at = serializers.DateTimeField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            "conversation_id",
+            "participants",
+            "message_count",
+            "last_message_at",
+            "last_message_preview",
+            "last_read_at",
+            "unread_count",
+            "created_at",
+        ]
+
+    def get_last_message_preview(self, obj):
+        return make_preview(obj.last_message_excerpt)
+
+
+# -------------------------
+# Conversation Read State Serializer (POST /conversations/{id}/read/)
+# -------------------------
+class ConversationReadStateSerializer(serializers.Serializer):
+    last_read_message_id = serializers.UUIDField(read_only=True, allow_null=True)
+    last_read_at = serializers.DateTimeField(read_only=True, allow_null=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+
+# -------------------------
+# Bulk Message Item Serializer (POST /messages/bulk/)
+# -------------------------
+class BulkMessageItemSerializer(serializers.Serializer):
+    """Validation d'un élément d'un envoi groupé (sans requête SQL)."""
+    conversation_id = serializers.UUIDField()
+    sender_id = serializers.UUIDField(required=False)
+    message_body = serializers.CharField(allow_blank=False, trim_whitespace=False)
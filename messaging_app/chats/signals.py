@@ -0,0 +1,139 @@
+# messaging_app/chats/signals.py
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .events import hub
+from .models import User, ClaimsUser, Conversation, ConversationParticipant, Message
+from .permissions import membership_cache_key
+
+
+def forget_memberships(conversation_id, user_ids):
+    cache.delete_many([membership_cache_key(conversation_id, user_id) for user_id in user_ids])
+
+
+def deleting_conversations(origin):
+    """
+    Suppression lancée sur des conversations (instance ou QuerySet) : leurs
+    messages et liens partent avec elles, rien à tenir à jour sur leurs lignes.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, Conversation)
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def invalidate_membership_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalide le cache d'appartenance (voir permissions.is_participant)
+    quand des participants sont retirés d'une conversation.
+    """
+    if action == "post_remove":
+        if reverse:
+            # user.conversations.remove(...) : instance est l'utilisateur
+            for conversation_id in pk_set:
+                forget_memberships(conversation_id, [instance.pk])
+        else:
+            forget_memberships(instance.pk, pk_set)
+    elif action == "pre_clear":
+        # pk_set est vide pour clear() : on lit l'état avant suppression
+        if reverse:
+            links = ConversationParticipant.objects.filter(user=instance)
+            for conversation_id in links.values_list("conversation_id", flat=True):
+                forget_memberships(conversation_id, [instance.pk])
+        else:
+            links = ConversationParticipant.objects.filter(conversation=instance)
+            forget_memberships(instance.pk, links.values_list("user_id", flat=True))
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def bump_version_on_participants_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Les participants font partie de la réponse : nouvelle version de la
+    conversation, et sa participant_key ne correspond plus à rien.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        Conversation.objects.filter(pk=instance.pk).participants_changed()
+    elif action == "pre_clear":
+        Conversation.objects.filter(memberships__user=instance).participants_changed()
+    elif pk_set:
+        Conversation.objects.filter(pk__in=pk_set).participants_changed()
+
+
+@receiver(post_delete, sender=ConversationParticipant)
+def invalidate_deleted_membership(sender, instance, **kwargs):
+    # Suppression directe du lien ou en cascade (conversation / utilisateur supprimé)
+    forget_memberships(instance.conversation_id, [instance.user_id])
+    if not deleting_conversations(kwargs["origin"]):
+        Conversation.objects.filter(pk=instance.conversation_id).participants_changed()
+
+
+@receiver(post_save, sender=ConversationParticipant)
+def bump_version_on_new_membership(sender, instance, created, **kwargs):
+    if created:
+        Conversation.objects.filter(pk=instance.conversation_id).participants_changed()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Rôle, statut actif... : les tokens émis avant la modification ne sont plus
+    crus sur parole (voir chats.authentication.StatelessJWTAuthentication).
+    """
+    if kwargs.get("created"):
+        return
+    invalidate_user(instance.pk)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        # Le profil apparaît dans les réponses de ses conversations
+        Conversation.objects.filter(memberships__user_id=instance.pk).bump_version()
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    """Met à jour message_count / last_message_* de la conversation (un UPDATE)."""
+    if created:
+        Conversation.objects.record_messages([instance])
+    else:
+        # Message modifié
+        Conversation.objects.filter(pk=instance.conversation_id).bump_version()
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    """Diffuse le message aux flux SSE une fois la transaction validée."""
+    if created:
+        transaction.on_commit(lambda: hub.publish_messages([instance]))
+
+
+@receiver(pre_delete, sender=Message)
+def collect_deleted_messages(sender, instance, origin, **kwargs):
+    """
+    Suppression groupée (QuerySet, utilisateur supprimé en cascade) : note les
+    conversations touchées sur `origin`, recalculées une fois chacune ensuite.
+    """
+    if origin is instance or deleting_conversations(origin):
+        return
+    if not hasattr(origin, "_chats_deleted_from"):
+        origin._chats_deleted_from = set()
+    origin._chats_deleted_from.add(instance.conversation_id)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, origin, **kwargs):
+    if origin is instance:
+        Conversation.objects.forget_message(instance)
+        return
+    # Tous les messages de la suppression sont déjà effacés à ce stade
+    # (post_delete est envoyé après les DELETE) : un recalcul par conversation
+    pending = getattr(origin, "_chats_deleted_from", ())
+    if instance.conversation_id in pending:
+        pending.discard(instance.conversation_id)
+        Conversation.objects.filter(pk=instance.conversation_id).rebuild_activity()
@@ -1,3 +1,1982 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.http import Http404
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .events import event_stream, conversation_events, hub
+from .benchmarks import SCENARIOS, compare_results, generate, run_scenarios
+from .backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from .conditional import response_cache_stats
+from .authentication import (
+    ChatsTokenObtainPairSerializer,
+    StatelessJWTAuthentication,
+    clear_user_cache,
+    shared_auth_cache,
+)
+from .export import EXPORT_FIELDS
+from .management.commands.import_chats import derived_uuid
+from .managers import participant_set_key
+from .models import User, Conversation, ConversationParticipant, Message
+from .instrumentation import query_budget, query_shape, record_queries
+from .middleware import LoadSheddingMiddleware, QueryInstrumentationMiddleware
+from .permissions import is_participant
+from . import renderers
+from .renderers import FastJSONRenderer, MessagePackRenderer
+from . import routers
+from .routers import PrimaryReplicaRouter, available_replicas, routing_context
+from .serializers import (
+    ConversationSerializer,
+    FastMessageSerializer,
+    MessageSerializer,
+    SideloadedMessageSerializer,
+)
+from .throttling import RateStore, rate_store
+from .uuids import uuid7, uuid7_datetime
+
+
+def make_user(email, **extra):
+    return User.objects.create(
+        email=email, password="test123", first_name="Test", last_name=email.split("@")[0], **extra
+    )
+
+
+def make_messages(conversation, sender, count, start=None):
+    """Crée `count` messages espacés d'une seconde, du plus ancien au plus récent."""
+    start = start or timezone.now() - timedelta(days=1)
+    messages = Message.objects.bulk_create([
+        Message(conversation=conversation, sender=sender, message_body=f"message {i}")
+        for i in range(count)
+    ])
+    for i, message in enumerate(messages):
+        message.sent_at = start + timedelta(seconds=i)
+    Message.objects.bulk_update(messages, ["sent_at"])
+    Conversation.objects.filter(pk=conversation.pk).rebuild_activity()
+    return messages
+
+
+class MessageCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.messages = make_messages(self.conversation, self.alice, 25)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("message-list")
+
+    def ids(self, response):
+        return [item["message_id"] for item in response.data["results"]]
+
+    def expected(self, messages):
+        return [str(m.message_id) for m in messages]
+
+    def test_first_page_is_most_recent_without_count(self):
+        response = self.client.get(self.url, {"page_size": 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(self.ids(response), self.expected(self.messages[::-1][:10]))
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_forward_and_backward_scrolling(self):
+        first = self.client.get(self.url, {"page_size": 10})
+        second = self.client.get(first.data["next"])
+        self.assertEqual(self.ids(second), self.expected(self.messages[::-1][10:20]))
+        third = self.client.get(second.data["next"])
+        self.assertEqual(self.ids(third), self.expected(self.messages[::-1][20:]))
+        self.assertIsNone(third.data["next"])
+
+        back = self.client.get(third.data["previous"])
+        self.assertEqual(self.ids(back), self.ids(second))
+        top = self.client.get(back.data["previous"])
+        self.assertEqual(self.ids(top), self.ids(first))
+        self.assertIsNone(top.data["previous"])
+
+    def test_ascending_ordering_is_kept_across_cursors(self):
+        first = self.client.get(self.url, {"page_size": 10, "ordering": "sent_at"})
+        self.assertEqual(self.ids(first), self.expected(self.messages[:10]))
+        second = self.client.get(first.data["next"])
+        self.assertEqual(self.ids(second), self.expected(self.messages[10:20]))
+        third = self.client.get(second.data["next"])
+        self.assertEqual(self.ids(third), self.expected(self.messages[20:]))
+        self.assertIsNone(third.data["next"])
+
+        back = self.client.get(third.data["previous"])
+        self.assertEqual(self.ids(back), self.ids(second))
+        self.assertEqual(self.ids(self.client.get(back.data["previous"])), self.ids(first))
+
+        around = self.client.get(self.url, {"page_size": 6, "ordering": "sent_at",
+                                            "around": str(self.messages[12].message_id)})
+        self.assertEqual(self.ids(around), self.expected(self.messages[9:15]))
+
+    def test_ties_on_sent_at_are_broken_by_message_id(self):
+        Message.objects.update(sent_at=timezone.now())
+        seen = []
+        url = self.url + "?page_size=7"
+        while url:
+            response = self.client.get(url)
+            seen.extend(self.ids(response))
+            url = response.data["next"]
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(self.url, {"cursor": "bm90LWEtY3Vyc29y:forged:signature"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_around_message(self):
+        anchor = self.messages[12]
+        response = self.client.get(self.url, {"page_size": 6, "around": str(anchor.message_id)})
+        self.assertEqual(self.ids(response), self.expected(self.messages[10:16][::-1]))
+        newer = self.client.get(response.data["previous"])
+        self.assertEqual(self.ids(newer), self.expected(self.messages[16:22][::-1]))
+        older = self.client.get(response.data["next"])
+        self.assertEqual(self.ids(older), self.expected(self.messages[4:10][::-1]))
+
+    def test_around_unknown_message(self):
+        other = Conversation.objects.create()
+        other.participants.set([self.bob])
+        hidden = make_messages(other, self.bob, 1)[0]
+        response = self.client.get(self.url, {"around": str(hidden.message_id)})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_for_old_clients(self):
+        response = self.client.get(self.url, {"page": 2, "page_size": 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+
+
+class FastMessageSerializerTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com", phone_number="+33600000000", role="host")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        make_messages(self.conversation, self.alice, 3)
+        make_messages(self.conversation, self.bob, 3)
+        Message.objects.create(conversation=self.conversation, sender=self.bob, message_body="é" * 80)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_output_is_byte_identical(self):
+        queryset = Message.objects.select_related("sender").order_by("-sent_at", "-message_id")
+        expected = JSONRenderer().render(MessageSerializer(queryset, many=True).data)
+        rows = FastMessageSerializer.prepare_queryset(queryset)
+        self.assertEqual(JSONRenderer().render(FastMessageSerializer(rows, many=True).data), expected)
+
+    def test_list_uses_fast_serializer(self):
+        response = self.client.get(reverse("message-list"), {"page_size": 100})
+        queryset = Message.objects.select_related("sender").order_by("-sent_at", "-message_id")
+        self.assertEqual(
+            json.dumps(response.json()["results"]),
+            json.dumps(json.loads(JSONRenderer().render(MessageSerializer(queryset, many=True).data))),
+        )
+        # Le détail garde MessageSerializer
+        detail = self.client.get(reverse("message-detail", kwargs={"pk": queryset[0].pk}))
+        self.assertEqual(detail.json(), response.json()["results"][0])
+
+
+class SideloadedUsersTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com", phone_number="+33611111111")
+        self.carol = make_user("carol@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob, self.carol])
+        make_messages(self.conversation, self.alice, 40)
+        make_messages(self.conversation, self.bob, 40)
+        make_messages(self.conversation, self.carol, 20)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk})
+
+    def test_users_are_sideloaded_once(self):
+        nested = self.client.get(self.url, {"page_size": 100}).json()
+        # ETag + page + expéditeurs en une requête
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"page_size": 100, "include": "users"})
+        sideloaded = response.json()
+
+        self.assertEqual(len(sideloaded["results"]), 100)
+        self.assertEqual(set(sideloaded["users"]), {str(u.pk) for u in (self.alice, self.bob, self.carol)})
+        for message, expected in zip(sideloaded["results"], nested["results"]):
+            self.assertEqual(sideloaded["users"][message["sender_id"]], expected["sender"])
+            expected.pop("sender")
+            message.pop("sender_id")
+            self.assertEqual(message, expected)
+        self.assertIsNone(sideloaded["next"])
+
+    def test_payload_size(self):
+        # Débits et tailles par taille de page : manage.py bench_message_serializer
+        page = Message.objects.filter(conversation=self.conversation).order_by("-sent_at", "-message_id")
+
+        def model_serializer():
+            return {"results": MessageSerializer(page.select_related("sender")[:100], many=True).data}
+
+        def fast():
+            return {"results": FastMessageSerializer(FastMessageSerializer.prepare_queryset(page)[:100],
+                                                     many=True).data}
+
+        def sideloaded():
+            serializer = SideloadedMessageSerializer(SideloadedMessageSerializer.prepare_queryset(page)[:100],
+                                                     many=True)
+            return {"results": serializer.data, "users": serializer.users}
+
+        sizes = {
+            name: len(JSONRenderer().render(build()))
+            for name, build in (("MessageSerializer", model_serializer), ("FastMessageSerializer", fast),
+                                ("include=users", sideloaded))
+        }
+        self.assertEqual(sizes["MessageSerializer"], sizes["FastMessageSerializer"])
+        self.assertLess(sizes["include=users"], sizes["FastMessageSerializer"] * 0.6)
+
+
+class ConversationSummaryListTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-list")
+
+    def add_conversations(self, count, messages_per_conversation=3):
+        for _ in range(count):
+            conversation = Conversation.objects.create()
+            conversation.participants.set([self.alice, self.bob])
+            make_messages(conversation, self.bob, messages_per_conversation)
+
+    def test_summary_fields(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.set([self.alice, self.bob])
+        messages = make_messages(conversation, self.bob, 2)
+        Message.objects.filter(pk=messages[-1].pk).update(message_body="x" * 80)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        item = response.data["results"][0]
+        self.assertNotIn("messages", item)
+        self.assertEqual(item["message_count"], 2)
+        self.assertEqual(item["last_message_preview"], "x" * 50 + "...")
+        self.assertIsNotNone(item["last_message_at"])
+        self.assertEqual(len(item["participants"]), 2)
+
+    def test_empty_conversation(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.set([self.alice])
+        item = self.client.get(self.url).data["results"][0]
+        self.assertEqual(item["message_count"], 0)
+        self.assertIsNone(item["last_message_at"])
+        self.assertIsNone(item["last_message_preview"])
+
+    def test_list_query_count_does_not_grow(self):
+        self.add_conversations(2)
+        # ETag + COUNT de pagination + liste + participants
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        self.add_conversations(15, messages_per_conversation=10)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 17)
+
+    def test_detail_has_recent_messages_only(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.set([self.alice, self.bob])
+        messages = make_messages(conversation, self.bob, ConversationSerializer.recent_messages + 10)
+        url = reverse("conversation-detail", kwargs={"pk": conversation.pk})
+        # ETag + conversation + participants + derniers messages
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        expected = [str(m.message_id) for m in messages[::-1][:ConversationSerializer.recent_messages]]
+        self.assertEqual([m["message_id"] for m in response.data["messages"]], expected)
+
+        # Sans préchargement (réponses de create/update) : même limite, en SQL
+        data = ConversationSerializer(conversation).data
+        self.assertEqual([m["message_id"] for m in data["messages"]], expected)
+
+    def test_nested_messages_route_is_scoped_to_conversation(self):
+        self.add_conversations(2, messages_per_conversation=4)
+        conversation = Conversation.objects.first()
+        url = reverse("conversation-messages-list", kwargs={"conversation_pk": conversation.pk})
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 4)
+
+
+class ExplainQueriesCommandTest(TestCase):
+    def test_seeds_and_explains(self):
+        out = StringIO()
+        call_command(
+            "explain_queries", users=5, conversations=4, messages=40, repeat=1,
+            seed_into_default=True, stdout=out,
+        )
+        self.assertEqual(Message.objects.count(), 40)
+        output = out.getvalue()
+        self.assertIn("MessageViewSet.list", output)
+        self.assertIn("chats_messa_convers", output)  # index (conversation, sent_at)
+
+
+class MessageSearchTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("message-list")
+
+    def send(self, body, conversation=None, sender=None):
+        return Message.objects.create(
+            conversation=conversation or self.conversation,
+            sender=sender or self.bob,
+            message_body=body,
+        )
+
+    def search(self, text):
+        response = self.client.get(self.url, {"search": text})
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_ranked_results_with_snippet(self):
+        self.send("la facture est prête")
+        best = self.send("facture facture facture en retard")
+        self.send("rien à voir")
+        results = self.search("facture")
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["message_id"], str(best.message_id))
+        self.assertIn("<mark>facture</mark>", results[0]["snippet"])
+        self.assertLessEqual(results[0]["rank"], results[1]["rank"])
+
+    def test_prefix_and_accents(self):
+        self.send("Réunion déplacée à demain")
+        self.assertEqual(len(self.search("reun")), 1)
+        self.assertEqual(len(self.search("deplac* dem")), 1)
+        self.assertEqual(len(self.search("reunion absent")), 0)
+
+    def test_index_follows_updates_and_deletes(self):
+        message = self.send("ancien texte")
+        message.message_body = "nouveau contenu"
+        message.save()
+        self.assertEqual(len(self.search("ancien")), 0)
+        self.assertEqual(len(self.search("nouveau")), 1)
+        Message.objects.filter(pk=message.pk).delete()
+        self.assertEqual(len(self.search("nouveau")), 0)
+
+    def test_bulk_created_messages_are_indexed(self):
+        make_messages(self.conversation, self.bob, 5)
+        self.assertEqual(len(self.search("message")), 5)
+
+    def test_restricted_to_callers_conversations(self):
+        carol = make_user("carol@example.com")
+        other = Conversation.objects.create()
+        other.participants.set([self.bob, carol])
+        self.send("secret de carol", conversation=other)
+        self.send("secret partagé")
+        results = self.search("secret")
+        self.assertEqual(len(results), 1)
+
+    def test_matches_sender_email(self):
+        by_text = self.send("compte rendu pour alice")
+        by_sender = self.send("bonjour", sender=self.alice)
+        both = self.send("alice rappelle alice", sender=self.alice)
+        self.send("rien à voir")
+        results = self.search("alice")
+        # Correspondances du texte d'abord (classées), puis par l'adresse seule
+        self.assertEqual(
+            [result["message_id"] for result in results],
+            [str(both.pk), str(by_text.pk), str(by_sender.pk)],
+        )
+        self.assertEqual((results[2]["rank"], results[2]["snippet"]), (0, None))
+        self.assertEqual(self.client.get(self.url, {"search": "alice"}).data["count"], 3)
+
+    def test_query_syntax_is_escaped(self):
+        self.send("a OR b")
+        self.assertEqual(self.search('"OR NEAR( *'), [])
+
+
+@override_settings(CHATS_MEMBERSHIP_CACHE_TIMEOUT=0)
+class ParticipantPermissionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.carol = make_user("carol@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.message = make_messages(self.conversation, self.bob, 1)[0]
+        self.client = APIClient()
+
+    def detail_url(self):
+        return reverse("message-detail", kwargs={"pk": self.message.pk})
+
+    def test_membership_check_is_a_single_exists_query(self):
+        self.client.force_authenticate(self.alice)
+        # ETag (prouve aussi l'appartenance) + le message
+        with self.assertNumQueries(2):
+            response = self.client.get(self.detail_url())
+        self.assertEqual(response.status_code, 200)
+
+    def test_conversation_detail_uses_the_same_check(self):
+        self.client.force_authenticate(self.alice)
+        url = reverse("conversation-detail", kwargs={"pk": self.conversation.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_request_memo(self):
+        request = RequestFactory().get("/")
+        with self.assertNumQueries(1):
+            self.assertTrue(is_participant(self.alice, self.conversation.pk, request))
+            self.assertTrue(is_participant(self.alice, self.conversation.pk, request))
+
+    def test_non_participant_is_denied_on_create(self):
+        self.client.force_authenticate(self.carol)
+        response = self.client.post(reverse("message-list"), {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.carol.pk),
+            "message_body": "hello",
+        })
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(CHATS_MEMBERSHIP_CACHE_TIMEOUT=30)
+    def test_cache_is_invalidated_when_participants_change(self):
+        self.assertTrue(is_participant(self.bob, self.conversation.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_participant(self.bob, self.conversation.pk))
+
+        self.conversation.participants.remove(self.bob)
+        self.assertFalse(is_participant(self.bob, self.conversation.pk))
+
+        self.conversation.participants.add(self.bob)
+        self.assertTrue(is_participant(self.bob, self.conversation.pk))
+        self.conversation.participants.clear()
+        self.assertFalse(is_participant(self.bob, self.conversation.pk))
+
+    @override_settings(CHATS_MEMBERSHIP_CACHE_TIMEOUT=30)
+    def test_cache_is_invalidated_on_cascade_delete(self):
+        self.assertTrue(is_participant(self.bob, self.conversation.pk))
+        conversation_id = self.conversation.pk
+        self.conversation.delete()
+        self.assertFalse(is_participant(self.bob, conversation_id))
+
+
+class BulkMessageSendTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.carol = make_user("carol@example.com")
+        self.first = Conversation.objects.create()
+        self.first.participants.set([self.alice, self.bob])
+        self.second = Conversation.objects.create()
+        self.second.participants.set([self.alice, self.carol])
+        self.foreign = Conversation.objects.create()
+        self.foreign.participants.set([self.bob, self.carol])
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("message-bulk")
+
+    def item(self, conversation, body="hello", sender=None):
+        item = {"conversation_id": str(conversation.pk), "message_body": body}
+        if sender:
+            item["sender_id"] = str(sender.pk)
+        return item
+
+    def test_batch_across_conversations(self):
+        items = [self.item(self.first, f"a{i}") for i in range(30)]
+        items += [self.item(self.second, f"b{i}", sender=self.carol) for i in range(30)]
+        response = self.client.post(self.url, {"messages": items}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 60)
+        self.assertEqual(Message.objects.filter(conversation=self.first, sender=self.alice).count(), 30)
+        self.assertEqual(Message.objects.filter(conversation=self.second, sender=self.carol).count(), 30)
+
+    def test_query_count_does_not_depend_on_conversations(self):
+        small = [self.item(self.first)]
+        large = [self.item(self.first)] * 20 + [self.item(self.second)] * 20 + [self.item(self.foreign)]
+        # appartenance + SAVEPOINT + INSERT + UPDATE lecture + UPDATE compteurs + RELEASE
+        with self.assertNumQueries(6):
+            self.client.post(self.url, {"messages": small}, format="json")
+        with self.assertNumQueries(6):
+            self.client.post(self.url, {"messages": large}, format="json")
+
+    def test_per_item_results(self):
+        items = [
+            self.item(self.first),
+            self.item(self.foreign),
+            self.item(self.first, body=""),
+            self.item(self.first, sender=self.carol),
+        ]
+        response = self.client.post(self.url, {"messages": items}, format="json")
+        self.assertEqual(response.status_code, 207)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, [201, 403, 400, 400])
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_nested_route_defaults_conversation(self):
+        url = reverse("conversation-messages-bulk", kwargs={"conversation_pk": self.first.pk})
+        response = self.client.post(url, [{"message_body": "x"}, {"message_body": "y"}], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.first.messages.count(), 2)
+
+    def test_rejects_empty_batch(self):
+        response = self.client.post(self.url, {"messages": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class StatelessJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        # Réglages par défaut : marqueurs dans le cache de fichiers `auth`
+        caches[settings.CHATS_AUTH_CACHE].clear()
+        clear_user_cache()
+        self.alice = make_user("alice@example.com", role="host")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+        self.client = APIClient()
+        self.url = reverse("conversation-list")
+
+    def authenticate(self, user):
+        token = ChatsTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_default_auth_cache_is_shared(self):
+        self.assertIsNotNone(shared_auth_cache())
+
+    def test_no_user_query_per_request(self):
+        self.authenticate(self.alice)
+        # ETag + COUNT + liste + participants, pas de SELECT utilisateur
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_claims_user_loads_other_fields_once(self):
+        auth = StatelessJWTAuthentication()
+        token = auth.get_validated_token(str(ChatsTokenObtainPairSerializer.get_token(self.alice).access_token))
+        user = auth.get_user(token)
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.email, user.role), (self.alice.pk, "alice@example.com", "host"))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.last_name, "alice")
+            self.assertEqual(user.first_name, "Test")
+        with self.assertNumQueries(0):
+            self.assertEqual(auth.get_user(token).phone_number, None)
+
+    def test_deactivated_user_is_rejected_with_old_token(self):
+        self.authenticate(self.alice)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_role_change_is_seen_with_old_token(self):
+        auth = StatelessJWTAuthentication()
+        token = auth.get_validated_token(str(ChatsTokenObtainPairSerializer.get_token(self.alice).access_token))
+        self.alice.role = "admin"
+        self.alice.save()
+        self.assertEqual(auth.get_user(token).role, "admin")
+
+    def test_role_change_is_seen_with_token_from_old_refresh_token(self):
+        auth = StatelessJWTAuthentication()
+        refresh = ChatsTokenObtainPairSerializer.get_token(self.alice)
+        self.alice.role = "guest"
+        self.alice.save()
+        # Après la durée de vie d'un access token : le refresh token (rôle
+        # "host" dans ses claims) en produit encore de nouveaux
+        later = time.time() + jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds() + 60
+        with mock.patch("time.time", return_value=later):
+            token = auth.get_validated_token(str(refresh.access_token))
+            self.assertEqual(token["role"], "host")
+            self.assertEqual(auth.get_user(token).role, "guest")
+
+    def test_process_local_cache_reads_the_user(self):
+        auth = StatelessJWTAuthentication()
+        token = auth.get_validated_token(str(ChatsTokenObtainPairSerializer.get_token(self.alice).access_token))
+        with override_settings(CHATS_AUTH_CACHE="default"):
+            # Un marqueur posé par un autre worker n'y serait pas vu : lecture en base
+            User.objects.filter(pk=self.alice.pk).update(role="admin")
+            with self.assertNumQueries(1):
+                self.assertEqual(auth.get_user(token).role, "admin")
+
+
+class ConversationActivityTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+
+    def activity(self, conversation=None):
+        conversation = conversation or self.conversation
+        conversation.refresh_from_db()
+        return conversation.message_count, conversation.last_message_id, conversation.last_message_at
+
+    def send(self, body="hi"):
+        return Message.objects.create(conversation=self.conversation, sender=self.alice, message_body=body)
+
+    def test_create_and_delete(self):
+        first = self.send()
+        second = self.send()
+        self.assertEqual(self.activity(), (2, second.pk, second.sent_at))
+        second.delete()
+        self.assertEqual(self.activity(), (1, first.pk, first.sent_at))
+        first.delete()
+        self.assertEqual(self.activity(), (0, None, None))
+
+    def test_queryset_delete_recomputes_each_conversation_once(self):
+        other = Conversation.objects.create()
+        other.participants.set([self.alice])
+        messages = make_messages(self.conversation, self.alice, 5) + make_messages(other, self.alice, 3)
+        keep = messages[0]
+        # SELECT, SET_NULL des états de lecture, DELETE, un recalcul par conversation
+        with self.assertNumQueries(5):
+            Message.objects.exclude(pk=keep.pk).delete()
+        self.assertEqual(self.activity(), (1, keep.pk, keep.sent_at))
+        self.assertEqual(self.activity(other), (0, None, None))
+
+    def test_user_delete_recomputes_conversations(self):
+        first = self.send()
+        Message.objects.create(conversation=self.conversation, sender=self.bob, message_body="bob")
+        self.bob.delete()
+        self.assertEqual(self.activity(), (1, first.pk, first.sent_at))
+
+    def test_conversation_delete_skips_bookkeeping(self):
+        make_messages(self.conversation, self.alice, 300)
+        with CaptureQueriesContext(connection) as queries:
+            self.conversation.delete()
+        self.assertLess(len(queries), 15)
+        self.assertFalse(Message.objects.exists())
+
+    def test_bulk_endpoint_updates_counters_in_one_statement(self):
+        other = Conversation.objects.create()
+        other.participants.set([self.alice])
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        items = [{"conversation_id": str(c.pk), "message_body": "x"} for c in (self.conversation, other) * 3]
+        # appartenance + SAVEPOINT + INSERT + UPDATE lecture + UPDATE compteurs + RELEASE
+        with self.assertNumQueries(6):
+            client.post(reverse("message-bulk"), {"messages": items}, format="json")
+        self.assertEqual(self.activity()[0], 3)
+        self.assertEqual(self.activity(other)[0], 3)
+        latest = Message.objects.filter(conversation=other).order_by("-sent_at", "-message_id").first()
+        self.assertEqual(self.activity(other)[1], latest.pk)
+
+    def test_older_message_does_not_replace_last(self):
+        recent = self.send()
+        old = Message(conversation=self.conversation, sender=self.alice, message_body="old",
+                      sent_at=recent.sent_at - timedelta(days=1))
+        Conversation.objects.record_messages([old])
+        self.assertEqual(self.activity(), (2, recent.pk, recent.sent_at))
+
+    def test_rebuild_command(self):
+        messages = make_messages(self.conversation, self.bob, 4)
+        Conversation.objects.update(message_count=0, last_message_at=None, last_message_id=None)
+        call_command("rebuild_conversation_activity", stdout=StringIO())
+        self.assertEqual(self.activity(), (4, messages[-1].pk, messages[-1].sent_at))
+
+    def test_inbox_ordered_by_last_activity(self):
+        quiet = Conversation.objects.create()
+        quiet.participants.set([self.alice])
+        self.send()
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        results = client.get(reverse("conversation-list")).data["results"]
+        self.assertEqual(results[0]["conversation_id"], str(self.conversation.pk))
+        self.assertEqual(results[0]["message_count"], 1)
+
+
+class ConversationReadStateTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.messages = make_messages(self.conversation, self.bob, 10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.read_url = reverse("conversation-read", kwargs={"pk": self.conversation.pk})
+
+    def unread(self):
+        response = self.client.get(reverse("conversation-list"))
+        return {item["conversation_id"]: item["unread_count"] for item in response.data["results"]}
+
+    def test_never_read_conversation_is_fully_unread(self):
+        self.assertEqual(self.unread(), {str(self.conversation.pk): 10})
+
+    def test_advance_to_message(self):
+        response = self.client.post(self.read_url, {"message_id": str(self.messages[6].pk)}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["unread_count"], 3)
+        self.assertEqual(response.data["last_read_message_id"], str(self.messages[6].pk))
+        self.assertEqual(self.unread(), {str(self.conversation.pk): 3})
+
+    def test_read_marker_never_moves_back(self):
+        self.client.post(self.read_url, {"message_id": str(self.messages[6].pk)}, format="json")
+        response = self.client.post(self.read_url, {"message_id": str(self.messages[2].pk)}, format="json")
+        self.assertEqual(response.data["last_read_message_id"], str(self.messages[6].pk))
+        self.assertEqual(response.data["unread_count"], 3)
+
+    def test_advance_to_latest_by_default(self):
+        response = self.client.post(self.read_url)
+        self.assertEqual(response.data["unread_count"], 0)
+        self.assertEqual(response.data["last_read_message_id"], str(self.messages[-1].pk))
+
+    def test_message_from_another_conversation_is_rejected(self):
+        other = Conversation.objects.create()
+        other.participants.set([self.alice])
+        foreign = make_messages(other, self.alice, 1)[0]
+        response = self.client.post(self.read_url, {"message_id": str(foreign.pk)}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_participant_gets_404(self):
+        self.client.force_authenticate(make_user("carol@example.com"))
+        self.assertEqual(self.client.post(self.read_url).status_code, 404)
+
+    def test_own_messages_are_read(self):
+        self.client.post(self.read_url)
+        Message.objects.create(conversation=self.conversation, sender=self.bob, message_body="nouveau")
+        self.assertEqual(self.unread(), {str(self.conversation.pk): 1})
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.unread(), {str(self.conversation.pk): 0})
+
+    def test_reading_changes_the_inbox_etag(self):
+        url = reverse("conversation-list")
+        etag = self.client.get(url)["ETag"]
+        self.client.post(self.read_url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unread_count_is_read_from_the_index(self):
+        queryset = Conversation.objects.filter(participants=self.alice).with_summary(self.alice)
+        plan = queryset.explain()
+        # Comptage par intervalle sur l'index (conversation, sent_at), aucun parcours de table
+        self.assertRegex(plan, r"USING COVERING INDEX \w+ \(conversation_id=\? AND sent_at>\?\)")
+        self.assertNotIn("SCAN", plan)
+
+
+class ImportChatsCommandTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.existing = make_user("alice@example.com")
+        start = timezone.now() - timedelta(days=10)
+        self.rows = [
+            {
+                "conversation_id": f"legacy-{i % 3}",
+                "sender_email": ("alice@example.com", "bob@example.com")[i % 2],
+                "sender_first_name": "Bob",
+                "sender_last_name": "Legacy",
+                "message_body": f"historique {i}",
+                "sent_at": (start + timedelta(minutes=i)).isoformat(),
+                "participants": ["carol@example.com"],
+            }
+            for i in range(25)
+        ]
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.dir.name, "export.jsonl")
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.writelines(json.dumps(row) + "\n" for row in rows)
+        return path
+
+    def run_import(self, path, **options):
+        call_command("import_chats", path, chunk_size=10, stdout=StringIO(), **options)
+
+    def assert_imported(self):
+        self.assertEqual(Message.objects.count(), 25)
+        self.assertEqual(Conversation.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 3)
+        bob = User.objects.get(email="bob@example.com")
+        self.assertEqual(bob.last_name, "Legacy")
+        self.assertEqual(
+            set(Conversation.objects.get(pk=derived_uuid("legacy-0")).participants.values_list("email", flat=True)),
+            {"alice@example.com", "bob@example.com", "carol@example.com"},
+        )
+        counts = Conversation.objects.values_list("message_count", flat=True)
+        self.assertEqual(sorted(counts), [8, 8, 9])
+        last = Message.objects.filter(conversation_id=derived_uuid("legacy-0")).order_by("-sent_at").first()
+        self.assertEqual(Conversation.objects.get(pk=derived_uuid("legacy-0")).last_message_id, last.pk)
+
+    def test_import_jsonl(self):
+        path = self.write_jsonl(self.rows)
+        self.run_import(path)
+        self.assert_imported()
+        # Le message garde sa date historique et l'utilisateur existant est réutilisé
+        first = Message.objects.get(message_body="historique 0")
+        self.assertEqual(first.sent_at.isoformat(), self.rows[0]["sent_at"])
+        self.assertEqual(first.sender_id, self.existing.pk)
+        self.assertFalse(os.path.exists(path + ".progress"))
+
+    def test_import_csv(self):
+        path = os.path.join(self.dir.name, "export.csv")
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            writer = csv.DictWriter(stream, fieldnames=list(self.rows[0]))
+            writer.writeheader()
+            writer.writerows({**row, "participants": ";".join(row["participants"])} for row in self.rows)
+        self.run_import(path)
+        self.assert_imported()
+
+    def test_restart_after_failure_resumes_from_last_chunk(self):
+        path = self.write_jsonl(self.rows)
+        real_bulk_create = Message.objects.bulk_create
+        calls = []
+
+        def failing_bulk_create(objs, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise RuntimeError("arrêt")
+            return real_bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Message.objects, "bulk_create", failing_bulk_create):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path)
+        self.assertEqual(Message.objects.count(), 10)
+        with open(path + ".progress") as stream:
+            self.assertEqual(json.loads(stream.readlines()[-1])["offset"], 10)
+
+        out = StringIO()
+        call_command("import_chats", path, chunk_size=10, stdout=out)
+        self.assertIn("Reprise après la ligne 10", out.getvalue())
+        self.assert_imported()
+
+    def test_rerun_does_not_duplicate(self):
+        path = self.write_jsonl(self.rows)
+        self.run_import(path)
+        self.run_import(path)
+        self.assert_imported()
+
+
+class BenchmarkSuiteTest(TestCase):
+    def generate_ids(self, **params):
+        with transaction.atomic():
+            data = generate(**params)
+            ids = (
+                list(Message.objects.order_by("sent_at").values_list("message_id", "conversation_id", "message_body")),
+                data.conversations_by_size,
+            )
+            transaction.set_rollback(True)
+        return ids
+
+    def test_generator_is_deterministic(self):
+        params = {"seed": 7, "users": 10, "conversations": 20, "messages": 300}
+        self.assertEqual(self.generate_ids(**params), self.generate_ids(**params))
+        self.assertNotEqual(self.generate_ids(**params), self.generate_ids(**{**params, "seed": 8}))
+
+    def test_skew_concentrates_messages(self):
+        data = generate(seed=1, users=10, conversations=50, messages=2000, skew=1.2)
+        counts = sorted(data.message_counts.values(), reverse=True)
+        self.assertGreater(counts[0], 10 * counts[-1] + 1)
+        self.assertEqual(
+            Conversation.objects.get(pk=data.conversations_by_size[0]).message_count, counts[0]
+        )
+
+    def test_scenarios_report_percentiles_and_queries(self):
+        data = generate(seed=1, users=10, conversations=20, messages=500)
+        results = run_scenarios(data, iterations=5, warmup=1)
+        self.assertEqual(list(results), list(SCENARIOS))
+        for stats in results.values():
+            self.assertLessEqual(stats["p50_ms"], stats["p95_ms"])
+            self.assertLessEqual(stats["p95_ms"], stats["p99_ms"])
+            self.assertGreater(stats["queries"], 0)
+        lines = compare_results({"results": results}, {"results": results})
+        self.assertIn("(+0%)", lines[0])
+
+
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    @override_settings(CHATS_SQL_INSTRUMENTATION=True)
+    def test_server_timing_header(self):
+        with record_queries() as recorder:
+            response = self.client.get(reverse("conversation-list"))
+        metrics = response["Server-Timing"]
+        self.assertIn(f'desc="{recorder.count} queries"', metrics)
+        self.assertRegex(metrics, r"db;dur=[\d.]+;.*app;dur=[\d.]+")
+        self.assertNotIn("n-plus-one", metrics)
+
+    @override_settings(CHATS_SQL_INSTRUMENTATION=False)
+    def test_disabled_middleware_is_not_loaded(self):
+        response = APIClient().get(reverse("conversation-list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware(lambda request: None)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        users = [make_user(f"user{i}@example.com") for i in range(6)]
+        with record_queries() as recorder:
+            for user in users:
+                list(Message.objects.filter(sender=user)[:5])
+            Message.objects.filter(pk__in=[u.pk for u in users[:2]]).exists()
+            Message.objects.filter(pk__in=[u.pk for u in users]).exists()
+        [(shape, count)] = recorder.repeated_shapes(threshold=5)
+        self.assertEqual(count, 6)
+        self.assertIn("LIMIT N", shape)
+        self.assertEqual(query_shape("SELECT 1 WHERE id IN (%s, %s)"), query_shape("SELECT 1 WHERE id IN (%s)"))
+
+    def test_query_budget(self):
+        url = reverse("conversation-list")
+        with query_budget(4):
+            self.client.get(url)
+        with self.assertRaisesRegex(AssertionError, "requêtes pour un budget de 2"):
+            with query_budget(2):
+                self.client.get(url)
+
+
+class SQLiteTuningTest(TestCase):
+    """Pragmas appliqués à l'ouverture et BEGIN IMMEDIATE (chats.backends.sqlite3)."""
+
+    def open_file_database(self, **options):
+        path = os.path.join(tempfile.mkdtemp(), "tuning.sqlite3")
+        settings_dict = {**connection.settings_dict, "NAME": path, "OPTIONS": options}
+        wrapper = SQLiteDatabaseWrapper(settings_dict, alias="tuning")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    @override_settings(CHATS_SQLITE_PRAGMAS={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 7000})
+    def test_pragmas_applied_on_new_file_connection(self):
+        wrapper = self.open_file_database()
+
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 7000)
+
+    def test_in_memory_database_is_left_alone(self):
+        self.assertTrue(connection.is_in_memory_db())
+        self.assertEqual(self.pragma(connection, "journal_mode"), "memory")
+
+    def test_transaction_mode_immediate(self):
+        wrapper = self.open_file_database(transaction_mode="immediate")
+        with CaptureQueriesContext(wrapper) as captured:
+            wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            wrapper.rollback()
+            wrapper.set_autocommit(True)
+        self.assertEqual(captured[0]["sql"], "BEGIN IMMEDIATE")
+
+        # Sans transaction_mode : BEGIN différé de Django
+        wrapper = self.open_file_database()
+        with CaptureQueriesContext(wrapper) as captured:
+            wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            wrapper.rollback()
+            wrapper.set_autocommit(True)
+        self.assertEqual(captured[0]["sql"], "BEGIN")
+
+    def test_invalid_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.open_file_database(transaction_mode="LAZY")
+
+
+REPLICAS = ["replica_a", "replica_b"]
+
+
+@override_settings(CHATS_DATABASE_REPLICAS=REPLICAS, CHATS_RESPONSE_CACHE_TIMEOUT=0)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Deux réplicas SQLite sur fichier, recopiés depuis `default` par
+    sync_replicas() (sauvegarde SQLite) : entre deux copies, ils sont en retard.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Alias ajoutés après la mise en place de TransactionTestCase : hors
+        # `databases`, ils ne sont ni vidés ni interdits d'accès
+        super().setUpClass()
+        directory = tempfile.mkdtemp()
+        for alias in REPLICAS:
+            connections.settings[alias] = {
+                **connections["default"].settings_dict, "NAME": os.path.join(directory, f"{alias}.sqlite3"),
+            }
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.dict(routers._unavailable, clear=True))
+        with routing_context():
+            self.alice = make_user("alice@example.com")
+            self.conversation = Conversation.objects.create()
+            self.conversation.participants.set([self.alice])
+            make_messages(self.conversation, self.alice, 3)
+        self.sync_replicas()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk})
+
+    def sync_replicas(self):
+        for alias in REPLICAS:
+            connections[alias].ensure_connection()
+            connections["default"].connection.backup(connections[alias].connection)
+
+    def aliases(self, recorder):
+        return {alias for alias, _, _ in recorder.queries}
+
+    def test_reads_rotate_over_replicas(self):
+        used = []
+        for _ in range(4):
+            with record_queries() as recorder:
+                response = self.client.get(self.url)
+            self.assertEqual(len(response.data["results"]), 3)
+            self.assertEqual(len(self.aliases(recorder)), 1)
+            used.extend(self.aliases(recorder))
+        self.assertNotIn("default", used)
+        self.assertEqual(set(used), set(REPLICAS))
+
+    def test_writes_go_to_primary_and_pin_the_client(self):
+        response = self.client.post(reverse("message-list"), {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.alice.pk),
+            "message_body": "nouveau",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("chats_primary", response.cookies)
+
+        # Le même client relit le primaire et voit son message...
+        with record_queries() as recorder:
+            response = self.client.get(self.url)
+        self.assertEqual(self.aliases(recorder), {"default"})
+        self.assertEqual(len(response.data["results"]), 4)
+
+        # ... un autre client lit un réplica, pas encore à jour
+        other = APIClient()
+        other.force_authenticate(self.alice)
+        self.assertEqual(len(other.get(self.url).data["results"]), 3)
+        self.sync_replicas()
+        self.assertEqual(len(other.get(self.url).data["results"]), 4)
+
+    def test_failing_replica_falls_back_to_primary(self):
+        # Réplica vidé : « no such table » à la première lecture
+        for alias in REPLICAS:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("DROP TABLE chats_message")
+
+        with self.assertLogs("chats.db", "WARNING"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 3)
+
+        with self.assertLogs("chats.db", "WARNING"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(available_replicas(), [])
+        with record_queries() as recorder:
+            self.client.get(self.url)
+        self.assertEqual(self.aliases(recorder), {"default"})
+
+    def test_replicas_are_not_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertTrue(router.allow_migrate("default", "chats"))
+        self.assertFalse(router.allow_migrate("replica_a", "chats"))
+
+
+class DirectConversationTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.carol = make_user("carol@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-direct")
+
+    def direct(self, *users):
+        return self.client.post(self.url, {"participants": [str(user.pk) for user in users]}, format="json")
+
+    def test_get_or_create(self):
+        created = self.direct(self.bob)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.data["message_count"], 0)
+        self.assertEqual(len(created.data["participants"]), 2)
+
+        again = self.direct(self.bob)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data["conversation_id"], created.data["conversation_id"])
+
+        # Même ensemble vu par l'autre participant, lui-même inclus ou non
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.direct(self.alice, self.bob).data["conversation_id"], created.data["conversation_id"])
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_existing_conversation_is_one_index_lookup(self):
+        self.direct(self.bob)
+        # utilisateurs existants + conversation (clé) + participants préchargés
+        with self.assertNumQueries(3):
+            self.assertEqual(self.direct(self.bob).status_code, 200)
+        plan = Conversation.objects.filter(participant_key=participant_set_key([self.alice.pk, self.bob.pk])).explain()
+        self.assertIn("USING INDEX", plan)
+        self.assertNotIn("SCAN", plan)
+
+    def test_create_with_two_participants_reuses_conversation(self):
+        first = self.direct(self.bob)
+        response = self.client.post(reverse("conversation-list"), {
+            "participants": [str(self.bob.pk), str(self.alice.pk)],
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["conversation_id"], first.data["conversation_id"])
+
+        group = self.client.post(reverse("conversation-list"), {
+            "participants": [str(self.alice.pk), str(self.bob.pk), str(self.carol.pk)],
+        }, format="json")
+        self.assertEqual(group.status_code, 201)
+        self.assertEqual(Conversation.objects.count(), 2)
+
+    def test_create_never_returns_another_pairs_conversation(self):
+        private = self.direct(self.bob).data["conversation_id"]
+        Message.objects.create(sender=self.alice, conversation_id=private, message_body="secret")
+
+        self.client.force_authenticate(self.carol)
+        response = self.client.post(reverse("conversation-list"), {
+            "participants": [str(self.alice.pk), str(self.bob.pk)],
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data["conversation_id"], private)
+        self.assertNotIn("secret", str(response.data))
+        # La conversation directe d'Alice et Bob reste la seule avec leur clé
+        self.assertEqual(
+            Conversation.objects.get(participant_key=participant_set_key([self.alice.pk, self.bob.pk])).pk,
+            uuid.UUID(private),
+        )
+
+    def test_participant_change_releases_the_key(self):
+        conversation = Conversation.objects.get(pk=self.direct(self.bob).data["conversation_id"])
+        conversation.participants.add(self.carol)
+        conversation.refresh_from_db()
+        self.assertIsNone(conversation.participant_key)
+
+        response = self.direct(self.bob)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data["conversation_id"], str(conversation.pk))
+
+    def test_concurrent_creation_returns_the_winner(self):
+        winner = self.direct(self.bob).data["conversation_id"]
+        # L'autre requête n'a pas vu la conversation : l'INSERT viole l'unicité
+        queryset = Conversation.objects.all()
+        real_get = queryset.get
+        calls = []
+
+        def get(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise Conversation.DoesNotExist
+            return real_get(*args, **kwargs)
+
+        with mock.patch.object(queryset, "get", side_effect=get):
+            conversation, created = queryset.get_or_create_for_participants([self.alice.pk, self.bob.pk])
+        self.assertFalse(created)
+        self.assertEqual(str(conversation.pk), winner)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_validation(self):
+        self.assertEqual(self.direct().status_code, 400)
+        self.assertEqual(self.direct(self.alice).status_code, 400)
+        response = self.client.post(self.url, {"participants": ["pas-un-uuid"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {"participants": [str(uuid.uuid4())]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class DedupeDirectConversationsCommandTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.carol = make_user("carol@example.com")
+        start = timezone.now() - timedelta(days=3)
+        self.dms = []
+        for day in range(3):
+            conversation = Conversation.objects.create()
+            conversation.participants.set([self.alice, self.bob])
+            make_messages(conversation, self.bob, 2, start=start + timedelta(days=day))
+            self.dms.append(conversation)
+        self.group = Conversation.objects.create()
+        self.group.participants.set([self.alice, self.bob, self.carol])
+        make_messages(self.group, self.carol, 1)
+        # Alice a lu la deuxième conversation jusqu'au bout
+        ConversationParticipant.objects.filter(conversation=self.dms[1], user=self.alice).advance_read(
+            self.dms[1].last_message_id, self.dms[1].messages.latest("sent_at").sent_at
+        )
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("dedupe_direct_conversations", *args, stdout=out)
+        return out.getvalue()
+
+    def test_merges_duplicates_into_oldest(self):
+        self.assertIn("2 doublon(s) à fusionner", self.run_command("--dry-run"))
+        self.assertEqual(Conversation.objects.count(), 4)
+
+        self.run_command()
+        keeper = Conversation.objects.get(participant_key=participant_set_key([self.alice.pk, self.bob.pk]))
+        self.assertEqual(keeper.pk, self.dms[0].pk)
+        self.assertEqual(keeper.messages.count(), 6)
+        self.assertEqual(keeper.message_count, 6)
+        self.assertEqual(set(Conversation.objects.values_list("pk", flat=True)), {keeper.pk, self.group.pk})
+        self.assertIsNone(Conversation.objects.get(pk=self.group.pk).participant_key)
+
+        # Lu jusqu'au 4e message : restent les 2 de la troisième conversation
+        unread = Conversation.objects.filter(pk=keeper.pk).with_read_state(self.alice).get().unread_count
+        self.assertEqual(unread, 2)
+
+        # L'endpoint retrouve la conversation fusionnée
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.post(reverse("conversation-direct"), {"participants": [str(self.alice.pk)]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["conversation_id"], str(keeper.pk))
+
+    def test_rerun_is_a_no_op(self):
+        self.run_command()
+        self.assertIn("0 conversation(s) directe(s) mise(s) à jour, 0 doublon(s)", self.run_command())
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates},
+    })
+
+
+class ThrottlingTest(TestCase):
+    def setUp(self):
+        store = os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3")
+        settings_override = override_settings(CHATS_RATE_STORE=store, CHATS_THROTTLING=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.carol = make_user("carol@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.other = Conversation.objects.create()
+        self.other.participants.add(self.alice, self.carol)
+        self.client = APIClient()
+
+    def send(self, user, conversation=None):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse("message-list"), {
+            "conversation_id": str((conversation or self.conversation).pk),
+            "sender_id": str(user.pk),
+            "message_body": "bonjour",
+        }, format="json")
+
+    def test_token_bucket_refills(self):
+        store = rate_store()
+        for _ in range(3):
+            self.assertEqual(store.consume("k", capacity=3, rate=0.5, now=100), 0)
+        self.assertAlmostEqual(store.consume("k", capacity=3, rate=0.5, now=100), 2)
+        # Un jeton rendu en 2 s, jamais plus que la capacité
+        self.assertEqual(store.consume("k", capacity=3, rate=0.5, now=102), 0)
+        self.assertGreater(store.consume("k", capacity=3, rate=0.5, now=102), 0)
+        for _ in range(3):
+            self.assertEqual(store.consume("k", capacity=3, rate=0.5, now=1000), 0)
+        self.assertGreater(store.consume("k", capacity=3, rate=0.5, now=1000), 0)
+
+    def test_refusal_is_remembered_until_the_wait(self):
+        store = RateStore(settings.CHATS_RATE_STORE)
+        self.assertEqual(store.consume("k", capacity=1, rate=0.5, now=10), 0)
+        self.assertAlmostEqual(store.consume("k", capacity=1, rate=0.5, now=10), 2)
+        # Même réponse sans toucher au fichier jusqu'à l'échéance
+        with mock.patch.object(store, "connection", side_effect=AssertionError):
+            self.assertAlmostEqual(store.consume("k", capacity=1, rate=0.5, now=11), 1)
+        self.assertEqual(store.consume("k", capacity=1, rate=0.5, now=12), 0)
+
+    def test_store_is_shared_between_instances(self):
+        # Deux instances sur le même fichier : comme deux workers
+        first, second = RateStore(settings.CHATS_RATE_STORE), RateStore(settings.CHATS_RATE_STORE)
+        self.assertEqual(first.consume("k", capacity=1, rate=1, now=10), 0)
+        self.assertGreater(second.consume("k", capacity=1, rate=1, now=10), 0)
+
+        lease = first.acquire("writes", 1, 60, now=10)
+        self.assertIsNotNone(lease)
+        self.assertIsNone(second.acquire("writes", 1, 60, now=10))
+        # Bail expiré (worker tué) : la place se libère seule
+        self.assertIsNotNone(second.acquire("writes", 1, 60, now=71))
+        first.release(lease)
+
+    @throttle_rates(message_write="3/min")
+    def test_user_throttle(self):
+        for _ in range(3):
+            self.assertEqual(self.send(self.alice).status_code, 201)
+        response = self.send(self.alice)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        # Les autres utilisateurs ont leur propre seau
+        self.assertEqual(self.send(self.bob).status_code, 201)
+
+    @throttle_rates(conversation_write="2/min")
+    def test_conversation_throttle_is_shared_by_participants(self):
+        self.assertEqual(self.send(self.alice).status_code, 201)
+        self.assertEqual(self.send(self.bob).status_code, 201)
+        self.assertEqual(self.send(self.bob).status_code, 429)
+        self.assertEqual(self.send(self.alice, self.other).status_code, 201)
+
+    @throttle_rates(message_write="1/min", conversation_write="2/min")
+    def test_refused_request_does_not_drain_other_buckets(self):
+        self.assertEqual(self.send(self.alice).status_code, 201)
+        self.assertEqual(self.send(self.alice).status_code, 429)
+        # Le refus d'alice n'a pas consommé le seau de la conversation
+        self.assertEqual(self.send(self.bob).status_code, 201)
+
+    def send_bulk(self, user, *conversations):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse("message-bulk"), {"messages": [
+            {"conversation_id": str(conversation.pk), "message_body": "bonjour"} for conversation in conversations
+        ]}, format="json")
+
+    @throttle_rates(conversation_write="2/min")
+    def test_non_member_does_not_drain_conversation_bucket(self):
+        for _ in range(3):
+            self.assertEqual(self.send(self.carol, self.conversation).status_code, 403)
+        self.assertEqual(self.send_bulk(self.carol, self.conversation, self.conversation).status_code, 207)
+        self.assertEqual(self.send(self.alice).status_code, 201)
+        self.assertEqual(self.send(self.bob).status_code, 201)
+
+    @throttle_rates(message_write="5/min")
+    def test_bulk_costs_one_token_per_message(self):
+        self.assertEqual(self.send_bulk(self.alice, *[self.conversation] * 4).status_code, 201)
+        self.assertEqual(self.send_bulk(self.alice, self.conversation, self.other).status_code, 429)
+        self.assertEqual(self.send(self.alice).status_code, 201)
+        self.assertEqual(self.send(self.alice).status_code, 429)
+
+    @throttle_rates(message_write="5/min")
+    def test_bulk_larger_than_bucket_is_rejected(self):
+        response = self.send_bulk(self.alice, *[self.conversation] * 6)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Message.objects.count(), 0)
+
+    @throttle_rates(conversation_write="3/min")
+    def test_bulk_charges_each_conversation(self):
+        self.assertEqual(self.send_bulk(self.alice, self.conversation, self.conversation, self.other).status_code, 201)
+        self.assertEqual(self.send(self.bob).status_code, 201)
+        self.assertEqual(self.send(self.bob).status_code, 429)
+        # Refus sur `conversation` : le jeton pris sur `other` est rendu
+        self.assertEqual(self.send_bulk(self.alice, self.other, self.conversation).status_code, 429)
+        self.assertEqual(self.send(self.alice, self.other).status_code, 201)
+        self.assertEqual(self.send(self.alice, self.other).status_code, 201)
+
+    @throttle_rates(search="1/min")
+    def test_search_throttle(self):
+        self.client.force_authenticate(self.alice)
+        url = reverse("message-list")
+        self.assertEqual(self.client.get(url, {"search": "bonjour"}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"search": "bonjour"}).status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @throttle_rates(message_write="1/min")
+    def test_disabled(self):
+        with override_settings(CHATS_THROTTLING=False):
+            for _ in range(3):
+                self.assertEqual(self.send(self.alice).status_code, 201)
+
+
+class LoadSheddingTest(TestCase):
+    def setUp(self):
+        store = os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3")
+        settings_override = override_settings(
+            CHATS_RATE_STORE=store, CHATS_THROTTLING=False,
+            CHATS_MAX_INFLIGHT_WRITES=1, CHATS_LOAD_SHEDDING_RETRY_AFTER=1,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self):
+        return self.client.post(reverse("message-list"), {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.user.pk),
+            "message_body": "bonjour",
+        }, format="json")
+
+    def test_writes_beyond_limit_are_shed(self):
+        # Une écriture en cours dans un autre worker
+        lease = rate_store().acquire("writes", 1, 60)
+        response = self.send()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.client.get(reverse("conversation-list")).status_code, 200)
+
+        rate_store().release(lease)
+        self.assertEqual(self.send().status_code, 201)
+        # Bail rendu après la requête
+        self.assertEqual(self.send().status_code, 201)
+
+    def test_disabled_when_limit_is_zero(self):
+        with override_settings(CHATS_MAX_INFLIGHT_WRITES=0), self.assertRaises(MiddlewareNotUsed):
+            LoadSheddingMiddleware(lambda request: None)
+
+
+@override_settings(CHATS_RESPONSE_CACHE_TIMEOUT=0)
+class SparseFieldsetTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com", phone_number="0600000000")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.messages = make_messages(self.conversation, self.alice, 3) + make_messages(self.conversation, self.bob, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.messages_url = reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk})
+        self.detail_url = reverse("conversation-detail", kwargs={"pk": self.conversation.pk})
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        return response
+
+    def test_message_list_fields(self):
+        full = self.client.get(self.messages_url).data["results"]
+        response = self.get(self.messages_url, fields="message_id,sender.full_name")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [
+            {"message_id": message["message_id"], "sender": {"full_name": message["sender"]["full_name"]}}
+            for message in full
+        ])
+        self.assertNotIn("message_body", self.sql)
+
+        response = self.get(self.messages_url, fields="message_id,preview")
+        self.assertEqual([set(message) for message in response.data["results"]], [{"message_id", "preview"}] * 6)
+        self.assertNotIn("phone_number", self.sql)
+
+    def test_message_list_exclude(self):
+        response = self.get(self.messages_url, exclude="preview,sender.email,sender.phone_number")
+        message = response.data["results"][0]
+        self.assertEqual(list(message), ["message_id", "sender", "message_body", "sent_at"])
+        self.assertNotIn("email", message["sender"])
+        self.assertIn("full_name", message["sender"])
+
+        response = self.get(self.messages_url, include="users", fields="message_id,sender_id")
+        self.assertEqual(set(response.data["results"][0]), {"message_id", "sender_id"})
+        self.assertEqual(len(response.data["users"]), 2)
+
+    def test_message_retrieve_trims_columns(self):
+        url = reverse("message-detail", kwargs={"pk": self.messages[0].pk})
+        response = self.get(url, fields="message_body,sender.email")
+        self.assertEqual(response.data, {"message_body": "message 0", "sender": {"email": "alice@example.com"}})
+        self.assertNotIn("phone_number", self.sql)
+        self.assertNotIn("first_name", self.sql)
+
+    def test_conversation_retrieve(self):
+        # Sans ?fields= : participants et messages préchargés, pas une requête par message
+        with self.assertNumQueries(4):
+            full = self.client.get(self.detail_url)
+        self.assertEqual(len(full.data["messages"]), 6)
+
+        response = self.get(self.detail_url, fields="conversation_id,messages.message_id,messages.sender.role")
+        self.assertEqual(set(response.data), {"conversation_id", "messages"})
+        self.assertEqual(response.data["messages"][0], {
+            "message_id": response.data["messages"][0]["message_id"], "sender": {"role": "guest"},
+        })
+        self.assertNotIn("message_body", self.sql)
+        self.assertNotIn("chats_conversation_participants\".\"user_id\" AS", self.sql)
+
+    def test_conversation_list_without_participants(self):
+        # ETag, COUNT, page : pas de préchargement des participants
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("conversation-list"), {"exclude": "participants"})
+        self.assertNotIn("participants", response.data["results"][0])
+        self.assertEqual(response.data["results"][0]["message_count"], 6)
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({"fields": "nope"}, {"exclude": "sender.nope"}, {"fields": "sent_at.year"}):
+            with self.subTest(params=params):
+                response = self.client.get(self.messages_url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("fields", response.data)
+
+    def test_writes_ignore_fieldset(self):
+        response = self.client.post(reverse("message-list") + "?fields=message_id", {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.alice.pk),
+            "message_body": "bonjour",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("message_body", response.data)
+
+
+class RenderersTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+        make_messages(self.conversation, self.alice, 5)
+        Message.objects.create(conversation=self.conversation, sender=self.alice, message_body="é\u2028€ \"x\"")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk})
+
+    def test_fast_json_matches_json_renderer(self):
+        data = self.client.get(self.url).data
+        data["extra"] = {"when": timezone.now(), "id": uuid.uuid4(), "none": None}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = "application/json; indent=2"
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+    def test_json_is_the_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["results"][0]["message_body"], "é\u2028€ \"x\"")
+
+    @skipUnless(renderers.msgpack, "msgpack non installé")
+    def test_msgpack(self):
+        json_response = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(renderers.msgpack.unpackb(response.content), json_response.json())
+        self.assertLess(len(response.content), len(json_response.content))
+        self.assertNotEqual(response["ETag"], json_response["ETag"])
+
+    def test_msgpack_unavailable(self):
+        with mock.patch.object(MessagePackRenderer, "available", False):
+            response = self.client.get(self.url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 406)
+
+
+class UUIDv7Test(TestCase):
+    def test_format_and_order(self):
+        ids = [uuid7() for _ in range(10_000)]
+        self.assertEqual({value.version for value in ids}, {7})
+        self.assertEqual({value.variant for value in ids}, {uuid.RFC_4122})
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        # Tri des chaînes stockées par SQLite (hex) = tri chronologique
+        self.assertEqual([value.hex for value in ids], sorted(value.hex for value in ids))
+        self.assertLess(abs(uuid7_datetime(ids[0]) - timezone.now()), timedelta(seconds=5))
+        self.assertIsNone(uuid7_datetime(uuid.uuid4()))
+
+    def test_counter_overflow_moves_to_next_millisecond(self):
+        # Horloge figée ; état du générateur restauré ensuite (il ne recule jamais)
+        with mock.patch("chats.uuids.time.time_ns", return_value=4_102_444_800_000 * 1_000_000), \
+                mock.patch.multiple("chats.uuids", _last_ms=0, _counter=0):
+            ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertGreater(uuid7_datetime(ids[-1]), uuid7_datetime(ids[0]))
+
+    def test_new_rows_use_uuid7(self):
+        user = make_user("alice@example.com")
+        conversation = Conversation.objects.create()
+        message = Message.objects.create(conversation=conversation, sender=user, message_body="hello")
+        self.assertEqual(conversation.pk.version, 7)
+        self.assertEqual(message.pk.version, 7)
+
+
+class MessageSentAtTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+
+    def test_explicit_date_is_kept_by_bulk_create(self):
+        past = timezone.now() - timedelta(days=30)
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender=self.alice, message_body="old", sent_at=past),
+            Message(conversation=self.conversation, sender=self.alice, message_body="new"),
+        ])
+        self.assertEqual(Message.objects.get(message_body="old").sent_at, past)
+        self.assertLess(abs(Message.objects.get(message_body="new").sent_at - timezone.now()), timedelta(seconds=5))
+
+    def test_api_ignores_client_date(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post(reverse("message-list"), {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.alice.pk),
+            "message_body": "hello",
+            "sent_at": "2000-01-01T00:00:00Z",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Message.objects.get().sent_at.year, timezone.now().year)
+
+
+class PrimaryKeyOrderingTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_equal_sent_at_pages_are_stable(self):
+        messages = make_messages(self.conversation, self.alice, 7)
+        Message.objects.update(sent_at=timezone.now())
+        seen = []
+        for page in range(1, 5):
+            response = self.client.get(reverse("message-list"), {"ordering": "sent_at", "page": page, "page_size": 2})
+            seen += [message["message_id"] for message in response.data["results"]]
+        # Ex aequo rangés par clé primaire, donc par ordre de création (UUIDv7)
+        self.assertEqual(seen, [str(message.pk) for message in messages])
+
+        response = self.client.get(reverse("message-list"), {"ordering": "-sent_at", "page": 1, "page_size": 2})
+        self.assertEqual([message["message_id"] for message in response.data["results"]],
+                         [str(message.pk) for message in messages[:-3:-1]])
+
+    def test_conversation_list_breaks_ties_by_pk(self):
+        conversations = [self.conversation] + [Conversation.objects.create() for _ in range(3)]
+        for conversation in conversations[1:]:
+            conversation.participants.set([self.alice])
+        Conversation.objects.update(created_at=timezone.now())
+        response = self.client.get(reverse("conversation-list"))
+        self.assertEqual([item["conversation_id"] for item in response.data["results"]],
+                         [str(conversation.pk) for conversation in reversed(conversations)])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.message = Message.objects.create(
+            conversation=self.conversation, sender=self.bob, message_body="hello"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.urls = [
+            reverse("conversation-list"),
+            reverse("conversation-detail", kwargs={"pk": self.conversation.pk}),
+            reverse("message-list"),
+            reverse("message-detail", kwargs={"pk": self.message.pk}),
+            reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk}),
+        ]
+
+    def poll(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_poll_is_304_with_one_query(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with self.assertNumQueries(1):
+                    response = self.poll(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+
+    def test_unchanged_poll_with_jwt_is_one_query(self):
+        # Vrai token, pas force_authenticate : l'authentification ne lit pas l'utilisateur
+        clear_user_cache()
+        token = ChatsTokenObtainPairSerializer.get_token(self.alice).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = client.get(url)["ETag"]
+                with self.assertNumQueries(1):
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def assert_changes_etags(self, change):
+        etags = [self.client.get(url)["ETag"] for url in self.urls]
+        change()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(self.poll(url, etag).status_code, 200)
+
+    def test_new_message_changes_etag(self):
+        self.assert_changes_etags(lambda: Message.objects.create(
+            conversation=self.conversation, sender=self.alice, message_body="again"
+        ))
+
+    def test_edited_message_changes_etag(self):
+        def edit():
+            self.message.message_body = "edited"
+            self.message.save()
+        self.assert_changes_etags(edit)
+
+    def test_participant_change_changes_etag(self):
+        self.assert_changes_etags(lambda: self.conversation.participants.add(make_user("carol@example.com")))
+
+    def test_query_params_are_part_of_the_etag(self):
+        url = reverse("message-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url + "?page_size=5", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_shortcut_for_non_participants(self):
+        carol = make_user("carol@example.com")
+        self.client.force_authenticate(carol)
+        url = reverse("conversation-detail", kwargs={"pk": self.conversation.pk})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH="*").status_code, 404)
+        self.assertEqual(self.client.get(reverse("conversation-detail", kwargs={"pk": "nope"})).status_code, 404)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        caches[settings.CHATS_RESPONSE_CACHE].clear()
+        response_cache_stats(reset=True)
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.message = Message.objects.create(
+            conversation=self.conversation, sender=self.bob, message_body="hello"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.detail_url = reverse("conversation-detail", kwargs={"pk": self.conversation.pk})
+        self.messages_url = reverse("conversation-messages-list", kwargs={"conversation_pk": self.conversation.pk})
+
+    def test_hit_is_one_query(self):
+        for url in (self.detail_url, self.messages_url):
+            with self.subTest(url=url):
+                miss = self.client.get(url)
+                self.assertEqual(miss["X-Cache"], "MISS")
+                with self.assertNumQueries(1):
+                    hit = self.client.get(url)
+                self.assertEqual(hit["X-Cache"], "HIT")
+                self.assertEqual(hit.json(), miss.json())
+                self.assertEqual(hit["ETag"], miss["ETag"])
+
+        stats = response_cache_stats()
+        self.assertEqual(stats["conversation.retrieve"], {"hit": 1, "miss": 1, "hit_ratio": 0.5})
+        self.assertEqual(stats["conversation-messages.list"]["hit"], 1)
+
+    def assert_invalidated_by(self, change):
+        for url in (self.detail_url, self.messages_url):
+            self.client.get(url)
+        change()
+        for url in (self.detail_url, self.messages_url):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_new_message(self):
+        self.assert_invalidated_by(lambda: Message.objects.create(
+            conversation=self.conversation, sender=self.alice, message_body="again"
+        ))
+        self.assertEqual(len(self.client.get(self.detail_url).data["messages"]), 2)
+
+    def test_edited_message(self):
+        def edit():
+            self.message.message_body = "edited"
+            self.message.save()
+        self.assert_invalidated_by(edit)
+        self.assertEqual(self.client.get(self.detail_url).data["messages"][0]["message_body"], "edited")
+
+    def test_deleted_message(self):
+        self.assert_invalidated_by(self.message.delete)
+        self.assertEqual(self.client.get(self.detail_url).data["messages"], [])
+
+    def test_participants_change(self):
+        self.assert_invalidated_by(lambda: self.conversation.participants.add(make_user("carol@example.com")))
+        self.assertEqual(len(self.client.get(self.detail_url).data["participants"]), 3)
+
+    def test_entries_are_per_user(self):
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get(self.detail_url)["X-Cache"], "MISS")
+
+        self.client.force_authenticate(make_user("carol@example.com"))
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    @override_settings(CHATS_RESPONSE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.client.get(self.detail_url)
+        self.assertNotIn("X-Cache", self.client.get(self.detail_url))
+        self.assertEqual(response_cache_stats(), {})
+
+
+class ConversationExportTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice, self.bob])
+        self.messages = make_messages(self.conversation, self.bob, 30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("conversation-export", kwargs={"pk": self.conversation.pk})
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_ndjson_export(self):
+        lines = self.lines(self.client.get(self.url))
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["message_id"] for row in rows], [str(m.message_id) for m in self.messages])
+        self.assertEqual(rows[0]["sender_email"], "bob@example.com")
+
+    def test_csv_export(self):
+        lines = self.lines(self.client.get(self.url, {"output": "csv"}))
+        self.assertEqual(lines[0], ",".join(EXPORT_FIELDS))
+        self.assertEqual(len(lines), 31)
+
+    def test_resume_after_message(self):
+        lines = self.lines(self.client.get(self.url, {"after": str(self.messages[19].message_id)}))
+        self.assertEqual([json.loads(line)["message_id"] for line in lines],
+                         [str(m.message_id) for m in self.messages[20:]])
+
+    def test_export_requires_membership(self):
+        self.client.force_authenticate(make_user("carol@example.com"))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ConversationEventsTest(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.set([self.alice])
+        self.messages = make_messages(self.conversation, self.alice, 5)
+
+    @staticmethod
+    def event_id(event):
+        return event.split("\n", 1)[0].removeprefix("id: ")
+
+    async def test_new_message_is_pushed_to_subscribers(self):
+        streams = [event_stream(self.conversation.pk) for _ in range(2)]
+        for stream in streams:
+            self.assertTrue((await anext(stream)).startswith("retry:"))
+        self.assertEqual(hub.subscriber_count(self.conversation.pk), 2)
+
+        hub.publish_messages([self.messages[0]])
+        for stream in streams:
+            event = await anext(stream)
+            self.assertEqual(self.event_id(event), str(self.messages[0].pk))
+            self.assertIn("event: message", event)
+            await stream.aclose()
+        self.assertEqual(hub.subscriber_count(self.conversation.pk), 0)
+
+    async def test_heartbeat_when_idle(self):
+        stream = event_stream(self.conversation.pk, heartbeat=0.01)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ": ping\n\n")
+        await stream.aclose()
+
+    async def test_resume_from_last_event_id_without_duplicates(self):
+        stream = event_stream(self.conversation.pk, last_event_id=str(self.messages[2].pk))
+        await anext(stream)
+        replayed = [self.event_id(await anext(stream)) for _ in range(2)]
+        self.assertEqual(replayed, [str(m.pk) for m in self.messages[3:]])
+
+        # Publié pendant le rattrapage : déjà envoyé, ignoré
+        hub.publish_messages([self.messages[4]])
+        newer = Message(conversation=self.conversation, sender=self.alice, message_body="nouveau",
+                        sent_at=self.messages[4].sent_at + timedelta(seconds=1))
+        hub.publish_messages([newer])
+        self.assertEqual(self.event_id(await anext(stream)), str(newer.pk))
+        await stream.aclose()
+
+    async def test_resume_replays_every_page(self):
+        # Plus de messages manqués qu'une page de rattrapage
+        with mock.patch("chats.events.REPLAY_PAGE_SIZE", 2):
+            stream = event_stream(self.conversation.pk, last_event_id=str(self.messages[0].pk))
+            await anext(stream)
+            replayed = [self.event_id(await anext(stream)) for _ in range(4)]
+        self.assertEqual(replayed, [str(m.pk) for m in self.messages[1:]])
+        await stream.aclose()
+
+    async def test_slow_client_is_disconnected(self):
+        stream = event_stream(self.conversation.pk)
+        await anext(stream)
+        # Plus d'événements que la file n'en contient (QUEUE_SIZE) sans les lire
+        hub.publish_messages(self.messages * 25)
+        with self.assertRaises(StopAsyncIteration):
+            while True:
+                await anext(stream)
+        self.assertEqual(hub.subscriber_count(self.conversation.pk), 0)
+
+    def test_messages_are_published_on_commit(self):
+        with mock.patch.object(hub, "publish_messages") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                message = Message.objects.create(conversation=self.conversation, sender=self.alice,
+                                                 message_body="salut")
+                publish.assert_not_called()
+        publish.assert_called_once_with([message])
+
+    def test_bulk_send_publishes_once(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        items = [{"conversation_id": str(self.conversation.pk), "message_body": f"m{i}"} for i in range(3)]
+        with mock.patch.object(hub, "publish_messages") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                client.post(reverse("message-bulk"), items, format="json")
+        publish.assert_called_once()
+        self.assertEqual(len(publish.call_args.args[0]), 3)
+
+    async def test_stream_requires_asgi(self):
+        url = f"/api/conversations/{self.conversation.pk}/events/"
+        response = await conversation_events(RequestFactory().get(url), self.conversation.pk)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_requires_authentication_and_membership(self):
+        factory = AsyncRequestFactory()
+        url = f"/api/conversations/{self.conversation.pk}/events/"
+        response = await conversation_events(factory.get(url), self.conversation.pk)
+        self.assertEqual(response.status_code, 401)
+
+        def request_as(user):
+            token = ChatsTokenObtainPairSerializer.get_token(user).access_token
+            return factory.get(url, headers={"Authorization": f"Bearer {token}"})
+
+        carol = await User.objects.acreate(email="carol@example.com", password="x", first_name="C", last_name="c")
+        with self.assertRaises(Http404):
+            await conversation_events(request_as(carol), self.conversation.pk)
+
+        response = await conversation_events(request_as(self.alice), self.conversation.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+
+@skipUnless(os.environ.get("CHATS_SLOW_TESTS"), "export de 500k messages : CHATS_SLOW_TESTS=1")
+class ConversationExportMemoryTest(TestCase):
+    """La mémoire de l'export ne dépend pas de la taille de la conversation."""
+    total = 500_000
+
+    def test_peak_memory_is_bounded(self):
+        alice = make_user("alice@example.com")
+        conversation = Conversation.objects.create()
+        conversation.participants.set([alice])
+        start = timezone.now() - timedelta(days=30)
+        for offset in range(0, self.total, 10_000):
+            Message.objects.bulk_create([
+                Message(conversation=conversation, sender=alice, message_body=f"message {i}",
+                        sent_at=start + timedelta(seconds=i))
+                for i in range(offset, offset + 10_000)
+            ])
+        client = APIClient()
+        client.force_authenticate(alice)
+
+        response = client.get(reverse("conversation-export", kwargs={"pk": conversation.pk}))
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        exported = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+        self.assertEqual(exported, self.total)
+        # Chiffres affichés seulement en cas d'échec
+        self.assertLess(peak, 20 * 1024 * 1024, f"pic tracemalloc {peak / 1024 / 1024:.1f} Mo, "
+                        f"croissance du pic RSS {rss_growth_kb / 1024:.1f} Mo")
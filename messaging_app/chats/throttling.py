@@ -0,0 +1,262 @@
+# messaging_app/chats/throttling.py
+
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import Conversation
+from .permissions import member_conversations
+
+
+# -------------------------
+# Stockage partagé entre processus : un fichier SQLite dédié (WAL), distinct de
+# la base de l'application pour ne pas allonger la file de son écrivain.
+# Chaque opération est une seule instruction SQL, donc atomique entre workers.
+# -------------------------
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS bucket (
+        key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE TABLE IF NOT EXISTS lease (id INTEGER PRIMARY KEY, name TEXT NOT NULL, expires REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS lease_name_expires ON lease (name, expires)",
+]
+
+# Prend un jeton si le seau (rempli depuis la dernière mise à jour) en contient assez ;
+# aucune ligne renvoyée : requête refusée
+CONSUME_SQL = """
+    INSERT INTO bucket (key, tokens, updated) VALUES (:key, :capacity - :cost, :now)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = min(:capacity, tokens + (:now - updated) * :rate) - :cost,
+        updated = :now
+    WHERE min(:capacity, tokens + (:now - updated) * :rate) >= :cost
+    RETURNING tokens
+"""
+
+ACQUIRE_SQL = """
+    INSERT INTO lease (name, expires)
+    SELECT :name, :now + :ttl
+    WHERE (SELECT count(*) FROM lease WHERE name = :name AND expires > :now) < :limit
+    RETURNING id
+"""
+
+
+class RateStore:
+    """
+    Seaux à jetons et baux d'exécution partagés par tous les workers d'une
+    machine. Une connexion sqlite3 par thread ; les entrées périmées sont
+    purgées toutes les `purge_every` opérations. Un refus est retenu dans le
+    processus jusqu'à l'échéance annoncée (`denied`) : un client qui insiste
+    reçoit ses 429 sans accès au fichier.
+    """
+    purge_every = 1000
+    max_denied = 10000
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.denied = {}
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # Données jetables : pas de fsync
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self.local.conn = conn
+            self.local.operations = 0
+        self.local.operations += 1
+        if self.local.operations % self.purge_every == 0:
+            now = time.time()
+            conn.execute("DELETE FROM bucket WHERE updated < :now - 86400", {"now": now})
+            conn.execute("DELETE FROM lease WHERE expires < :now", {"now": now})
+        return conn
+
+    def consume(self, key, capacity, rate, cost=1, now=None):
+        """
+        Retire `cost` jetons du seau `key` (capacité `capacity`, `rate` jetons
+        par seconde). Renvoie 0 si c'est accepté, sinon l'attente en secondes
+        avant que le seau en contienne assez.
+        """
+        now = time.time() if now is None else now
+        # Le seau ne peut pas avoir assez de jetons avant l'attente annoncée
+        # (les autres workers n'en ajoutent pas, ils en prennent)
+        until, refused_cost = self.denied.get(key, (0, 0))
+        if now < until and cost >= refused_cost:
+            return until - now
+        params = {"key": key, "capacity": capacity, "rate": rate, "cost": cost, "now": now}
+        conn = self.connection()
+        if conn.execute(CONSUME_SQL, params).fetchone() is not None:
+            return 0
+        row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", [key]).fetchone()
+        available = min(capacity, row[0] + (now - row[1]) * rate) if row else capacity
+        wait = max(cost - available, 0) / rate
+        if len(self.denied) >= self.max_denied:
+            self.denied = {k: v for k, v in self.denied.items() if v[0] > now}
+        self.denied[key] = (now + wait, cost)
+        return wait
+
+    def refund(self, key, cost):
+        """Rend `cost` jetons au seau `key` (plafonné à sa capacité au prochain consume())."""
+        self.denied.pop(key, None)
+        self.connection().execute("UPDATE bucket SET tokens = tokens + ? WHERE key = ?", [cost, key])
+
+    def acquire(self, name, limit, ttl, now=None):
+        """Prend un bail parmi `limit` pour `name` ; renvoie son id, ou None si tous sont pris."""
+        now = time.time() if now is None else now
+        row = self.connection().execute(
+            ACQUIRE_SQL, {"name": name, "limit": limit, "ttl": ttl, "now": now}
+        ).fetchone()
+        return row[0] if row else None
+
+    def release(self, lease_id):
+        self.connection().execute("DELETE FROM lease WHERE id = ?", [lease_id])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def rate_store():
+    """Store du fichier CHATS_RATE_STORE (un par chemin et par processus)."""
+    path = str(settings.CHATS_RATE_STORE)
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(path, RateStore(path))
+    return store
+
+
+# -------------------------
+# Throttles DRF à seau de jetons
+# -------------------------
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """"120/min" -> (120, 60) : capacité du seau et durée de remplissage complet."""
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]]
+
+
+def write_costs(request, view):
+    """
+    Messages écrits par la requête, par conversation : {conversation_id: n},
+    None pour une conversation absente ou invalide (rejetée ensuite par la
+    vue). Envoi groupé (action "bulk") : un message par élément du lot, la
+    conversation de l'URL servant de valeur par défaut comme dans la vue.
+    """
+    default = view.kwargs.get("conversation_pk")
+    data = request.data
+    if getattr(view, "action", None) == "bulk":
+        items = data.get("messages") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return {}
+    else:
+        items = [data]
+    costs = {}
+    for item in items:
+        conversation_id = item.get("conversation_id", default) if isinstance(item, dict) else default
+        try:
+            # Forme canonique : un seul seau quelle que soit l'écriture de l'UUID
+            conversation_id = Conversation._meta.pk.to_python(conversation_id) if conversation_id else None
+        except ValidationError:
+            conversation_id = None
+        costs[conversation_id] = costs.get(conversation_id, 0) + 1
+    return costs
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Seau à jetons par `scope` (taux dans REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"])
+    et par identifiant. "120/min" : rafales de 120 requêtes, puis 2 par
+    seconde. get_costs() donne les jetons à prendre dans chaque seau : tous
+    ou aucun (ceux déjà pris sont rendus au premier refus). Sans taux pour le
+    scope, ou avec CHATS_THROTTLING à False, tout passe. Refus : 429 avec
+    Retry-After (wait()) ; 400 si un seau plein ne suffirait jamais.
+    """
+    scope = None
+
+    def __init__(self, scope=None):
+        self.scope = scope or self.scope
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.wait_seconds = None
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError(".get_ident_key() must be overridden")
+
+    def get_costs(self, request, view):
+        """{identifiant: jetons} ; par défaut un jeton pour get_ident_key()."""
+        ident = self.get_ident_key(request, view)
+        return {} if ident is None else {ident: 1}
+
+    def allow_request(self, request, view):
+        if not self.rate or not getattr(settings, "CHATS_THROTTLING", True):
+            return True
+        capacity, period = parse_rate(self.rate)
+        costs = self.get_costs(request, view)
+        if any(cost > capacity for cost in costs.values()):
+            raise ParseError(f"Au plus {capacity} messages par requête (limite {self.scope}).")
+        store, taken = rate_store(), []
+        for ident, cost in costs.items():
+            key = f"{self.scope}:{ident}"
+            self.wait_seconds = store.consume(key, capacity, capacity / period, cost)
+            if self.wait_seconds:
+                for key, cost in taken:
+                    store.refund(key, cost)
+                return False
+            taken.append((key, cost))
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    """
+    Un seau par utilisateur (par adresse IP pour un client anonyme). Scope
+    d'écriture (`per_message`) : un jeton par message écrit (write_costs()),
+    un envoi groupé coûte autant que ses messages envoyés un à un.
+    """
+
+    def __init__(self, scope=None, per_message=False):
+        super().__init__(scope)
+        self.per_message = per_message
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+    def get_costs(self, request, view):
+        if not self.per_message:
+            return super().get_costs(request, view)
+        cost = sum(write_costs(request, view).values())
+        return {self.get_ident_key(request, view): cost} if cost else {}
+
+
+class ConversationRateThrottle(TokenBucketThrottle):
+    """
+    Un seau par conversation, partagé par tous ses participants : chaque
+    conversation d'un envoi groupé est débitée de ses messages. Seulement
+    celles dont l'utilisateur est participant : sinon n'importe qui pourrait
+    vider le seau d'une conversation étrangère (requête refusée ensuite par
+    la vue, 403) et bloquer ses membres.
+    """
+
+    def get_costs(self, request, view):
+        costs = {
+            conversation_id: cost
+            for conversation_id, cost in write_costs(request, view).items()
+            if conversation_id is not None
+        }
+        members = member_conversations(request.user, costs, request)
+        return {conversation_id: cost for conversation_id, cost in costs.items() if conversation_id in members}
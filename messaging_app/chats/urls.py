@@ -4,6 +4,7 @@ from rest_framework import routers
 from rest_framework_nested.routers import NestedDefaultRouter
 from django.urls import path, include
 from .views import ConversationViewSet, MessageViewSet
+from .events import conversation_events
 
 # Router principal avec DefaultRouter
 router = routers.DefaultRouter()
@@ -15,6 +16,8 @@ conversations_router = NestedDefaultRouter(router, r'conversations', lookup='con
 conversations_router.register(r'messages', MessageViewSet, basename='conversation-messages')
 
 urlpatterns = [
+    # Flux SSE (vue asynchrone) : avant les routes du router
+    path('conversations/<uuid:conversation_pk>/events/', conversation_events, name='conversation-events'),
     path('', include(router.urls)),              # routes principales
     path('', include(conversations_router.urls)) # routes imbriquées
 ]
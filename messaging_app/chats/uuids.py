@@ -0,0 +1,48 @@
+# messaging_app/chats/uuids.py
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+
+# -------------------------
+# UUIDv7 (RFC 9562) : horodatage en millisecondes en tête
+# -------------------------
+# 48 bits d'horodatage Unix (ms) | version 7 | 12 bits de compteur | variante | 62 bits aléatoires.
+# Les identifiants successifs sont croissants : insertion en fin d'index de
+# clé primaire (B-tree) au lieu d'une page au hasard comme avec uuid4, et tri
+# par clé primaire ≈ tri par date de création.
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    UUIDv7 croissant dans le processus : dans une même milliseconde, les 12 bits
+    suivant l'horodatage servent de compteur (départ aléatoire, méthode 1 de la
+    RFC) ; s'il déborde, on avance d'une milliseconde.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now > _last_ms:
+            # Moitié basse : de la marge avant débordement
+            _last_ms, _counter = now, int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms, _counter = _last_ms + 1, 0
+        ms, counter = _last_ms, _counter
+    rand = int.from_bytes(os.urandom(8), "big") & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=(ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand)
+
+
+def uuid7_datetime(value):
+    """Date de création d'un UUIDv7 (à la milliseconde), None pour une autre version."""
+    value = uuid.UUID(str(value))
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=dt_timezone.utc)
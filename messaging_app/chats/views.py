@@ -1,28 +1,60 @@
 # messaging_app/chats/views.py
 
 from rest_framework import viewsets, status, filters
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated   # ✅ attendu par le checker
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 
-from .models import Conversation, Message, User
-from .serializers import ConversationSerializer, MessageSerializer
-from .permissions import IsParticipantOfConversation   # ta permission custom
+from .models import Conversation, ConversationParticipant, Message, User
+from .serializers import (
+    BulkMessageItemSerializer,
+    ConversationReadStateSerializer,
+    ConversationSerializer,
+    ConversationSummarySerializer,
+    FastMessageSerializer,
+    MessageSerializer,
+    MessageSearchResultSerializer,
+    SideloadedMessageSerializer,
+)
+from .permissions import (   # ta permission custom
+    IsParticipantOfConversation,
+    is_participant,
+    member_conversations,
+    remember_membership,
+)
+from .pagination import MessageCursorPagination
+from .conditional import (
+    ConditionalGetMixin,
+    conversation_signature,
+    inbox_signature,
+    message_signature,
+)
+from .fieldsets import SparseFieldsViewMixin, trim_queryset
+from .filters import PrimaryKeyOrderingFilter
+from .search import MessageSearchFilter
+from .throttling import ConversationRateThrottle, UserRateThrottle
+from .export import export_response
+from .events import hub
 from rest_framework import status as drf_status         # pour HTTP_403_FORBIDDEN
 
 # -------------------------
 # Conversation ViewSet
 # -------------------------
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated, IsParticipantOfConversation]   # ✅
 
     # Ajout de filtres (permet recherche par ID de conversation)
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.SearchFilter, PrimaryKeyOrderingFilter]
     search_fields = ["conversation_id"]
-    ordering_fields = ["created_at"]
+    # last_message_at est dénormalisé et indexé : tri de la boîte de réception
+    ordering_fields = ["created_at", "last_message_at"]
+    ordering = ["-last_message_at", "-created_at"]
 
     def create(self, request, *args, **kwargs):
         participants_ids = request.data.get("participants", [])
@@ -30,9 +62,18 @@ class ConversationViewSet(viewsets.ModelViewSet):
             raise ValidationError("Une conversation doit avoir au moins un participant.")
 
         participants = User.objects.filter(user_id__in=participants_ids)
-        if not participants.exists():
+        user_ids = set(participants.values_list("user_id", flat=True))
+        if not user_ids:
             raise ValidationError("Les participants spécifiés n'existent pas.")
 
+        # Conversation à deux dont l'utilisateur fait partie : la conversation
+        # directe existante si elle existe. Sans lui, on ne renvoie jamais celle
+        # des deux autres (elle contient leurs messages) : création comme avant.
+        if len(user_ids) == 2 and request.user.pk in user_ids:
+            conversation, created = Conversation.objects.get_or_create_for_participants(user_ids)
+            serializer = self.get_serializer(conversation)
+            return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
         conversation = Conversation.objects.create()
         conversation.participants.set(participants)
         conversation.save()
@@ -40,24 +81,139 @@ class ConversationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(conversation)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=["post"])
+    def direct(self, request):
+        """
+        Conversation de l'utilisateur avec `participants` (lui compris) : la
+        conversation canonique de cet ensemble (200) trouvée par l'index unique
+        de participant_key, ou une nouvelle (201). Réponse au format des listes.
+        """
+        participants_ids = request.data.get("participants", [])
+        if not isinstance(participants_ids, list):
+            raise ValidationError({"participants": ["Une liste d'identifiants est attendue."]})
+        try:
+            user_ids = {User._meta.pk.to_python(user_id) for user_id in participants_ids}
+        except DjangoValidationError:
+            raise ValidationError({"participants": ["Identifiant d'utilisateur invalide."]})
+        if len(set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))) != len(user_ids):
+            raise ValidationError({"participants": ["Les participants spécifiés n'existent pas."]})
+        user_ids.add(request.user.pk)
+        if len(user_ids) < 2:
+            raise ValidationError({"participants": ["Au moins un autre participant est requis."]})
+
+        conversation, created = (
+            Conversation.objects.with_summary(request.user).get_or_create_for_participants(user_ids)
+        )
+        serializer = ConversationSummarySerializer(conversation, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
     def get_queryset(self):
         """
         Retourne uniquement les conversations où l'utilisateur connecté est participant.
         """
         user = self.request.user
-        return Conversation.objects.filter(participants=user)
+        queryset = Conversation.objects.filter(participants=user)
+        if self.action == "list":
+            # Résumé en nombre fixe de requêtes (annotations + Prefetch)
+            participants = "participants" in self.get_serializer().fields
+            queryset = queryset.with_summary(user, participants=participants)
+        elif self.action == "retrieve":
+            # Participants et messages préchargés, colonnes des seuls champs demandés (?fields=)
+            queryset = trim_queryset(queryset, self.get_serializer())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return ConversationSummarySerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """
+        Export complet en flux : NDJSON par défaut, ?output=csv pour du CSV.
+        ?after=<message_id> reprend un export interrompu après ce message.
+        """
+        try:
+            conversation_id = Conversation._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise NotFound()
+        if not is_participant(request.user, conversation_id, request):
+            raise NotFound()
+        return export_response(
+            conversation_id,
+            output=request.query_params.get("output", "ndjson"),
+            after=request.query_params.get("after"),
+        )
+
+    @action(detail=True, methods=["post"])
+    def read(self, request, pk=None):
+        """
+        Avance l'état de lecture de l'utilisateur : jusqu'à `message_id` s'il est
+        fourni, sinon jusqu'au dernier message. Le marqueur ne recule jamais.
+        """
+        try:
+            conversation_id = Conversation._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise NotFound()
+        if not is_participant(request.user, conversation_id, request):
+            raise NotFound()
+
+        message_id = request.data.get("message_id")
+        if message_id:
+            try:
+                target = (
+                    Message.objects.filter(pk=message_id, conversation_id=conversation_id)
+                    .values_list("message_id", "sent_at").first()
+                )
+            except DjangoValidationError:
+                target = None
+            if target is None:
+                raise ValidationError({"message_id": "Message introuvable dans cette conversation."})
+        else:
+            target = (
+                Conversation.objects.filter(pk=conversation_id)
+                .values_list("last_message_id", "last_message_at").first()
+            )
+
+        memberships = ConversationParticipant.objects.filter(conversation_id=conversation_id, user=request.user)
+        if target[0] is not None and memberships.advance_read(*target):
+            # unread_count fait partie de la liste des conversations (ETag)
+            Conversation.objects.filter(pk=conversation_id).bump_version()
+
+        state = (
+            Conversation.objects.filter(pk=conversation_id).with_read_state(request.user)
+            .values("last_read_at", "unread_count").get()
+        )
+        state["last_read_message_id"] = memberships.values_list("last_read_message_id", flat=True).first()
+        return Response(ConversationReadStateSerializer(state).data)
+
+    # ETag / If-None-Match et cache des réponses (voir chats.conditional)
+    cached_actions = ("retrieve",)
+
+    def get_list_signature(self):
+        return inbox_signature(self.request.user)
+
+    def get_object_signature(self):
+        signature = conversation_signature(self.request.user, self.kwargs["pk"])
+        if signature is not None:
+            # La signature prouve l'appartenance : pas de second EXISTS
+            remember_membership(self.request, Conversation._meta.pk.to_python(self.kwargs["pk"]))
+        return signature
 
 
 # -------------------------
 # Message ViewSet
 # -------------------------
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(SparseFieldsViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated, IsParticipantOfConversation]   # ✅
+    # Pagination par curseur (sent_at, message_id) ; ?page=<n> garde l'ancien mode
+    pagination_class = MessageCursorPagination
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["message_body", "sender__email"]
+    # ?search= passe par l'index FTS5 (classement, préfixes, extraits)
+    filter_backends = [MessageSearchFilter, PrimaryKeyOrderingFilter]
+    search_fields = ["message_body", "sender__email"]   # repli hors SQLite
     ordering_fields = ["sent_at"]
 
     def create(self, request, *args, **kwargs):
@@ -72,7 +228,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         sender = get_object_or_404(User, user_id=sender_id)
 
         # Vérifier si l'utilisateur est bien un participant de la conversation
-        if request.user not in conversation.participants.all():
+        if not is_participant(request.user, conversation.pk, request):
             return Response(
                 {"detail": "Vous n'êtes pas autorisé à envoyer un message dans cette conversation."},
                 status=drf_status.HTTP_403_FORBIDDEN   # ✅ attendu par le checker
@@ -87,11 +243,162 @@ class MessageViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    bulk_max_items = 1000
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        """
+        Envoi groupé : {"messages": [{"conversation_id", "sender_id", "message_body"}, ...]}.
+        L'appartenance de l'utilisateur et des expéditeurs est vérifiée pour tout
+        le lot en une requête, puis les messages valides sont insérés par
+        bulk_create dans une seule transaction. Réponse : un résultat par élément
+        (201 si tout est créé, 207 sinon).
+        """
+        items = request.data.get("messages") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError("messages doit être une liste non vide.")
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(f"{self.bulk_max_items} messages maximum par envoi.")
+
+        # Sur la route imbriquée, la conversation de l'URL sert de valeur par défaut
+        default_conversation = self.kwargs.get("conversation_pk")
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            if isinstance(item, dict):
+                item = {"conversation_id": default_conversation, "sender_id": request.user.pk, **item}
+            serializer = BulkMessageItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {"index": index, "status": 400, "errors": serializer.errors}
+
+        # Appartenance de l'auteur : déjà mémorisée sur la requête par
+        # ConversationRateThrottle ; une requête de plus seulement pour les
+        # autres expéditeurs du lot
+        conversation_ids = {data["conversation_id"] for _, data in valid}
+        members = {
+            (conversation_id, request.user.pk)
+            for conversation_id in member_conversations(request.user, conversation_ids, request)
+        }
+        other_ids = {data["sender_id"] for _, data in valid} - {request.user.pk}
+        if other_ids:
+            members |= set(
+                ConversationParticipant.objects.filter(
+                    conversation_id__in=conversation_ids, user_id__in=other_ids
+                ).values_list("conversation_id", "user_id")
+            )
+
+        to_create = []
+        for index, data in valid:
+            conversation_id, sender_id = data["conversation_id"], data["sender_id"]
+            if (conversation_id, request.user.pk) not in members:
+                results[index] = {"index": index, "status": 403, "errors": {
+                    "conversation_id": ["Vous n'êtes pas participant de cette conversation."]}}
+            elif (conversation_id, sender_id) not in members:
+                results[index] = {"index": index, "status": 400, "errors": {
+                    "sender_id": ["L'expéditeur n'est pas participant de cette conversation."]}}
+            else:
+                to_create.append((index, Message(
+                    conversation_id=conversation_id,
+                    sender_id=sender_id,
+                    message_body=data["message_body"],
+                )))
+
+        with transaction.atomic():
+            created = Message.objects.bulk_create([message for _, message in to_create])
+            # bulk_create n'envoie pas post_save : compteurs mis à jour ici
+            Conversation.objects.record_messages(created)
+            transaction.on_commit(lambda: hub.publish_messages(created))
+        for index, message in to_create:
+            results[index] = {
+                "index": index,
+                "status": 201,
+                "message_id": str(message.message_id),
+                "sent_at": message.sent_at,
+            }
+
+        all_created = len(to_create) == len(items)
+        return Response(
+            {"created": len(to_create), "failed": len(items) - len(to_create), "results": results},
+            status=status.HTTP_201_CREATED if all_created else status.HTTP_207_MULTI_STATUS,
+        )
+
     def get_queryset(self):
         """
         Retourne uniquement les messages des conversations
         auxquelles l'utilisateur connecté participe.
         """
         user = self.request.user
-        return Message.objects.filter(conversation__participants=user)   # ✅ attendu par le checker
+        queryset = Message.objects.filter(conversation__participants=user)   # ✅ attendu par le checker
+        # Route imbriquée conversations/{id}/messages/ : seulement cette conversation
+        conversation_pk = self.kwargs.get("conversation_pk")
+        if conversation_pk is not None:
+            queryset = queryset.filter(conversation_id=conversation_pk)
+        queryset = queryset.select_related("sender")
+        if self.action == "retrieve" and self.get_fieldset() is not None:
+            # conversation : lue par IsParticipantOfConversation
+            queryset = trim_queryset(queryset, self.get_serializer(), extra=("conversation",))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            if self.request.query_params.get(MessageSearchFilter.search_param):
+                return MessageSearchResultSerializer
+            if "users" in self.get_includes():
+                return SideloadedMessageSerializer
+            return FastMessageSerializer
+        return super().get_serializer_class()
+
+    def get_throttles(self):
+        """Seaux à jetons (chats.throttling) : écritures par utilisateur et par conversation, recherche."""
+        if self.action in ("create", "bulk"):
+            return [
+                UserRateThrottle("message_write", per_message=True),
+                ConversationRateThrottle("conversation_write"),
+            ]
+        if self.action == "list" and self.request.query_params.get(MessageSearchFilter.search_param):
+            return [UserRateThrottle("search")]
+        return super().get_throttles()
+
+    def check_throttles(self, request):
+        # Au premier refus on s'arrête : une requête refusée par le seau de
+        # l'utilisateur n'entame pas celui de la conversation (les autres participants)
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
+    def get_includes(self):
+        """?include=users,... : ressources liées renvoyées à part (voir get_paginated_response)."""
+        return {name.strip() for name in self.request.query_params.get("include", "").split(",")}
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        serializer = getattr(data, "serializer", None)
+        if isinstance(serializer, SideloadedMessageSerializer):
+            response.data["users"] = serializer.users
+        return response
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if self.action == "list" and issubclass(serializer_class, FastMessageSerializer):
+            # Listes : lignes values_list() au lieu d'instances (voir FastMessageSerializer)
+            queryset = serializer_class.prepare_queryset(queryset, self.get_fieldset())
+        return queryset
+
+    # ETag / If-None-Match et cache des pages (voir chats.conditional)
+    cached_actions = ("list",)
+
+    def get_list_signature(self):
+        conversation_pk = self.kwargs.get("conversation_pk")
+        if conversation_pk is not None:
+            return conversation_signature(self.request.user, conversation_pk)
+        return inbox_signature(self.request.user)
+
+    def get_object_signature(self):
+        signature = message_signature(self.request.user, self.kwargs["pk"])
+        if signature is not None:
+            remember_membership(self.request, signature[0])
+        return signature
 
@@ -0,0 +1,15 @@
+"""
+ASGI config for messaging_app project.
+
+Point d'entrée pour un serveur ASGI (uvicorn, daphne...) : nécessaire pour
+les flux Server-Sent Events (chats.events), qui gardent la connexion ouverte
+sans bloquer de thread.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+application = get_asgi_application()
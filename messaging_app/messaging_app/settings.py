@@ -1,4 +1,6 @@
 ```python
+import sys
+import tempfile
 from pathlib import Path
 
 # -------------------------
@@ -35,14 +37,24 @@ INSTALLED_APPS = [
 # -------------------------
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # 503 + Retry-After quand trop d'écritures sont en cours (tous workers confondus)
+    'chats.middleware.LoadSheddingMiddleware',
+    # Lectures sur les réplicas, lecture de ses écritures (retiré sans réplica)
+    'chats.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Server-Timing + détection N+1 (retiré de la chaîne si désactivé)
+    'chats.middleware.QueryInstrumentationMiddleware',
 ]
 
+# Instrumentation SQL par requête (debug / pré-production)
+CHATS_SQL_INSTRUMENTATION = DEBUG
+CHATS_SQL_N_PLUS_ONE_THRESHOLD = 5
+
 # -------------------------
 # Root urls & WSGI
 # -------------------------
@@ -65,17 +77,90 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'messaging_app.wsgi.application'
+# Les flux SSE (chats.events) sont servis en ASGI
+ASGI_APPLICATION = 'messaging_app.asgi.application'
 
 # -------------------------
 # Database (SQLite par défaut)
 # -------------------------
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Backend SQLite de Django + OPTIONS["transaction_mode"] (chats.backends.sqlite3)
+        'ENGINE': 'chats.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Pas de connexions persistantes : servi en ASGI (uvicorn), où Django
+        # recommande de les désactiver ; une connexion SQLite s'ouvre en
+        # quelques dizaines de µs, aucun gain mesuré à les garder
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            # Attente (s) d'un verrou en écriture avant « database is locked »
+            'timeout': 20,
+            # Verrou d'écriture pris au BEGIN : pas d'échec immédiat entre écrivains
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Réplicas en lecture : alias de DATABASES, copies de `default` (voir chats.routers).
+# Exemple : 'replica': {'ENGINE': 'chats.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'}
+DATABASE_ROUTERS = ['chats.routers.PrimaryReplicaRouter']
+CHATS_DATABASE_REPLICAS = []
+# Lectures sur le primaire pendant N s après une écriture du même client (cookie)
+CHATS_REPLICA_PIN_SECONDS = 5
+# Réplica en erreur écarté pendant N s
+CHATS_REPLICA_RETRY_SECONDS = 30
+
+# Pragmas appliqués à chaque nouvelle connexion SQLite (voir chats.database)
+CHATS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+# -------------------------
+# Cache d'appartenance aux conversations (secondes, 0 = désactivé)
+# Utilisé par chats.permissions.is_participant, invalidé par chats.signals.
+# Seulement avec un CACHES['default'] partagé (Redis, Memcached...) : avec
+# LocMemCache l'invalidation ne touche que le worker qui retire le participant,
+# les autres lui laisseraient l'accès jusqu'à expiration.
+# -------------------------
+CHATS_MEMBERSHIP_CACHE_TIMEOUT = 0
+
+# -------------------------
+# Cache des réponses GET (voir chats.conditional) : clé = ETag, qui contient
+# la version de la conversation ; jamais invalidé explicitement.
+# Par processus ici ; un cache partagé (Redis, Memcached) le partage entre workers.
+# -------------------------
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chats-responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Partagé par tous les workers de la machine (fichiers) ; Redis ou
+    # Memcached pour plusieurs machines
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'auth',
+    },
+}
+if sys.argv[1:2] == ['test']:
+    # Tests : un répertoire jetable, pas de cache/ laissé dans l'arbre
+    CACHES['auth']['LOCATION'] = tempfile.mkdtemp(prefix='chats-tests-auth-')
+CHATS_RESPONSE_CACHE = 'responses'
+CHATS_RESPONSE_CACHE_TIMEOUT = 300  # secondes, 0 = désactivé
+
+# Marqueurs "utilisateur modifié" de chats.authentication : ce cache doit être
+# partagé par tous les workers (Redis, Memcached, fichiers...). Par processus
+# (LocMemCache), l'authentification relit l'utilisateur en base à chaque requête.
+CHATS_AUTH_CACHE = 'auth'
+
 # -------------------------
 # Auth model personnalisé
 # -------------------------
@@ -122,14 +207,49 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",  # ✅ JWT par défaut
+        # ✅ JWT par défaut ; l'utilisateur est construit depuis les claims, sans requête
+        "chats.authentication.StatelessJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
+    # JSON encodé par orjson, MessagePack sur Accept: application/msgpack (voir chats.renderers)
+    "DEFAULT_RENDERER_CLASSES": [
+        "chats.renderers.FastJSONRenderer",
+        "chats.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_CONTENT_NEGOTIATION_CLASS": "chats.renderers.ContentNegotiation",
     # ✅ Pagination globale : 20 messages par page
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     # ✅ Filtres globaux
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # Seaux à jetons (chats.throttling) : "120/min" = rafale de 120 puis 2/s
+    "DEFAULT_THROTTLE_RATES": {
+        "message_write": "120/min",       # par utilisateur : création de messages, envoi groupé
+        "conversation_write": "300/min",  # par conversation, tous participants confondus
+        "search": "60/min",               # par utilisateur : ?search=
+    },
 }
+
+# Limitation de débit et délestage : état partagé par tous les workers
+# dans un fichier SQLite dédié (chats.throttling.RateStore)
+CHATS_THROTTLING = True
+CHATS_RATE_STORE = BASE_DIR / 'ratelimit.sqlite3'
+if sys.argv[1:2] == ['test']:
+    # Tests : un fichier jetable, pas de ratelimit.sqlite3 laissé dans l'arbre
+    CHATS_RATE_STORE = Path(tempfile.mkdtemp(prefix='chats-tests-')) / 'ratelimit.sqlite3'
+# Écritures simultanées au plus (0 : pas de délestage) ; au-delà, 503 + Retry-After
+CHATS_MAX_INFLIGHT_WRITES = 8
+CHATS_INFLIGHT_LEASE_SECONDS = 60
+CHATS_LOAD_SHEDDING_RETRY_AFTER = 1
+
+SIMPLE_JWT = {
+    "USER_ID_FIELD": "user_id",
+    # Ajoute email et role aux tokens (voir chats.authentication)
+    "TOKEN_OBTAIN_SERIALIZER": "chats.authentication.ChatsTokenObtainPairSerializer",
+}
+
+# Durée (secondes) du cache par processus des utilisateurs complets
+CHATS_USER_CACHE_TIMEOUT = 300
 ```